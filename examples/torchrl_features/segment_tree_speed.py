@@ -0,0 +1,90 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Compares the binary and K-ary segment tree layouts used by the
+prioritized replay buffers.
+
+For each layout, the script reports the time taken by batched priority
+updates, prefix-sum searches and stratified sampling, as well as the memory
+footprint of the tree.
+
+Example:
+    python segment_tree_speed.py --capacity 1000000 --fanouts 16 32
+"""
+
+import timeit
+
+import configargparse
+import numpy as np
+from torchrl._torchrl import (
+    KaryMinSegmentTreeFp32,
+    KarySumSegmentTreeFp32,
+    MinSegmentTreeFp32,
+    SumSegmentTreeFp32,
+)
+
+parser = configargparse.ArgumentParser()
+parser.add_argument("--capacity", default=1_000_000, type=int)
+parser.add_argument("--batch_size", default=256, type=int)
+parser.add_argument("--fanouts", default=[16, 32], type=int, nargs="+")
+parser.add_argument("--number", default=100, type=int)
+
+
+def make_trees(capacity, fanout):
+    if fanout is None:
+        return SumSegmentTreeFp32(capacity), MinSegmentTreeFp32(capacity)
+    return (
+        KarySumSegmentTreeFp32(capacity, fanout),
+        KaryMinSegmentTreeFp32(capacity, fanout),
+    )
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    capacity, batch_size, number = args.capacity, args.batch_size, args.number
+    rng = np.random.RandomState(0)
+    # like the indices of the sampled batches, the updated indices change at
+    # every call: updating the same indices would keep their nodes in cache
+    indices = rng.randint(capacity, size=(number, batch_size))
+    priority = rng.rand(batch_size).astype(np.float32)
+
+    print(
+        f"{'layout':>10} {'update (us)':>12} {'scan (us)':>10} "
+        f"{'sample (us)':>12} {'memory (MB)':>12}"
+    )
+    for fanout in [None, *args.fanouts]:
+        sum_tree, min_tree = make_trees(capacity, fanout)
+        for tree in (sum_tree, min_tree):
+            tree[np.arange(capacity)] = rng.rand(capacity).astype(np.float32)
+        total = sum_tree.query(0, capacity)
+        mass = rng.uniform(0, total, size=batch_size)
+
+        batches = iter(indices)
+
+        def update():
+            index = next(batches)
+            sum_tree[index] = priority
+            min_tree[index] = priority
+
+        t_update = timeit.timeit(update, number=number) / number
+        t_scan = (
+            timeit.timeit(lambda: sum_tree.scan_lower_bound(mass), number=number)
+            / number
+        )
+        t_sample = (
+            timeit.timeit(
+                lambda: sum_tree.stratified_sample(
+                    min_tree, batch_size, 0.4, capacity - 1
+                ),
+                number=number,
+            )
+            / number
+        )
+        memory = (sum_tree.nbytes() + min_tree.nbytes()) / 2 ** 20
+        name = "binary" if fanout is None else f"{fanout}-ary"
+        print(
+            f"{name:>10} {t_update * 1e6:12.1f} {t_scan * 1e6:10.1f} "
+            f"{t_sample * 1e6:12.1f} {memory:12.1f}"
+        )
@@ -25,7 +25,11 @@ from torchrl.data.tensor_specs import (
     BoundedTensorSpec,
     NdBoundedTensorSpec,
 )
-from torchrl.data.tensordict.tensordict import assert_allclose_td, TensorDict
+from torchrl.data.tensordict.tensordict import (
+    assert_allclose_td,
+    TensorDict,
+    tensordict_fast_mode,
+)
 from torchrl.envs import EnvCreator, ObservationNorm
 from torchrl.envs import GymEnv
 from torchrl.envs.libs.gym import _has_gym
@@ -891,6 +895,18 @@ def test_current_tensordict():
     )
 
 
+def test_step_fast_mode():
+    env = DiscreteActionVecMockEnv()
+    tensordict = env.reset()
+    tensordict.set("action", env.action_spec.rand().to(torch.float))
+    with pytest.raises(TypeError, match="expected action.dtype"):
+        env.step(tensordict)
+    # the dtypes are not checked in fast mode
+    with tensordict_fast_mode():
+        tensordict = env.step(tensordict)
+    assert "next_observation" in tensordict.keys()
+
+
 # TODO: test for frame-skip
 
 if __name__ == "__main__":
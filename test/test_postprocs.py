@@ -8,7 +8,7 @@ import pytest
 import torch
 from _utils_internal import get_available_devices
 from torchrl.collectors.utils import split_trajectories
-from torchrl.data.postprocs.postprocs import MultiStep
+from torchrl.data.postprocs.postprocs import MultiStep, StreamingMultiStep
 from torchrl.data.tensordict.tensordict import TensorDict, assert_allclose_td
 
 
@@ -89,6 +89,63 @@ def test_multistep(n, key, device, T=11):
         ).all()
 
 
+@pytest.mark.parametrize("n", [0, 1, 3])
+@pytest.mark.parametrize("device", get_available_devices())
+def test_streaming_multistep(n, device, b=3, T=8, n_batches=5, gamma=0.9):
+    torch.manual_seed(0)
+    total = T * n_batches
+    reward = torch.randn(b, total, 1, device=device)
+    done = torch.rand(b, total, 1, device=device) < 0.1
+    # trajectories are also truncated without done flag
+    truncated = torch.zeros_like(done)
+    truncated[:, 13] = True
+    step_count = torch.zeros(b, total, 1, dtype=torch.long, device=device)
+    count = torch.zeros(b, 1, dtype=torch.long, device=device)
+    for t in range(total):
+        count += 1
+        step_count[:, t] = count
+        count[done[:, t] | truncated[:, t]] = 0
+    next_obs = torch.arange(1, total + 1, device=device).expand(b, total)
+    tensordict = TensorDict(
+        {
+            "reward": reward,
+            "done": done,
+            "step_count": step_count,
+            "next_observation": next_obs.unsqueeze(-1).float(),
+        },
+        batch_size=[b, total],
+    )
+
+    ms = StreamingMultiStep(gamma, n).to(device)
+    outs = [ms(tensordict[:, i : i + T]) for i in range(0, total, T)]
+    assert outs[0].batch_size == torch.Size([b, T - n])
+    assert all(out.batch_size == torch.Size([b, T]) for out in outs[1:])
+    out = torch.cat(outs, 1)
+
+    # reference returns, stopping at the end of each trajectory
+    end = (done | truncated).squeeze(-1)
+    for i in range(b):
+        for t in range(total - n):
+            ret, k = 0.0, 0
+            for k in range(1, n + 2):
+                ret += gamma ** (k - 1) * reward[i, t + k - 1, 0].item()
+                if end[i, t + k - 1]:
+                    break
+            assert out.get("reward")[i, t, 0].item() == pytest.approx(ret, abs=1e-5)
+            assert out.get("steps_to_next_obs")[i, t, 0] == k
+            assert out.get("next_observation")[i, t, 0] == t + k
+            assert out.get("done")[i, t, 0] == done[i, t + k - 1, 0]
+    assert (out.get("original_reward") == reward[:, : total - n]).all()
+    torch.testing.assert_allclose(
+        out.get("gamma"), gamma ** out.get("steps_to_next_obs").float()
+    )
+
+    with pytest.raises(RuntimeError, match="rows"):
+        ms(tensordict[:2, :T])
+    ms.reset()
+    assert ms(tensordict[:2, :T]).batch_size == torch.Size([2, T - n])
+
+
 class TestSplits:
     @staticmethod
     def create_fake_trajs(
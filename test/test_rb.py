@@ -4,14 +4,43 @@
 # LICENSE file in the root directory of this source tree.
 
 import argparse
+import pickle
+import threading
 
 import numpy as np
 import pytest
 import torch
 from _utils_internal import get_available_devices
+from torch import multiprocessing as mp
+from torchrl._torchrl import (
+    KaryMinSegmentTreeFp64,
+    KarySumSegmentTreeFp64,
+    MinSegmentTreeFp64,
+    SumSegmentTreeFp64,
+)
 from torchrl.data import TensorDict
-from torchrl.data.replay_buffers import TensorDictPrioritizedReplayBuffer
+from torchrl.data.replay_buffers import (
+    CompressedStorage,
+    FrameStackStorage,
+    HindsightRelabel,
+    LazyMemmapStorage,
+    LazyTensorStorage,
+    ListStorage,
+    MaxAgeWriter,
+    OfflineDataset,
+    PrioritizedReplayBuffer,
+    PriorityWriter,
+    ReplayBuffer,
+    ReservoirWriter,
+    SequenceSampler,
+    SharedTensorDictPrioritizedReplayBuffer,
+    SharedTensorDictReplayBuffer,
+    TensorDictPrioritizedReplayBuffer,
+    TensorDictReplayBuffer,
+    TrajectoryIndex,
+)
 from torchrl.data.tensordict.tensordict import assert_allclose_td
+from torchrl.envs.transforms import CatFrames
 
 
 @pytest.mark.parametrize("priority_key", ["pk", "td_error"])
@@ -117,10 +146,1390 @@ def test_rb_trajectories():
     assert sampled_td.batch_size == torch.Size([3])
 
     # set back the trajectory length
-    sampled_td_filtered = sampled_td.to_tensordict().exclude("_weight", "index")
+    sampled_td_filtered = sampled_td.to_tensordict().exclude(
+        "_weight", "index", "td_error"
+    )
     sampled_td_filtered.batch_size = [3, 4]
 
 
+@pytest.mark.parametrize(
+    "storage_type", [ListStorage, LazyTensorStorage, LazyMemmapStorage]
+)
+@pytest.mark.parametrize("prioritized", [True, False])
+def test_rb_storages(storage_type, prioritized):
+    torch.manual_seed(0)
+    np.random.seed(0)
+    storage = storage_type(10)
+    if prioritized:
+        rb = TensorDictPrioritizedReplayBuffer(10, alpha=0.7, beta=0.9, storage=storage)
+    else:
+        rb = TensorDictReplayBuffer(10, storage=storage)
+    td = TensorDict({"obs": torch.randn(7, 4), "_idx": torch.arange(7)}, batch_size=[7])
+    rb.extend(td)
+    assert len(rb) == 7
+    s = rb.sample(5)
+    assert s.batch_size == torch.Size([5])
+    assert (td.get("obs")[s.get("_idx").squeeze(-1)] == s.get("obs")).all()
+    if prioritized:
+        assert (s.get("index") == s.get("_idx")).all()
+        s.set("td_error", torch.rand(5))
+        rb.update_priority(s)
+
+    # wrap around the end of the storage
+    td = TensorDict(
+        {"obs": torch.randn(7, 4), "_idx": torch.arange(7, 14)}, batch_size=[7]
+    )
+    idx = rb.extend(td)
+    assert (idx == np.array([7, 8, 9, 0, 1, 2, 3])).all()
+    assert len(rb) == 10
+    assert rb.cursor == 4
+    s = rb.sample(20)
+    _idx = s.get("_idx").squeeze(-1)
+    assert ((_idx >= 4) & (_idx < 14)).all()
+    data = rb[torch.tensor([0, 7])]
+    if prioritized:
+        data, weight = data
+    assert (data.get("_idx").squeeze(-1) == torch.tensor([10, 7])).all()
+
+
+def test_lazy_tensor_storage():
+    storage = LazyTensorStorage(10)
+    rb = ReplayBuffer(10, storage=storage)
+    rb.extend(torch.arange(8))
+    rb.add(torch.tensor(8))
+    assert len(rb) == 9
+    assert storage._storage.shape == torch.Size([10])
+    assert (rb[np.array([0, 8])] == torch.tensor([0, 8])).all()
+    assert (rb.sample(20) < 9).all()
+
+    storage = LazyTensorStorage(10)
+    td = TensorDict({"a": torch.zeros(3, 2, 5)}, batch_size=[3, 2])
+    storage.set(range(3), td)
+    assert storage._storage.batch_size == torch.Size([10, 2])
+    assert storage.get(np.array([0, 2])).batch_size == torch.Size([2, 2])
+    with pytest.raises(ValueError, match="does not match"):
+        ReplayBuffer(5, storage=storage)
+
+
+def test_memmap_storage_reopen(tmpdir):
+    storage = LazyMemmapStorage(10, scratch_dir=tmpdir)
+    rb = TensorDictReplayBuffer(10, storage=storage)
+    td = TensorDict(
+        {
+            "pixels": torch.randint(255, (12, 3, 8, 8), dtype=torch.uint8),
+            "reward": torch.randn(12, 1),
+        },
+        batch_size=[12],
+    )
+    rb.extend(td)
+    assert isinstance(storage._storage.get("pixels"), torch.Tensor)
+    assert (storage._storage.get("pixels")[:2] == td.get("pixels")[10:]).all()
+    storage.flush()
+    del rb, storage
+
+    storage = LazyMemmapStorage(10, scratch_dir=tmpdir)
+    rb = TensorDictReplayBuffer(10, storage=storage)
+    assert len(rb) == 10
+    assert rb.cursor == 2
+    sample = rb[np.arange(10)]
+    assert (sample.get("pixels")[:2] == td.get("pixels")[10:]).all()
+    assert (sample.get("reward")[2:] == td.get("reward")[2:10]).all()
+    rb.extend(td[:3])
+    assert rb.cursor == 5
+
+    with pytest.raises(ValueError, match="capacity"):
+        LazyMemmapStorage(20, scratch_dir=tmpdir)
+
+
+def _make_storage(storage_type, size):
+    if storage_type is CompressedStorage:
+        return storage_type(size, codecs={"pixels": "zlib"})
+    if storage_type is FrameStackStorage:
+        return storage_type(size, n_frames=1, keys=["pixels"])
+    return storage_type(size)
+
+
+@pytest.mark.parametrize(
+    "storage_type",
+    [
+        ListStorage,
+        LazyTensorStorage,
+        LazyMemmapStorage,
+        CompressedStorage,
+        FrameStackStorage,
+    ],
+)
+@pytest.mark.parametrize("prioritized", [False, True])
+def test_rb_dumps_loads(tmpdir, storage_type, prioritized):
+    torch.manual_seed(0)
+    np.random.seed(0)
+
+    def make_rb():
+        storage = _make_storage(storage_type, 10)
+        if prioritized:
+            return TensorDictPrioritizedReplayBuffer(
+                10, alpha=0.7, beta=0.9, storage=storage
+            )
+        return TensorDictReplayBuffer(10, storage=storage)
+
+    rb = make_rb()
+    td = TensorDict(
+        {
+            "pixels": torch.randint(255, (13, 1, 4, 4), dtype=torch.uint8),
+            "_idx": torch.arange(13),
+        },
+        batch_size=[13],
+    )
+    rb.extend(td[:6])
+    rb.extend(td[6:])
+    if prioritized:
+        s = rb.sample(5)
+        s.set("td_error", torch.rand(5) * 10)
+        rb.update_priority(s)
+    rb.dumps(tmpdir)
+
+    rb_load = make_rb()
+    rb_load.loads(tmpdir)
+    assert len(rb_load) == len(rb) == 10
+    assert rb_load.cursor == rb.cursor == 3
+    index = torch.arange(10)
+    data, data_load = rb[index], rb_load[index]
+    if prioritized:
+        (data, weight), (data_load, weight_load) = data, data_load
+        assert (weight == weight_load).all()
+        assert rb_load._sum_tree.query(0, 10) == rb._sum_tree.query(0, 10)
+        assert rb_load.max_priority == rb.max_priority
+    assert (data.get("_idx") == data_load.get("_idx")).all()
+    assert (data.get("pixels") == data_load.get("pixels")).all()
+
+    # the restored buffer can be extended and sampled as the original one
+    idx = rb_load.extend(td[:2])
+    assert (idx == np.array([3, 4])).all()
+    assert rb_load.sample(4).batch_size == torch.Size([4])
+
+    if storage_type is LazyTensorStorage:
+        # the saved storage can be re-opened in place
+        rb_memmap = TensorDictReplayBuffer(
+            10, storage=LazyMemmapStorage(10, scratch_dir=tmpdir / "storage")
+        )
+        assert len(rb_memmap) == 10
+        assert rb_memmap.cursor == 3
+        assert (rb_memmap[index].get("_idx") == data.get("_idx")).all()
+
+    with pytest.raises(ValueError, match="capacity"):
+        TensorDictReplayBuffer(5, storage=_make_storage(storage_type, 5)).loads(tmpdir)
+
+
+def test_shared_rb_dumps_loads(tmpdir):
+    td = TensorDict({"obs": torch.arange(7).unsqueeze(-1)}, batch_size=[7])
+    rb = SharedTensorDictPrioritizedReplayBuffer(10, td, alpha=0.7)
+    rb.extend(td)
+    rb.dumps(tmpdir)
+    rb_load = SharedTensorDictPrioritizedReplayBuffer(10, td, alpha=0.7)
+    rb_load.loads(tmpdir)
+    assert len(rb_load) == 7
+    assert (rb_load._sum_nodes == rb._sum_nodes).all()
+    sample = rb_load.sample(20)
+    assert (sample.get("obs") == sample.get("index")).all()
+
+
+@pytest.mark.parametrize("dtype", [torch.float, torch.double])
+def test_prb_stratified_sample(dtype):
+    torch.manual_seed(0)
+    rb = PrioritizedReplayBuffer(
+        8, alpha=1.0, beta=0.5, eps=0.0, dtype=dtype, storage=LazyTensorStorage(8)
+    )
+    priority = torch.tensor([1.0, 2.0, 3.0, 4.0, 0.5, 0.5])
+    rb.extend(torch.arange(6), priority)
+    index, weight = rb._sum_tree.stratified_sample(rb._min_tree, 12, 0.5, 5)
+    assert index.dtype == torch.long
+    assert weight.dtype == dtype
+    # stratified sampling: one sample per segment of equal mass
+    assert (index == index.sort().values).all()
+    torch.testing.assert_close(
+        weight, (priority[index] / priority.min()).pow(-0.5), check_dtype=False
+    )
+
+    data, weight, index = rb.sample(100_000)
+    assert (data == index).all()
+    freq = torch.bincount(index, minlength=6) / 100_000
+    torch.testing.assert_close(freq, priority / priority.sum(), atol=1e-3, rtol=0)
+
+
+class _ReservingSumTree:
+    # reserves the first slots of the buffer from another thread during the
+    # first draw, which must not hold the replay lock
+    def __init__(self, rb, n_slots):
+        self.rb = rb
+        self.tree = rb._sum_tree
+        self.n_slots = n_slots
+        self.index = None
+        self.n_draws = 0
+
+    def __getattr__(self, name):
+        return getattr(self.tree, name)
+
+    def __setitem__(self, index, value):
+        self.tree[index] = value
+
+    def __getitem__(self, index):
+        return self.tree[index]
+
+    def stratified_sample(self, *args):
+        self.n_draws += 1
+        out = self.tree.stratified_sample(*args)
+        if self.index is None:
+            thread = threading.Thread(target=self._reserve)
+            thread.start()
+            thread.join(10)
+            assert self.index is not None
+        return out
+
+    def _reserve(self):
+        with self.rb._replay_lock:
+            self.index = self.rb._reserve(self.n_slots)
+
+
+def test_prb_sample_unlocked():
+    torch.manual_seed(0)
+    rb = PrioritizedReplayBuffer(8, alpha=1.0, beta=0.5, storage=LazyTensorStorage(8))
+    rb.extend(torch.arange(8))
+    rb._sum_tree = tree = _ReservingSumTree(rb, 4)
+    # the slots reserved during the draw are not sampled
+    data, weight, index = rb.sample(100)
+    assert (tree.index == np.arange(4)).all()
+    assert tree.n_draws > 1
+    assert (data == index).all()
+    assert (index >= 4).all()
+    with rb._replay_lock:
+        rb._commit(tree.index, priority=1.0)
+    data, weight, index = rb.sample(100)
+    assert (index < 4).any()
+
+
+@pytest.mark.parametrize("size", [1, 7, 100, 1025, 10_000])
+@pytest.mark.parametrize("fanout", [2, 3, 4, 16])
+def test_kary_segment_tree(size, fanout):
+    rng = np.random.RandomState(0)
+    sum_tree, min_tree = SumSegmentTreeFp64(size), MinSegmentTreeFp64(size)
+    kary_sum_tree = KarySumSegmentTreeFp64(size, fanout)
+    kary_min_tree = KaryMinSegmentTreeFp64(size, fanout)
+    assert kary_sum_tree.fanout == fanout
+    assert kary_sum_tree.capacity < fanout + size
+
+    value = rng.rand(size)
+    for tree in (sum_tree, min_tree, kary_sum_tree, kary_min_tree):
+        tree[np.arange(size)] = value
+    index = rng.randint(size, size=size // 2 + 1)
+    for tree in (sum_tree, min_tree, kary_sum_tree, kary_min_tree):
+        tree[index] = 2.0
+        tree[int(index[0])] = 0.5
+
+    l = rng.randint(size, size=50)
+    r = l + 1 + rng.randint(size, size=50) % (size - l)
+    np.testing.assert_allclose(kary_sum_tree.query(l, r), sum_tree.query(l, r))
+    np.testing.assert_allclose(kary_min_tree.query(l, r), min_tree.query(l, r))
+    assert kary_sum_tree.query(0, size) == pytest.approx(sum_tree.query(0, size))
+    assert kary_min_tree.query(0, size) == min_tree.query(0, size)
+    leaves = min_tree[np.arange(size)]
+    assert min_tree.argmin() == kary_min_tree.argmin() == np.argmin(leaves)
+    np.testing.assert_allclose(
+        kary_sum_tree[np.arange(size)], sum_tree[np.arange(size)]
+    )
+
+    mass = rng.uniform(0, sum_tree.query(0, size), size=100)
+    np.testing.assert_array_equal(
+        kary_sum_tree.scan_lower_bound(mass), sum_tree.scan_lower_bound(mass)
+    )
+    assert kary_sum_tree.scan_lower_bound(sum_tree.query(0, size) + 1) == size
+    mass[0] = sum_tree.query(0, size) + 1
+    assert kary_sum_tree.scan_lower_bound(mass)[0] == size
+
+    # out-of-range indices are rejected before any node is written
+    total = kary_sum_tree.query(0, size)
+    with pytest.raises(RuntimeError, match="out of range"):
+        kary_sum_tree[size] = 1.0
+    with pytest.raises(RuntimeError, match="out of range"):
+        kary_sum_tree[np.array([0, -1])] = 1.0
+    with pytest.raises(RuntimeError, match="out of range"):
+        kary_sum_tree[np.array([size])]
+    assert kary_sum_tree.query(0, size) == total
+
+    kary_sum_tree_copy = pickle.loads(pickle.dumps(kary_sum_tree))
+    assert kary_sum_tree_copy.fanout == fanout
+    np.testing.assert_allclose(
+        kary_sum_tree_copy.query(l, r), kary_sum_tree.query(l, r)
+    )
+
+
+def test_prb_fanout():
+    torch.manual_seed(0)
+    rb = TensorDictPrioritizedReplayBuffer(
+        10, alpha=0.7, beta=0.9, storage=LazyTensorStorage(10), fanout=4
+    )
+    td = TensorDict(
+        {"td_error": torch.rand(7), "_idx": torch.arange(7)}, batch_size=[7]
+    )
+    rb.extend(td)
+    s = rb.sample(5, return_weight=True)
+    assert (s.get("index") == s.get("_idx")).all()
+    assert s.get("_weight").shape == torch.Size([5, 1])
+    s.set("td_error", torch.full((5,), 100.0))
+    rb.update_priority(s)
+    index = s.get("index").numpy()
+    priority = rb._sum_tree[index]
+    assert (priority == priority[0]).all()
+    assert rb._sum_tree.query(0, 7) == pytest.approx(rb._sum_tree[np.arange(7)].sum())
+
+
+def test_prb_deferred_updates():
+    torch.manual_seed(0)
+    np.random.seed(0)
+    rb = TensorDictPrioritizedReplayBuffer(
+        10, alpha=0.7, beta=0.9, storage=LazyTensorStorage(10), deferred_updates=8
+    )
+    rb.extend(TensorDict({"_idx": torch.arange(10)}, batch_size=[10]))
+    default_priority = rb._sum_tree[0]
+
+    s = rb.sample(5)
+    s.set("td_error", torch.full((5,), 3.0))
+    rb.update_priority(s)
+    # nothing is written until the next sample
+    assert (rb._sum_tree[np.arange(10)] == default_priority).all()
+    # slot 0 is overwritten before the updates are applied: they are stale
+    rb.update_priority(
+        TensorDict(
+            {"index": torch.tensor([0, 9]), "td_error": torch.tensor([10.0, 10.0])},
+            [2],
+        )
+    )
+    rb.add(TensorDict({"_idx": torch.tensor(0)}, []))
+    rb.sample(5)
+    index = s.get("index").squeeze(-1).numpy()
+    index = index[(index != 0) & (index != 9)]
+    assert rb._sum_tree[index] == pytest.approx((3.0 + rb.eps) ** rb.alpha)
+    assert rb._sum_tree[9] == pytest.approx((10.0 + rb.eps) ** rb.alpha)
+    assert rb._sum_tree[0] == default_priority
+    assert rb.max_priority == 10.0
+
+    # a full staging area is written right away
+    rb.update_priority(
+        TensorDict({"index": torch.arange(8), "td_error": torch.full((8,), 0.5)}, [8])
+    )
+    assert rb._sum_tree[np.arange(8)] == pytest.approx(
+        np.full(8, (0.5 + rb.eps) ** rb.alpha)
+    )
+
+    rb.update_priority(
+        TensorDict({"index": torch.arange(2), "td_error": -torch.ones(2)}, [2])
+    )
+    with pytest.raises(RuntimeError, match="positive value"):
+        rb.sample(5)
+
+
+@pytest.mark.parametrize("deferred_updates", [None, 4])
+@pytest.mark.parametrize("prefetch", [None, 2])
+def test_prb_channels(tmpdir, deferred_updates, prefetch):
+    torch.manual_seed(0)
+    np.random.seed(0)
+    rb = TensorDictPrioritizedReplayBuffer(
+        20,
+        alpha=0.7,
+        beta=0.9,
+        storage=LazyTensorStorage(20),
+        deferred_updates=deferred_updates,
+        prefetch=prefetch,
+        channels={"advantage": (1.0, 0.5)},
+    )
+    assert rb.channels == ("advantage",)
+    rb.extend(
+        TensorDict({"_idx": torch.arange(20), "td_error": torch.arange(20.0)}, [20])
+    )
+    channel = rb._channels["advantage"]
+    # new elements get the max priority of the channel
+    assert channel.sum_tree.query(0, 20) == pytest.approx(20 * (1.0 + rb.eps))
+
+    # the channels are sampled and updated independently
+    index = torch.arange(20)
+    advantage = torch.zeros(20)
+    advantage[3] = 100.0
+    rb.update_priority(
+        TensorDict({"index": index, "advantage": advantage}, [20]),
+        channel="advantage",
+    )
+    for _ in range(3):
+        s = rb.sample(8, return_weight=True, channel="advantage")
+        assert (s.get("index") == 3).all()
+        assert (s.get("_idx") == 3).all()
+        s = rb.sample(8)
+        assert (s.get("index") != 0).all()
+    assert channel.max_priority == 100.0
+    assert rb.max_priority == 19.0
+    assert rb._sum_tree[3] == pytest.approx((3.0 + rb.eps) ** rb.alpha)
+
+    # overwritten elements get the max priority of each channel again
+    rb.extend(TensorDict({"_idx": torch.arange(20, 22)}, [2]))
+    assert channel.sum_tree[np.arange(2)] == pytest.approx(np.full(2, 100.0 + rb.eps))
+    usage = rb.memory_usage()
+    assert usage["sum_tree/advantage"] == usage["sum_tree"]
+
+    rb.dumps(str(tmpdir))
+    rb_load = TensorDictPrioritizedReplayBuffer(
+        20,
+        alpha=0.7,
+        beta=0.9,
+        storage=LazyTensorStorage(20),
+        channels={"advantage": (1.0, 0.5)},
+    )
+    rb_load.loads(str(tmpdir))
+    channel_load = rb_load._channels["advantage"]
+    assert channel_load.sum_tree.query(0, 20) == channel.sum_tree.query(0, 20)
+    assert channel_load.max_priority == 100.0
+    with pytest.raises(ValueError, match="priority channels"):
+        TensorDictPrioritizedReplayBuffer(20, alpha=0.7, beta=0.9).loads(str(tmpdir))
+    with pytest.raises(KeyError, match="Unknown priority channel"):
+        rb.sample(4, channel="recency")
+    with pytest.raises(ValueError, match="alpha"):
+        PrioritizedReplayBuffer(10, alpha=0.7, beta=0.9, channels={"a": (0.0, 1.0)})
+
+
+def test_reservoir_writer():
+    np.random.seed(0)
+    size, n_batches, batch_size = 50, 200, 10
+    counts = np.zeros(n_batches * batch_size)
+    for _ in range(20):
+        rb = ReplayBuffer(
+            size, storage=LazyTensorStorage(size), writer=ReservoirWriter()
+        )
+        for i in range(n_batches):
+            data = torch.arange(i * batch_size, (i + 1) * batch_size)
+            index = rb.extend(data)
+            assert ((index >= -1) & (index < size)).all()
+            stored = rb._storage._storage[: len(rb)]
+            # the elements discarded by the writer are not written
+            assert (stored[index[index >= 0]] == data[index >= 0]).all()
+            assert not np.isin(data[index < 0].numpy(), stored.numpy()).any()
+        stored = stored.numpy()
+        assert len(np.unique(stored)) == size
+        counts[stored] += 1
+    # the elements of the stream are kept with the same probability
+    first_half = counts[: len(counts) // 2].sum()
+    second_half = counts[len(counts) // 2 :].sum()
+    assert abs(first_half - second_half) / counts.sum() < 0.1
+    with pytest.raises(RuntimeError, match="already used"):
+        ReplayBuffer(size, writer=rb._writer)
+
+
+@pytest.mark.parametrize("storage_type", [ListStorage, LazyTensorStorage])
+def test_round_robin_writer_large_batch(storage_type):
+    rb = ReplayBuffer(5, storage=storage_type(5))
+    index = rb.extend(torch.arange(12))
+    # only the last element written to each slot is kept
+    assert index.tolist() == [-1] * 7 + [2, 3, 4, 0, 1]
+    assert [int(rb._storage[i]) for i in range(5)] == [10, 11, 7, 8, 9]
+    assert rb.cursor == 2
+    index = rb.extend(torch.arange(12, 14))
+    assert index.tolist() == [2, 3]
+
+
+@pytest.mark.parametrize("fanout", [None, 4])
+def test_priority_writer(fanout):
+    torch.manual_seed(0)
+    rb = TensorDictPrioritizedReplayBuffer(
+        10,
+        alpha=1.0,
+        beta=0.5,
+        storage=LazyTensorStorage(10),
+        fanout=fanout,
+        writer=PriorityWriter(),
+    )
+    td_error = torch.tensor([5.0, 1.0, 6.0, 7.0, 0.5, 8.0, 9.0, 2.0, 10.0, 11.0])
+    rb.extend(TensorDict({"_idx": torch.arange(10), "td_error": td_error}, [10]))
+    index = rb.extend(
+        TensorDict(
+            {"_idx": torch.arange(10, 13), "td_error": torch.full((3,), 20.0)}, [3]
+        )
+    )
+    # the three elements of lowest priority are evicted
+    assert sorted(index.tolist()) == [1, 4, 7]
+    stored = rb._storage._storage.get("_idx").squeeze(-1)
+    assert (stored[[1, 4, 7]] == torch.arange(10, 13)[index.argsort().argsort()]).all()
+    sample = rb.sample(100)
+    assert (sample.get("_idx") != 1).all()
+    with pytest.raises(TypeError):
+        ReplayBuffer(10, writer=PriorityWriter())
+
+    # the staged priority updates are applied before the eviction
+    rb = TensorDictPrioritizedReplayBuffer(
+        10,
+        alpha=1.0,
+        beta=0.5,
+        storage=LazyTensorStorage(10),
+        fanout=fanout,
+        writer=PriorityWriter(),
+        deferred_updates=100,
+    )
+    rb.extend(TensorDict({"_idx": torch.arange(10), "td_error": td_error}, [10]))
+    rb.update_priority(
+        TensorDict({"index": torch.tensor([9]), "td_error": torch.tensor([0.1])}, [1])
+    )
+    assert len(rb._staged_updates)
+    index = rb.extend(TensorDict({"_idx": torch.tensor([10])}, [1]))
+    assert index.tolist() == [9]
+
+    # the slots being written are never handed out again
+    with rb._replay_lock:
+        reserved = rb._reserve(10)
+    assert sorted(reserved.tolist()) == list(range(10))
+    index = rb.extend(TensorDict({"_idx": torch.arange(11, 14)}, [3]))
+    assert index.tolist() == [-1, -1, -1]
+    # hidden slots that are not being written anymore can be reused
+    with rb._replay_lock:
+        rb._commit(reserved[:4])
+    index = rb.extend(TensorDict({"_idx": torch.arange(11, 17)}, [6]))
+    assert index.tolist() == [-1, -1] + sorted(reserved[:4].tolist())
+    assert not np.isin(index, reserved[4:]).any()
+
+
+@pytest.mark.parametrize("prioritized", [False, True])
+def test_max_age_writer(prioritized):
+    torch.manual_seed(0)
+    kwargs = {"storage": LazyTensorStorage(100), "writer": MaxAgeWriter(3)}
+    if prioritized:
+        rb = TensorDictPrioritizedReplayBuffer(100, alpha=0.7, beta=0.5, **kwargs)
+    else:
+        rb = TensorDictReplayBuffer(100, **kwargs)
+    for i in range(5):
+        rb.extend(TensorDict({"step": torch.full((10,), i)}, [10]))
+    # only the data of the last three writes is sampled
+    step = rb.sample(200).get("step")
+    assert (step >= 2).all()
+    assert set(step.unique().tolist()) == {2, 3, 4}
+
+    rb = TensorDictReplayBuffer(
+        10, storage=LazyTensorStorage(10), writer=MaxAgeWriter(1)
+    )
+    rb.extend(TensorDict({"step": torch.zeros(4)}, [4]))
+    rb.extend(TensorDict({"step": torch.ones(4)}, [4]))
+    assert (rb.sample(20).get("step") == 1).all()
+    with pytest.raises(ValueError):
+        MaxAgeWriter(0)
+
+    # the slots that have not expired are drawn directly, even when they are
+    # a small fraction of the buffer
+    storage = LazyTensorStorage(1000)
+    storage.set(np.arange(1000), TensorDict({"step": torch.zeros(1000)}, [1000]))
+    rb = TensorDictReplayBuffer(1000, storage=storage, writer=MaxAgeWriter(1))
+    assert (rb.sample(20).get("step") == 0).all()
+    for i in range(1, 3):
+        rb.extend(TensorDict({"step": torch.full((2,), i)}, [2]))
+    assert rb._writer._n_expired == 998
+    index = rb._writer._sample_index(100)
+    assert set(index.tolist()) == {2, 3}
+    assert (rb.sample(20).get("step") == 2).all()
+
+
+def test_writer_dumps_loads(tmpdir):
+    def make_rb():
+        return TensorDictReplayBuffer(
+            20, storage=LazyTensorStorage(20), writer=MaxAgeWriter(2)
+        )
+
+    rb = make_rb()
+    for i in range(3):
+        rb.extend(TensorDict({"step": torch.full((4,), i)}, [4]))
+    rb.dumps(tmpdir)
+    rb_load = make_rb()
+    rb_load.loads(tmpdir)
+    assert (rb_load.sample(50).get("step") >= 1).all()
+    rb_load.extend(TensorDict({"step": torch.full((4,), 3)}, [4]))
+    assert (rb_load.sample(50).get("step") >= 2).all()
+
+
+@pytest.mark.parametrize("size", [7, 64])
+def test_trajectory_index(size):
+    np.random.seed(0)
+    torch.manual_seed(0)
+    rb = TensorDictReplayBuffer(size, storage=LazyTensorStorage(size))
+    trajectories = TrajectoryIndex(rb)
+    traj_id = 0
+    for _ in range(30):
+        batch_size = np.random.randint(1, 2 * size)
+        done = torch.rand(batch_size) < 0.15
+        traj_ids = []
+        for d in done:
+            traj_ids.append(traj_id)
+            traj_id += int(d or np.random.rand() < 0.05)
+        rb.extend(
+            TensorDict(
+                {
+                    "traj_ids": torch.tensor(traj_ids).unsqueeze(-1),
+                    "done": done.unsqueeze(-1),
+                    "reward": torch.ones(batch_size, 1),
+                },
+                [batch_size],
+            )
+        )
+
+        # the index matches a scan of the storage, from the oldest step
+        first_slot = rb._cursor if len(rb) == size else 0
+        slots = (first_slot + torch.arange(len(rb))) % size
+        stored = rb._storage._storage[slots]
+        stored_ids = stored.get("traj_ids").view(-1)
+        stored_done = stored.get("done").view(-1)
+        first = torch.ones(len(rb), dtype=torch.bool)
+        first[1:] = (stored_ids[1:] != stored_ids[:-1]) | stored_done[:-1]
+        lengths = torch.diff(
+            torch.cat([first.nonzero().view(-1), torch.tensor([len(rb)])])
+        )
+        start, length = trajectories.trajectories()
+        expected = dict(zip(slots[first].tolist(), lengths.tolist()))
+        assert dict(zip(start.tolist(), length.tolist())) == expected
+        assert (trajectories.episode_return(start) == length).all()
+
+    index = torch.randint(len(rb), (100,))
+    start, length = trajectories.trajectory_of(index)
+    future = trajectories.future_index(index)
+    offset = (index - start) % size
+    assert ((future - index) % size < length - offset).all()
+    ids = rb._storage._storage.get("traj_ids").view(-1)
+    assert (ids[future] == ids[index]).all()
+
+    sample = trajectories.sample(8)
+    mask = sample.get("mask").squeeze(-1)
+    assert sample.shape == torch.Size([8, mask.sum(1).max()])
+    sample_ids = sample.get("traj_ids").squeeze(-1)
+    assert (sample_ids[mask] == sample_ids[:, :1].expand_as(mask)[mask]).all()
+    assert (sample.get("reward")[~mask] == 0).all()
+
+
+def test_trajectory_index_out_of_order_commits():
+    rb = TensorDictReplayBuffer(12, storage=LazyTensorStorage(12))
+    trajectories = TrajectoryIndex(rb)
+
+    def write(index, traj_ids, done):
+        rb._storage[index] = TensorDict(
+            {
+                "traj_ids": torch.tensor(traj_ids).unsqueeze(-1),
+                "done": torch.tensor(done).unsqueeze(-1),
+            },
+            [len(index)],
+        )
+
+    with rb._replay_lock:
+        first = rb._reserve(4)
+        second = rb._reserve(4)
+    write(first, [0, 0, 1, 1], [False, True, False, False])
+    write(second, [1, 1, 2, 2], [False, False, False, False])
+    # the newer slots are committed first, then linked to the older ones
+    with rb._replay_lock:
+        rb._commit(second)
+    start, length = trajectories.trajectories()
+    assert dict(zip(start.tolist(), length.tolist())) == {4: 2, 6: 2}
+    with rb._replay_lock:
+        rb._commit(first)
+    start, length = trajectories.trajectories()
+    assert dict(zip(start.tolist(), length.tolist())) == {0: 2, 2: 4, 6: 2}
+
+    # the slot at the cursor holds the oldest steps and is not linked
+    rb.extend(
+        TensorDict(
+            {"traj_ids": torch.full((4, 1), 2), "done": torch.zeros(4, 1, dtype=bool)},
+            [4],
+        )
+    )
+    with rb._replay_lock:
+        third = rb._reserve(2)
+        fourth = rb._reserve(2)
+    write(third, [2, 2], [False, False])
+    write(fourth, [1, 1], [False, False])
+    with rb._replay_lock:
+        rb._commit(fourth)
+        rb._commit(third)
+    assert rb._cursor == 4
+    start, length = trajectories.trajectories()
+    assert dict(zip(start.tolist(), length.tolist())) == {2: 2, 4: 2, 6: 8}
+
+
+@pytest.mark.parametrize("prefetch", [None, 2])
+@pytest.mark.parametrize("prioritized", [False, True])
+def test_hindsight_relabel(prefetch, prioritized):
+    torch.manual_seed(0)
+    np.random.seed(0)
+    kwargs = {"storage": LazyTensorStorage(100), "prefetch": prefetch}
+    if prioritized:
+        rb = TensorDictPrioritizedReplayBuffer(100, alpha=0.7, beta=0.5, **kwargs)
+    else:
+        rb = TensorDictReplayBuffer(100, **kwargs)
+
+    def reward_fn(achieved_goal, desired_goal):
+        return (achieved_goal == desired_goal).all(-1).float()
+
+    relabel = HindsightRelabel(TrajectoryIndex(rb), reward_fn, relabel_ratio=0.5)
+    fetch = relabel._fetch
+
+    def locked_fetch(index):
+        # the future steps are drawn before the sampled slots can be
+        # overwritten
+        assert rb._replay_lock._is_owned()
+        return fetch(index)
+
+    relabel._fetch = locked_fetch
+    rb.transform = relabel
+    # 10 trajectories of 8 steps, the goal achieved at step t is t + 1
+    step = torch.arange(8).repeat(10)
+    traj_ids = torch.arange(10).repeat_interleave(8)
+    rb.extend(
+        TensorDict(
+            {
+                "traj_ids": traj_ids.unsqueeze(-1),
+                "step": step.unsqueeze(-1),
+                "next_achieved_goal": torch.stack([traj_ids, step + 1], -1),
+                "desired_goal": torch.full((80, 2), -1),
+                "reward": torch.zeros(80, 1),
+            },
+            [80],
+        )
+    )
+    for _ in range(3):
+        sample = rb.sample(200)
+        goal = sample.get("desired_goal")
+        relabeled = (goal != -1).all(-1)
+        assert 0.35 < relabeled.float().mean() < 0.65
+        # the goals come from the same trajectory, at the same or a later step
+        traj_ids = sample.get("traj_ids").squeeze(-1)
+        step = sample.get("step").squeeze(-1)
+        assert (goal[relabeled, 0] == traj_ids[relabeled]).all()
+        assert (goal[relabeled, 1] >= step[relabeled] + 1).all()
+        assert (goal[relabeled, 1] <= 8).all()
+        achieved = (goal[:, 1] == step + 1) & relabeled
+        assert (sample.get("reward").squeeze(-1) == achieved.float()).all()
+    # the stored goals are not modified
+    assert (rb._storage._storage.get("desired_goal")[:80] == -1).all()
+
+
+@pytest.mark.parametrize("size", [30, 100])
+@pytest.mark.parametrize("recurrent", [True, False])
+@pytest.mark.parametrize("compressed", [True, False])
+def test_sequence_sampler(size, recurrent, compressed):
+    torch.manual_seed(0)
+    if compressed:
+        storage = CompressedStorage(size, codecs={"pixels": "zlib"})
+    else:
+        storage = LazyTensorStorage(size)
+    rb = TensorDictReplayBuffer(size, storage=storage)
+    n_envs, n_steps, seq_len = 2, 5, 3
+    traj_ids = torch.arange(n_envs).unsqueeze(-1).expand(n_envs, n_steps)
+    step_count = torch.arange(n_steps).expand(n_envs, n_steps)
+    for i in range(8):
+        done = torch.zeros(n_envs, n_steps, dtype=torch.bool)
+        done[0, 2] = True
+        td = TensorDict(
+            {
+                "traj_ids": (traj_ids + 2 * i).unsqueeze(-1),
+                "step_count": (step_count + n_steps * i).unsqueeze(-1),
+                "done": done.unsqueeze(-1),
+                "hidden": torch.randn(n_envs, n_steps, 4),
+                "pixels": (step_count + n_steps * i)
+                .to(torch.uint8)
+                .view(n_envs, n_steps, 1, 1)
+                .expand(n_envs, n_steps, 3, 3)
+                .clone(),
+            },
+            batch_size=[n_envs, n_steps],
+        )
+        rb.extend(td.view(-1).contiguous())
+    sampler = SequenceSampler(
+        rb, seq_len, recurrent_state_keys=["hidden"] if recurrent else None
+    )
+    sample = sampler.sample(64)
+    assert sample.shape == torch.Size([64, seq_len])
+    traj_ids = sample.get("traj_ids").squeeze(-1)
+    step_count = sample.get("step_count").squeeze(-1)
+    assert (traj_ids == traj_ids[:, :1]).all()
+    assert (step_count.diff(dim=1) == 1).all()
+    assert not sample.get("done")[:, :-1].any()
+    # keys stored outside of the columns of the storage are gathered too
+    pixels = sample.get("pixels")
+    assert (pixels == step_count.to(torch.uint8).view(64, seq_len, 1, 1)).all()
+    hidden = rb._storage._storage.get("hidden")[sample.get("index").squeeze(-1)]
+    if recurrent:
+        assert (sample.get("hidden") == hidden[:, :1]).all()
+    else:
+        assert (sample.get("hidden") == hidden).all()
+
+    with pytest.raises(RuntimeError, match="No trajectory segment"):
+        SequenceSampler(rb, n_steps + 1).sample(4)
+    with pytest.raises(TypeError):
+        SequenceSampler(TensorDictReplayBuffer(size), seq_len)
+
+
+def _catframes_rollout(n_steps, episode_len, n_frames):
+    # mimics the transitions written by a collector with CatFrames on
+    catframes = CatFrames(N=n_frames, keys=["next_pixels"])
+    frames = torch.randint(255, (n_steps + 1, 1, 6, 6), dtype=torch.uint8)
+    pixels, next_pixels, done = [], [], []
+    obs = catframes._apply_transform(frames[0])
+    for t in range(n_steps):
+        next_obs = catframes._apply_transform(frames[t + 1])
+        pixels.append(obs)
+        next_pixels.append(next_obs)
+        done.append((t + 1) % episode_len == 0)
+        if done[-1]:
+            catframes.reset(None)
+            next_obs = catframes._apply_transform(frames[t + 1].flip(-1))
+        obs = next_obs
+    return TensorDict(
+        {
+            "pixels": torch.stack(pixels),
+            "next_pixels": torch.stack(next_pixels),
+            "done": torch.tensor(done).unsqueeze(-1),
+        },
+        [n_steps],
+    )
+
+
+@pytest.mark.parametrize("n_frames", [1, 4])
+def test_frame_stack_storage(n_frames):
+    torch.manual_seed(0)
+    size, n_steps, episode_len = 30, 50, 7
+    data = _catframes_rollout(n_steps, episode_len, n_frames)
+    storage = FrameStackStorage(size, n_frames=n_frames)
+    rb = TensorDictReplayBuffer(size, storage=storage)
+    for i in range(0, n_steps, 10):
+        rb.extend(data[i : i + 10].clone())
+    # one frame per step plus one per episode
+    n_episodes = -(-n_steps // episode_len)
+    assert storage._next_frame_id <= n_steps + n_episodes + 1
+
+    index = torch.arange(size)
+    data_index = index + size * (index < n_steps - size)
+    sample = storage.get(index)
+    assert (sample.get("pixels") == data.get("pixels")[data_index]).all()
+    assert (sample.get("next_pixels") == data.get("next_pixels")[data_index]).all()
+    assert (sample.get("done") == data.get("done")[data_index]).all()
+    assert (storage[3].get("pixels") == data.get("pixels")[33]).all()
+    assert rb.sample(5).get("pixels").shape == torch.Size([5, n_frames, 6, 6])
+
+
+def test_frame_stack_storage_capacity():
+    data = _catframes_rollout(20, 5, 4)
+    storage = FrameStackStorage(10, n_frames=4, frame_capacity=8)
+    with pytest.raises(RuntimeError, match="Increase frame_capacity"):
+        storage.set(range(10), data[:10])
+
+
+def test_frame_stack_storage_writer():
+    # frames are evicted in write order, which other writers do not follow
+    with pytest.raises(TypeError, match="requires a RoundRobinWriter"):
+        TensorDictReplayBuffer(
+            10, storage=FrameStackStorage(10), writer=ReservoirWriter()
+        )
+    TensorDictReplayBuffer(10, storage=FrameStackStorage(10), writer=MaxAgeWriter(4))
+
+
+@pytest.mark.parametrize("codec", ["zlib", "lzma"])
+@pytest.mark.parametrize("prefetch", [None, 3])
+def test_compressed_storage(codec, prefetch):
+    torch.manual_seed(0)
+    pixels = torch.zeros(15, 3, 16, 16, dtype=torch.uint8)
+    pixels[:, :, 4:8] = torch.randint(255, (15, 3, 1, 1), dtype=torch.uint8)
+    td = TensorDict(
+        {"pixels": pixels, "obs": torch.arange(15).unsqueeze(-1)}, batch_size=[15]
+    )
+    storage = CompressedStorage(10, codecs={"pixels": codec})
+    rb = TensorDictReplayBuffer(10, storage=storage, prefetch=prefetch)
+    rb.extend(td[:10].clone())
+    rb.extend(td[10:].clone())
+    assert storage.compression_ratio > 5
+
+    for _ in range(3):
+        sample = rb.sample(4)
+        index = sample.get("obs").squeeze(-1)
+        assert (sample.get("pixels") == pixels[index]).all()
+    assert (rb[2].get("pixels") == pixels[12]).all()
+    assert (storage[7].get("pixels") == pixels[7]).all()
+
+    with pytest.raises(ValueError, match="Unknown codec"):
+        CompressedStorage(10, codecs={"pixels": "png"})
+
+
+@pytest.mark.parametrize("prioritized", [True, False])
+@pytest.mark.parametrize("prefetch", [None, 2])
+@pytest.mark.parametrize(
+    "storage_type", [LazyTensorStorage, LazyMemmapStorage, CompressedStorage]
+)
+def test_output_buffers(prioritized, prefetch, storage_type):
+    torch.manual_seed(0)
+    num_output_buffers = 3
+    if storage_type is CompressedStorage:
+        storage = storage_type(50, codecs={"pixels": "zlib"})
+    else:
+        storage = storage_type(50)
+    kwargs = {
+        "storage": storage,
+        "prefetch": prefetch,
+        "num_output_buffers": num_output_buffers,
+    }
+    if prioritized:
+        rb = TensorDictPrioritizedReplayBuffer(50, alpha=0.7, beta=0.9, **kwargs)
+    else:
+        rb = TensorDictReplayBuffer(50, **kwargs)
+    rb.extend(
+        TensorDict(
+            {
+                "obs": torch.arange(50).unsqueeze(-1),
+                "pixels": torch.arange(50, dtype=torch.uint8)
+                .view(50, 1, 1, 1)
+                .expand(50, 1, 4, 4)
+                .contiguous(),
+            },
+            batch_size=[50],
+        )
+    )
+    data_ptrs = set()
+    for _ in range(10):
+        if prioritized:
+            sample = rb.sample(8, return_weight=True)
+            assert (sample.get("index") == sample.get("obs")).all()
+            assert sample.get("_weight").shape == torch.Size([8, 1])
+        else:
+            sample = rb.sample(8)
+        assert (sample.get("pixels")[:, 0, 0, 0] == sample.get("obs")[:, 0]).all()
+        data_ptrs.add(sample.get("obs").data_ptr())
+    # the first sample is used as template for the outputs
+    assert len(data_ptrs) == num_output_buffers + 1
+
+    with pytest.raises(ValueError, match="at least prefetch"):
+        TensorDictReplayBuffer(
+            50, storage=storage_type(50), prefetch=3, num_output_buffers=3
+        )
+    with pytest.raises(ValueError, match="contiguous storage"):
+        TensorDictReplayBuffer(50, num_output_buffers=3)
+
+
+class _BlockingStorage(LazyTensorStorage):
+    def __init__(self, max_size):
+        super().__init__(max_size)
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def set(self, cursor, data):
+        if isinstance(cursor, np.ndarray) and len(cursor) > 1:
+            self.writing.set()
+            assert self.release.wait(10)
+        super().set(cursor, data)
+
+
+@pytest.mark.parametrize("prioritized", [False, True])
+@pytest.mark.parametrize("storage_type", ["list", "lazy"])
+def test_memory_usage(prioritized, storage_type):
+    td = TensorDict(
+        {"obs": torch.zeros(15, 4), "action": torch.zeros(15, 2, dtype=torch.long)},
+        batch_size=[15],
+    )
+    storage = ListStorage(10) if storage_type == "list" else LazyTensorStorage(10)
+    if prioritized:
+        rb = PrioritizedReplayBuffer(10, alpha=0.7, beta=0.9, storage=storage)
+    else:
+        rb = ReplayBuffer(10, storage=storage)
+    n_stored = 5 if storage_type == "list" else 10
+    rb.extend(td[:5])
+    usage = rb.memory_usage()
+    assert usage["storage/obs"] == n_stored * 4 * 4
+    assert usage["storage/action"] == n_stored * 2 * 8
+    assert usage["storage"] == n_stored * 32
+    assert usage["bytes_per_transition"] == 32
+    if prioritized:
+        assert usage["sum_tree"] > 0 and usage["min_tree"] > 0
+        assert usage["total"] == (
+            usage["storage"] + usage["sum_tree"] + usage["min_tree"]
+        )
+    else:
+        assert usage["total"] == usage["storage"]
+    rb.extend(td[5:])
+    assert rb.memory_usage()["storage"] == 10 * 32
+
+
+@pytest.mark.parametrize("prioritized", [False, True])
+@pytest.mark.parametrize("prefetch", [None, 2])
+def test_replay_buffer_stats(prioritized, prefetch):
+    td = TensorDict({"obs": torch.randn(20, 4)}, batch_size=[20])
+    if prioritized:
+        rb = TensorDictPrioritizedReplayBuffer(
+            20, alpha=0.7, beta=0.9, prefetch=prefetch, pin_memory=False
+        )
+    else:
+        rb = TensorDictReplayBuffer(20, prefetch=prefetch)
+    rb.extend(td)
+    rb.sample(4)
+    # disabled statistics only report the memory usage
+    assert all(key.startswith("memory/") for key in rb.stats())
+
+    stats = rb.enable_stats(window=3)
+    rb.extend(td[:5])
+    for _ in range(5):
+        rb.sample(4)
+    if prefetch:
+        rb._prefetch_executor.shutdown()
+    summary = rb.stats()
+    assert summary["extend_count"] == 1
+    assert summary["sample_count"] == 5
+    assert summary["sample/index_count"] >= 5
+    for phase in ("sample", "sample/index", "sample/gather", "sample/collate"):
+        assert (
+            0
+            <= summary[f"{phase}_p50_ms"]
+            <= summary[f"{phase}_p90_ms"]
+            <= summary[f"{phase}_p99_ms"]
+        )
+    assert "sample/pin_count" not in summary
+    assert summary["memory/total"] > 0
+
+    stats.reset()
+    assert "sample_count" not in rb.stats()
+    rb.disable_stats()
+    rb.extend(td[:5])
+    assert "extend_count" not in stats.summary()
+
+
+def test_replay_buffer_stats_record_function():
+    td = TensorDict({"obs": torch.randn(20, 4)}, batch_size=[20])
+    rb = TensorDictReplayBuffer(20)
+    rb.extend(td)
+    rb.enable_stats(record_function=True)
+    with torch.profiler.profile() as prof:
+        rb.sample(4)
+    names = {event.name for event in prof.events()}
+    assert "ReplayBuffer.sample" in names
+    assert "ReplayBuffer.sample/gather" in names
+
+
+@pytest.mark.parametrize("fmt", ["npz", "pt", "pt_tensordict", "memmap"])
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_offline_dataset(tmpdir, fmt, num_workers):
+    torch.manual_seed(0)
+    obs = torch.randn(25, 3)
+    action = torch.randn(25, 2)
+    reward = torch.randn(25)
+    done = torch.arange(25) % 10 == 9
+    path = str(tmpdir)
+    for i, rows in enumerate([slice(0, 10), slice(10, 15), slice(15, 25)]):
+        if fmt == "npz":
+            np.savez(
+                f"{path}/shard_{i}.npz",
+                observations=obs[rows].numpy(),
+                actions=action[rows].numpy(),
+                rewards=reward[rows].numpy(),
+                terminals=done[rows].numpy(),
+                infos=np.zeros(rows.stop - rows.start),
+            )
+        elif fmt.startswith("pt"):
+            td = TensorDict(
+                {
+                    "observations": obs[rows],
+                    "actions": action[rows],
+                    "rewards": reward[rows],
+                    "terminals": done[rows],
+                    "infos": torch.zeros(rows.stop - rows.start),
+                },
+                batch_size=[rows.stop - rows.start],
+            )
+            if fmt == "pt":
+                td = dict(td.items())
+            torch.save(td, f"{path}/shard_{i}.pt")
+    if fmt == "memmap":
+        rb = TensorDictReplayBuffer(25, storage=LazyTensorStorage(25))
+        rb.extend(
+            TensorDict(
+                {
+                    "observations": obs,
+                    "actions": action,
+                    "rewards": reward.unsqueeze(-1),
+                    "terminals": done.unsqueeze(-1),
+                    "infos": torch.zeros(25),
+                },
+                batch_size=[25],
+            )
+        )
+        rb.dumps(path)
+        path = f"{path}/storage"
+
+    dataset = OfflineDataset(
+        path,
+        key_map={"infos": None},
+        num_workers=num_workers,
+        chunk_size=4,
+        allow_pickle=fmt == "pt_tensordict",
+    )
+    assert len(dataset) == 25
+    chunks = list(dataset)
+    assert max(chunk.batch_size[0] for chunk in chunks) == 4
+    assert sum(chunk.batch_size[0] for chunk in chunks) == 25
+
+    for rb in (
+        dataset.to_replay_buffer(),
+        TensorDictReplayBuffer(25, storage=LazyTensorStorage(25)),
+        TensorDictPrioritizedReplayBuffer(25, alpha=0.7, beta=0.9),
+    ):
+        if not len(rb):
+            assert dataset.load(rb) == 25
+        assert len(rb) == 25
+        data = rb[torch.arange(25)]
+        if isinstance(data, tuple):
+            data = data[0]
+        assert set(data.keys()) >= {"observation", "action", "reward", "done"}
+        assert "infos" not in data.keys()
+        assert (data.get("observation") == obs).all()
+        assert (data.get("action") == action).all()
+        assert (data.get("reward") == reward.unsqueeze(-1)).all()
+        assert data.get("done").dtype is torch.bool
+        assert (data.get("done") == done.unsqueeze(-1)).all()
+        assert rb.sample(5).batch_size == torch.Size([5])
+
+    # the buffer keeps the latest transitions of a larger dataset
+    rb = TensorDictReplayBuffer(8, storage=LazyTensorStorage(8))
+    assert dataset.load(rb) == 25
+    assert len(rb) == 8
+    assert set(rb[torch.arange(8)].get("observation")[:, 0].tolist()) == set(
+        obs[17:, 0].tolist()
+    )
+
+
+def test_offline_dataset_memmap_not_modified(tmpdir):
+    rb = TensorDictReplayBuffer(10, storage=LazyTensorStorage(10))
+    rb.extend(TensorDict({"observation": torch.zeros(10, 3)}, batch_size=[10]))
+    rb.dumps(str(tmpdir))
+    rb = OfflineDataset(f"{tmpdir}/storage").to_replay_buffer()
+    rb.extend(TensorDict({"observation": torch.ones(4, 3)}, batch_size=[4]))
+    assert (rb[torch.arange(4)].get("observation") == 1).all()
+    reopened = OfflineDataset(f"{tmpdir}/storage").to_replay_buffer()
+    assert (reopened[torch.arange(10)].get("observation") == 0).all()
+
+    with pytest.raises(ValueError, match="No dataset was found"):
+        OfflineDataset(str(tmpdir.mkdir("empty")))
+
+
+def test_offline_dataset_unsafe_shards(tmpdir):
+    # saved TensorDicts are only unpickled if it is explicitly allowed
+    path = tmpdir.mkdir("pt")
+    td = TensorDict({"observation": torch.zeros(4, 3)}, batch_size=[4])
+    torch.save(td, f"{path}/shard.pt")
+    with pytest.raises(RuntimeError, match="allow_pickle=True"):
+        len(OfflineDataset(str(path), num_workers=0))
+    assert len(OfflineDataset(str(path), num_workers=0, allow_pickle=True)) == 4
+
+    # arrays of Python objects are rejected
+    path = tmpdir.mkdir("npz")
+    np.savez(
+        f"{path}/shard.npz",
+        observation=np.zeros((4, 3)),
+        info=np.array([{}, {}, {}, {}], dtype=object),
+    )
+    with pytest.raises(ValueError, match="object dtype"):
+        list(OfflineDataset(str(path), num_workers=0))
+
+
+@pytest.mark.parametrize("prioritized", [False, True])
+def test_concurrent_extend(prioritized):
+    torch.manual_seed(0)
+    np.random.seed(0)
+    storage = _BlockingStorage(10)
+    if prioritized:
+        rb = TensorDictPrioritizedReplayBuffer(10, alpha=0.7, beta=0.9, storage=storage)
+    else:
+        rb = TensorDictReplayBuffer(10, storage=storage)
+    for i in range(5):
+        rb.add(TensorDict({"obs": torch.tensor([i])}, []))
+
+    # writes slots 5 to 9 and overwrites slots 0 to 4
+    writer = threading.Thread(
+        target=rb.extend,
+        args=(TensorDict({"obs": torch.arange(100, 110).unsqueeze(-1)}, [10]),),
+    )
+    writer.start()
+    assert storage.writing.wait(10)
+    # the writer holds no lock while copying: the buffer can be sampled,
+    # but there is nothing left to sample
+    assert len(rb) == 10
+    with pytest.raises(RuntimeError, match="empty buffer"):
+        rb.sample(4)
+    storage.release.set()
+    writer.join()
+    assert (rb.sample(100).get("obs") >= 100).all()
+
+    storage.writing.clear()
+    storage.release.clear()
+    for i in range(5):
+        rb.add(TensorDict({"obs": torch.tensor([200 + i])}, []))
+    # while slots 0 to 4 are being written, only slots 5 to 9 are sampled
+    writer = threading.Thread(
+        target=rb.extend,
+        args=(TensorDict({"obs": torch.arange(300, 305).unsqueeze(-1)}, [5]),),
+    )
+    writer.start()
+    assert storage.writing.wait(10)
+    obs = rb.sample(100).get("obs")
+    assert ((obs >= 200) & (obs < 205)).all()
+    storage.release.set()
+    writer.join()
+    obs = rb.sample(100).get("obs")
+    assert (obs >= 300).any()
+    assert ((obs >= 200) & (obs < 305)).all()
+
+
+def _shared_rb_writer(rb, worker, n_batches):
+    for i in range(n_batches):
+        value = worker * 1000 + i
+        rb.extend(
+            TensorDict(
+                {
+                    "obs": torch.full((10, 3), float(value)),
+                    "worker": torch.full((10, 1), worker),
+                },
+                batch_size=[10],
+            )
+        )
+
+
+@pytest.mark.parametrize("prioritized", [False, True])
+def test_shared_replay_buffer(prioritized):
+    torch.manual_seed(0)
+    example = TensorDict(
+        {"obs": torch.zeros(3), "worker": torch.zeros(1, dtype=torch.long)}, []
+    )
+    if prioritized:
+        rb = SharedTensorDictPrioritizedReplayBuffer(100, example, alpha=0.7, beta=0.9)
+    else:
+        rb = SharedTensorDictReplayBuffer(100, example)
+    procs = [
+        mp.Process(target=_shared_rb_writer, args=(rb, worker, 6))
+        for worker in range(1, 3)
+    ]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+        assert proc.exitcode == 0
+    assert len(rb) == 100
+
+    if not prioritized:
+        obs = rb.sample(50).get("obs")
+        assert (obs == obs[:, :1]).all()
+        return
+    sample = rb.sample(50, return_weight=True)
+    obs = sample.get("obs")
+    # every element was written as a whole by a single worker
+    assert (obs == obs[:, :1]).all()
+    assert (obs[:, 0] // 1000 == sample.get("worker")[:, 0]).all()
+    assert sample.get("_weight").shape == torch.Size([50, 1])
+    # a high priority makes an element much more likely to be sampled
+    index = sample.get("index")[:1]
+    rb.update_priority(
+        TensorDict({"index": index, "td_error": torch.full((1,), 1e6)}, batch_size=[1])
+    )
+    sample = rb.sample(50)
+    assert (sample.get("index") == index).float().mean() > 0.9
+
+
+@pytest.mark.parametrize("dtype", [torch.float, torch.double])
+def test_shared_tree(dtype):
+    torch.manual_seed(0)
+    size = 37
+    rb = SharedTensorDictPrioritizedReplayBuffer(
+        size, TensorDict({"a": torch.zeros(1)}, []), alpha=1.0, eps=0.0, dtype=dtype
+    )
+    priority = torch.rand(size, dtype=dtype)
+    rb.extend(TensorDict({"a": torch.zeros(size, 1), "td_error": priority}, [size]))
+    # the trees are built on the shared nodes
+    assert rb._sum_nodes.is_shared() and rb._min_nodes.is_shared()
+    assert rb._sum_nodes.dtype == rb._min_nodes.dtype == dtype
+    assert rb._sum_nodes[1] == pytest.approx(priority.sum().item(), rel=1e-5)
+    assert rb._min_nodes[1] == priority.min()
+    mass = torch.rand(100, dtype=dtype) * priority.sum() * 0.999
+    expected = torch.searchsorted(priority.cumsum(0), mass)
+    assert (rb._sum_tree.scan_lower_bound(mass) == expected).all()
+
+    # the trees and the arrays are rebuilt on the same memory when the buffer
+    # is unpickled
+    state = rb.__getstate__()
+    assert "_sum_tree" not in state and "_writing" not in state
+    rb_copy = SharedTensorDictPrioritizedReplayBuffer.__new__(
+        SharedTensorDictPrioritizedReplayBuffer
+    )
+    rb_copy.__setstate__(state)
+    rb_copy._sum_tree[0] = 0.0
+    assert rb._sum_tree.query(0, size) == pytest.approx(
+        priority[1:].sum().item(), rel=1e-5
+    )
+    rb_copy._writing[1] = 1
+    assert rb._writing[1] == 1
+    rb_copy._cursor = 3
+    assert rb._cursor == 3
+
+
+@pytest.mark.parametrize("prioritized", [False, True])
+def test_shared_rb_concurrent_writes(prioritized):
+    torch.manual_seed(0)
+    example = TensorDict({"a": torch.zeros(1)}, [])
+    if prioritized:
+        rb = SharedTensorDictPrioritizedReplayBuffer(10, example, alpha=0.7)
+    else:
+        rb = SharedTensorDictReplayBuffer(10, example)
+    rb.extend(TensorDict({"a": torch.zeros(4, 1)}, [4]))
+    with pytest.raises(KeyError, match="stores the keys"):
+        rb.extend(TensorDict({"a": torch.zeros(4, 1), "b": torch.zeros(4, 1)}, [4]))
+    with pytest.raises(KeyError, match="stores the keys"):
+        rb.extend(TensorDict({"b": torch.zeros(4, 1)}, [4]))
+    assert len(rb) == 4
+
+    # the slots being written are not sampled
+    with rb._replay_lock:
+        index = rb._reserve(4)
+    assert len(rb) == 8
+    rb._storage[index] = TensorDict({"a": torch.ones(4, 1)}, [4])
+    assert (rb.sample(100).get("a") == 0).all()
+    with rb._replay_lock:
+        if prioritized:
+            rb._commit(index, rb._default_priority)
+        else:
+            rb._commit(index)
+    assert (rb.sample(100).get("a") == 1).any()
+
+    # a failed copy releases the slots
+    with pytest.raises(RuntimeError):
+        rb.extend(TensorDict({"a": torch.zeros(4, 2)}, [4]))
+    assert not rb._writing.any()
+
+
+def test_shared_prb_stale_priority():
+    example = TensorDict({"a": torch.zeros(1), "td_error": torch.zeros(())}, [])
+    rb = SharedTensorDictPrioritizedReplayBuffer(4, example, alpha=1.0, eps=0.0)
+    # the priority key of the example is stored
+    assert "td_error" in rb._storage._storage.keys()
+    rb.extend(TensorDict({"a": torch.zeros(4, 1), "td_error": torch.ones(4)}, [4]))
+    sample = rb.sample(8)
+    assert "_write_count" in sample.keys()
+
+    # the sampled elements are overwritten before their priority is updated
+    rb.extend(TensorDict({"a": torch.ones(2, 1), "td_error": torch.ones(2)}, [2]))
+    sample.set("td_error", torch.full((8,), 100.0))
+    rb.update_priority(sample)
+    index = sample.get("index").reshape(-1)
+    stale = index < 2
+    assert stale.any() and not stale.all()
+    assert (rb._sum_tree[index[stale].numpy()] == 1.0).all()
+    assert (rb._sum_tree[index[~stale].numpy()] == 100.0).all()
+
+    # without a write count, the slots being written stay hidden
+    with rb._replay_lock:
+        reserved = rb._reserve(1)
+    rb.update_priority(
+        TensorDict({"index": torch.as_tensor(reserved), "td_error": torch.ones(1)}, [1])
+    )
+    assert rb._sum_tree[reserved] == 0.0
+
+
 if __name__ == "__main__":
     args, unknown = argparse.ArgumentParser().parse_known_args()
     pytest.main([__file__, "--capture", "no", "--exitfirst"] + unknown)
@@ -6,13 +6,21 @@
 import argparse
 import os.path
 import re
+import sys
+import threading
 
 import numpy as np
 import pytest
 import torch
 from _utils_internal import get_available_devices
 from torch import multiprocessing as mp
-from torchrl.data import SavedTensorDict, TensorDict
+from torchrl.data import (
+    FlatTensorDict,
+    is_tensordict_fast_mode,
+    SavedTensorDict,
+    TensorDict,
+    tensordict_fast_mode,
+)
 from torchrl.data.tensordict.tensordict import (
     assert_allclose_td,
     LazyStackedTensorDict,
@@ -60,7 +68,158 @@ def test_tensordict_set(device):
         torch.randn(4, 5, 1, 2, dtype=torch.double, device=device),
         inplace=False,
     )
-    assert td._tensordict_meta["key1"].shape == td._tensordict["key1"].shape
+    assert td._get_meta("key1").shape == td._tensordict["key1"].shape
+
+
+def test_tensordict_lazy_meta():
+    td = TensorDict({"a": torch.randn(4, 3), "b": torch.zeros(4, 2)}, [4])
+    # the metadata is only built when it is queried, and then cached
+    assert td._tensordict_meta["a"] is None
+    meta = td._get_meta("a")
+    assert meta.shape == torch.Size([4, 3])
+    assert td._get_meta("a") is meta
+    assert list(td.keys()) == ["a", "b"]
+
+    # set and set_at_ invalidate it
+    td.set("a", torch.randn(4, 5, dtype=torch.double))
+    assert td._get_meta("a").shape == torch.Size([4, 5])
+    assert td._get_meta("a").dtype is torch.double
+    td.set_at_("b", torch.ones(2, requires_grad=True), 0)
+    assert td._get_meta("b").requires_grad
+
+    # select, exclude and clone carry the built metadata over
+    meta = td._get_meta("a")
+    assert td.select("a")._get_meta("a") is meta
+    assert td.exclude("b")._get_meta("a") is meta
+    assert td.clone()._get_meta("a") is meta
+    assert td.clone()._tensordict_meta["b"] is not None
+
+    # except for shared tensors, whose copies are not shared
+    td.share_memory_()
+    assert td._get_meta("a").is_shared()
+    td_clone = td.clone()
+    assert not td_clone._get_meta("a").is_shared()
+    assert not td_clone.is_shared()
+    assert td.clone(recursive=False)._get_meta("a").is_shared()
+
+    with pytest.raises(RuntimeError, match="batch_size"):
+        TensorDict({"a": torch.randn(4, 3), "b": torch.zeros(3, 2)}, [4])
+
+
+def test_tensordict_fast_mode():
+    td = TensorDict({"a": torch.randn(4, 3)}, [4])
+    assert not is_tensordict_fast_mode()
+    with pytest.raises(RuntimeError, match="batch dimension mismatch"):
+        td.set("b", torch.randn(3, 2))
+    with pytest.raises(RuntimeError, match="different shape"):
+        td.set_("a", torch.randn(4, 2))
+    with pytest.raises(TypeError, match="Expected value"):
+        td.update({"b": np.zeros((4, 2))})
+
+    with tensordict_fast_mode():
+        assert is_tensordict_fast_mode()
+        # the values are written without being checked
+        td.set("b", torch.randn(3, 2))
+        assert td.get("b").shape == torch.Size([3, 2])
+        td.update({"c": np.zeros((4, 2))})
+        assert isinstance(td.get("c"), torch.Tensor)
+        # tensors are still unsqueezed to have one dimension more than the batch
+        td.set("d", torch.zeros(4))
+        assert td.get("d").shape == torch.Size([4, 1])
+        td.set_("d", torch.ones(4))
+        assert (td.get("d") == 1).all()
+        # tensors from another device are still moved to the tensordict device
+        td_meta = TensorDict({}, [4], device="meta")
+        td_meta.set("a", torch.zeros(4, 2))
+        td_meta.update({"b": torch.zeros(4, 1)})
+        assert td_meta.get("a").device == td_meta.get("b").device == td_meta.device
+        with tensordict_fast_mode(False):
+            assert not is_tensordict_fast_mode()
+            with pytest.raises(RuntimeError, match="batch dimension mismatch"):
+                td.set("e", torch.randn(3, 2))
+        assert is_tensordict_fast_mode()
+        # locked tensordicts are still protected
+        td.is_locked = True
+        with pytest.raises(RuntimeError, match="immutable"):
+            td.set("e", torch.randn(4, 2))
+        td.is_locked = False
+    assert not is_tensordict_fast_mode()
+
+    @tensordict_fast_mode()
+    def fast_fn():
+        return is_tensordict_fast_mode()
+
+    assert fast_fn()
+    assert not is_tensordict_fast_mode()
+
+    # the mode is local to each thread
+    modes = []
+    with tensordict_fast_mode():
+        thread = threading.Thread(target=lambda: modes.append(fast_fn()))
+        thread.start()
+        thread.join()
+        other = threading.Thread(target=lambda: modes.append(is_tensordict_fast_mode()))
+        other.start()
+        other.join()
+        assert is_tensordict_fast_mode()
+    assert modes == [True, False]
+
+
+def test_flat_tensordict(tmpdir):
+    td = FlatTensorDict(
+        {
+            "a": torch.randn(4, 3),
+            "b": torch.zeros(4, 1, dtype=torch.bool),
+            "c": torch.arange(4),
+        },
+        [4],
+    )
+    # the tensors are views on a single buffer
+    assert td.get("c").shape == torch.Size([4, 1])
+    start = td._buffer.data_ptr()
+    for value in td.values():
+        assert start <= value.data_ptr() < start + td._buffer.numel()
+
+    td_clone = td.clone()
+    assert isinstance(td_clone, FlatTensorDict)
+    assert td_clone._buffer.data_ptr() != td._buffer.data_ptr()
+    assert (td_clone == td).all()
+    td_clone.zero_()
+    assert (td_clone.get("a") == 0).all() and (td_clone.get("c") == 0).all()
+    td_clone.update_(td)
+    assert (td_clone == td).all()
+
+    # selections share the buffer, but do not write over the other keys
+    td_select = td_clone.select("a")
+    assert isinstance(td_select, FlatTensorDict)
+    assert td_select._buffer is td_clone._buffer
+    td_select.zero_()
+    assert (td_clone.get("c") == td.get("c")).all()
+    assert td_select.clone().keys() == td_select.keys()
+
+    # tensors set out-of-place are stored aside, until they are packed again
+    a = torch.ones(4, 3, requires_grad=True)
+    td.set("a", a)
+    td.set("d", torch.ones(4, 2))
+    assert td.get("a") is a
+    assert list(td._layout) == ["b", "c"]
+    td.set("a", torch.ones(4, 3))
+    td.pack_()
+    assert list(td._layout) == ["a", "b", "c", "d"]
+    assert (td.get("d") == 1).all()
+    td.set("d", torch.zeros(4, 2), inplace=True)
+    assert list(td._layout) == ["a", "b", "c", "d"]
+    td.del_("d")
+    assert list(td._layout) == ["a", "b", "c"]
+
+    td.share_memory_()
+    assert all(value.is_shared() for value in td.values())
+    torch.save(td, tmpdir.join("td.pt"))
+    td_load = torch.load(tmpdir.join("td.pt"), weights_only=False)
+    assert isinstance(td_load, FlatTensorDict)
+    assert (td_load == td).all()
+    td_load.get("a").fill_(2)
+    assert (td_load._buffer.view(torch.float)[:12] == 2).all()
 
 
 @pytest.mark.parametrize("device", get_available_devices())
@@ -79,6 +238,132 @@ def test_stack(device):
     assert (td_reconstruct == td).all()
 
 
+def test_tensordict_foreach_ops():
+    td = TensorDict(
+        {
+            "a": torch.randn(4, 3),
+            "b": torch.randn(4, 3, dtype=torch.double),
+            "c": torch.ones(4, 1, dtype=torch.bool),
+            "d": torch.randn(4, 5)[:, :2],
+        },
+        [4],
+    )
+    other = TensorDict(
+        {
+            "a": torch.ones(4, 3),
+            "b": torch.ones(4, 3),
+            "c": torch.zeros(4, 1, dtype=torch.bool),
+            "d": torch.ones(4, 2, dtype=torch.long),
+        },
+        [4],
+    )
+    d = td.get("d")
+    td.update_(other)
+    assert td.get("d") is d
+    for key, value in td.items():
+        assert value.dtype == td._get_meta(key).dtype
+        assert (value == other.get(key)).all()
+    td.zero_()
+    for value in td.values():
+        assert (value == 0).all()
+
+    # values that cannot be copied as they are still go through set_
+    td.update_({"c": torch.ones(4, dtype=torch.bool), "b": torch.ones(4, 3)})
+    assert td.get("c").all() and (td.get("b") == 1).all()
+    with pytest.raises(RuntimeError, match="different shape"):
+        td.update_({"a": torch.ones(4, 1)})
+    with pytest.raises(AttributeError, match="not found"):
+        td.update_({"e": torch.ones(4, 1)})
+    with pytest.raises(TypeError, match="Expected value"):
+        td.update_({"a": np.ones((4, 3))})
+
+    # clone keeps the order of the keys, the dtypes and the strides
+    td.set("d", torch.randn(4, 5)[:, :2], inplace=False)
+    td_clone = td.clone()
+    assert list(td_clone.keys()) == list(td.keys())
+    for key, value in td.items():
+        value_clone = td_clone.get(key)
+        assert value_clone.data_ptr() != value.data_ptr()
+        assert value_clone.dtype == value.dtype
+        assert value_clone.stride() == value.clone().stride()
+        assert (value_clone == value).all()
+    x = torch.randn(4, 2, requires_grad=True)
+    td_grad = TensorDict({"x": x}, [4]).clone()
+    td_grad.get("x").sum().backward()
+    assert (x.grad == 1).all()
+
+    # apply_ writes the results in place, skipping None and in-place ops
+    d = td.get("d")
+    td.apply_(lambda value: value.mul_(2) if value.dtype == torch.long else None)
+    td.apply_(lambda value: value + 1 if value.dtype != torch.bool else None)
+    assert td.get("d") is d
+    assert (td.get("b") == 2).all() and td.get("b").dtype == torch.double
+    td.apply_(lambda value: value.detach().cpu().numpy())
+    assert (td.get("b") == 2).all() and td.get("b").dtype == torch.double
+
+    td.is_locked = True
+    with pytest.raises(RuntimeError, match="immutable"):
+        td.zero_()
+    with pytest.raises(RuntimeError, match="immutable"):
+        td.update_(other)
+    with pytest.raises(RuntimeError, match="immutable"):
+        td.apply_(lambda value: value + 1)
+    td.apply_(lambda value: None)
+
+
+def test_tensordict_foreach_fallback(monkeypatch):
+    # torch versions without the foreach kernels use the per-key loops
+    module = sys.modules[TensorDict.__module__]
+    for name in ("_has_foreach_copy", "_has_foreach_clone", "_has_foreach_zero"):
+        monkeypatch.setattr(module, name, False)
+    td = TensorDict({"a": torch.randn(4, 3), "b": torch.ones(4, 1)}, [4])
+    td_clone = td.clone()
+    assert (td_clone == td).all()
+    assert td_clone.get("a").data_ptr() != td.get("a").data_ptr()
+    td.zero_()
+    assert (td.get("a") == 0).all() and (td.get("b") == 0).all()
+    td.update_(td_clone)
+    assert (td == td_clone).all()
+    td.is_locked = True
+    with pytest.raises(RuntimeError, match="immutable"):
+        td.zero_()
+
+
+def test_stack_cache():
+    tds = [TensorDict({"a": torch.zeros(3, 4)}, batch_size=[3]) for _ in range(5)]
+    td_stack = torch.stack(tds, 0)
+    assert td_stack.get("a") is not td_stack.get("a")
+
+    td_stack.enable_cache()
+    a = td_stack.get("a")
+    assert td_stack.get("a") is a
+    td_stack.set_("a", torch.ones(5, 3, 4))
+    assert td_stack.get("a") is not a
+    assert (td_stack.get("a") == 1).all()
+    td_stack[1] = TensorDict({"a": torch.full((3, 4), 2.0)}, batch_size=[3])
+    assert (td_stack.get("a")[1] == 2).all()
+    td_stack.set("a", torch.zeros(5, 3, 4))
+    assert (td_stack.get("a") == 0).all()
+    td_stack.disable_cache()
+    assert td_stack.get("a") is not td_stack.get("a")
+
+    td = td_stack.consolidate()
+    assert isinstance(td, TensorDict)
+    assert td_stack.get("a") is td.get("a")
+    # consolidated keys are linked with the stack
+    td_stack.set_("a", torch.ones(5, 3, 4))
+    assert (td.get("a") == 1).all()
+    assert td_stack.get("a") is td.get("a")
+    td.get("a")[2] = 3
+    assert (td_stack[2].get("a") == 3).all()
+    # the original tensordicts are not part of the stack anymore
+    assert (tds[2].get("a") == 0).all()
+    # out-of-place writes break the link
+    td_stack.set("a", torch.zeros(5, 3, 4))
+    assert (td_stack.get("a") == 0).all()
+    assert (td.get("a") != 0).all()
+
+
 @pytest.mark.parametrize("device", get_available_devices())
 def test_tensordict_indexing(device):
     torch.manual_seed(1)
@@ -482,6 +767,9 @@ TD_BATCH_SIZE = 4
         "saved_td",
         "unsqueezed_td",
         "td_reset_bs",
+        "flat_td",
+        "cached_stacked_td",
+        "consolidated_stacked_td",
     ],
 )
 class TestTensorDicts:
@@ -516,6 +804,16 @@ class TestTensorDicts:
         )
         return torch.stack([td1, td2], 2)
 
+    @property
+    def cached_stacked_td(self):
+        return self.stacked_td.enable_cache()
+
+    @property
+    def consolidated_stacked_td(self):
+        td = self.stacked_td
+        td.consolidate()
+        return td
+
     @property
     def idx_td(self):
         td = TensorDict(
@@ -569,6 +867,10 @@ class TestTensorDicts:
         td.batch_size = torch.Size([4, 3, 2, 1])
         return td
 
+    @property
+    def flat_td(self):
+        return FlatTensorDict(source=self.td)
+
     def test_select(self, td_name):
         torch.manual_seed(1)
         td = getattr(self, td_name)
@@ -816,7 +1118,14 @@ class TestTensorDicts:
         td = getattr(self, td_name)
         assert (torch.clone(td) == td).all()
         assert td.batch_size == torch.clone(td).batch_size
-        if td_name in ("stacked_td", "saved_td", "unsqueezed_td", "sub_td"):
+        if td_name in (
+            "stacked_td",
+            "cached_stacked_td",
+            "consolidated_stacked_td",
+            "saved_td",
+            "unsqueezed_td",
+            "sub_td",
+        ):
             with pytest.raises(AssertionError):
                 assert td.clone(recursive=False).get("a") is td.get("a")
         else:
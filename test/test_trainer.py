@@ -35,6 +35,7 @@ from torchrl.trainers.trainers import (
     RewardNormalizer,
     mask_batch,
     BatchSubSampler,
+    EpochSubSampler,
     UpdateWeights,
     CountFramesLog,
 )
@@ -220,6 +221,64 @@ def test_subsampler():
     assert (td_out.get(key1) == td_out.get(key2)).all()
 
 
+@pytest.mark.parametrize("shape", [[20], [4, 5]])
+def test_epoch_subsampler(shape):
+    torch.manual_seed(0)
+    trainer = mocking_trainer()
+    sampler = EpochSubSampler(batch_size=5)
+    trainer.register_op("pre_optim_steps", sampler.reset)
+    trainer.register_op("process_optim_batch", sampler)
+
+    numel = int(torch.Size(shape).numel())
+    td = TensorDict({"key1": torch.arange(numel).view(*shape, 1)}, shape)
+    n_sub_batches = numel // 5
+    for epoch in range(1, 3):
+        seen = []
+        for _ in range(n_sub_batches):
+            td_out = trainer._process_optim_batch_hook(td)
+            assert td_out.numel() == 5
+            seen.append(td_out.get("key1").view(-1))
+        assert sampler.epoch == epoch
+        # each element is seen exactly once per epoch
+        assert (torch.cat(seen).sort().values == torch.arange(numel)).all()
+    shuffled = sampler._shuffled
+    data_ptr = shuffled.get("key1").data_ptr()
+
+    # a new batch of the same shape re-uses the shuffled buffer
+    trainer._pre_optim_hook()
+    td_out = trainer._process_optim_batch_hook(td.clone())
+    assert sampler.epoch == 3
+    assert sampler._shuffled is shuffled
+    assert sampler._shuffled.get("key1").data_ptr() == data_ptr
+
+    # a batch updated in-place by the collector starts a new epoch too
+    trainer._process_optim_batch_hook(td)
+    assert sampler.epoch == 3
+    td.get("key1").add_(numel)
+    trainer._pre_optim_hook()
+    td_out = trainer._process_optim_batch_hook(td)
+    assert sampler.epoch == 4
+    assert (td_out.get("key1") >= numel).all()
+
+    # the sub-batches are views on the shuffled buffer, unless copied
+    trainer._pre_optim_hook()
+    td_out = trainer._process_optim_batch_hook(td)
+    assert td_out.get("key1").data_ptr() == sampler._shuffled.get("key1").data_ptr()
+    sampler.copy = True
+    td_out = trainer._process_optim_batch_hook(td)
+    td_copy = td_out.clone()
+    trainer._pre_optim_hook()
+    trainer._process_optim_batch_hook(td)
+    assert (td_out == td_copy).all()
+
+    # a batch on another device gets a new buffer
+    td_meta = td.to("meta")
+    trainer._pre_optim_hook()
+    trainer._process_optim_batch_hook(td_meta)
+    assert sampler._shuffled is not shuffled
+    assert sampler._shuffled.get("key1").device == torch.device("meta")
+
+
 @pytest.mark.skipif(not _has_gym, reason="No gym library")
 @pytest.mark.skipif(not _has_tb, reason="No tensorboard library")
 def test_recorder():
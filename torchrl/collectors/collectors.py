@@ -32,7 +32,12 @@ __all__ = [
 
 from torchrl.envs.transforms import TransformedEnv
 from ..data import TensorSpec
-from ..data.tensordict.tensordict import _TensorDict, TensorDict
+from ..data.tensordict.tensordict import (
+    _TensorDict,
+    FlatTensorDict,
+    TensorDict,
+    tensordict_fast_mode,
+)
 from ..data.utils import CloudpickleWrapper, DEVICE_TYPING
 from ..envs.common import _EnvClass
 from ..envs.vec_env import _BatchedEnv
@@ -221,6 +226,12 @@ class SyncDataCollector(_DataCollector):
             updated. This feature should be used cautiously: if the same tensordict is added to a replay buffer for instance,
             the whole content of the buffer will be identical.
             Default is False.
+        fast_mode_warmup (int, optional): if provided, number of frames collected with the validation of the
+            tensordicts and of the environment outputs. Once this number of frames has been collected, the rollouts
+            are executed in `tensordict_fast_mode`, which skips these checks: a policy or an environment that starts
+            returning tensors of the wrong shape or dtype after the warm-up will not be caught. If None (or negative),
+            the checks are kept for the whole collection.
+            default = None
     """
 
     def __init__(
@@ -247,6 +258,7 @@ class SyncDataCollector(_DataCollector):
         exploration_mode: str = "random",
         init_with_lag: bool = False,
         return_same_td: bool = False,
+        fast_mode_warmup: Optional[int] = None,
     ):
         self.closed = True
         if seed is not None:
@@ -292,13 +304,15 @@ class SyncDataCollector(_DataCollector):
         self.exploration_mode = exploration_mode
         self.init_with_lag = init_with_lag and max_frames_per_traj > 0
         self.return_same_td = return_same_td
+        self.fast_mode_warmup = fast_mode_warmup
 
         env.reset()
         self._tensordict = env.current_tensordict
         self._tensordict.set(
             "step_count", torch.zeros(*self.env.batch_size, 1, dtype=torch.int)
         )
-        self._tensordict_out = TensorDict(
+        # the output keys are packed in a single buffer after the first rollout
+        self._tensordict_out = FlatTensorDict(
             {},
             batch_size=[*self.env.batch_size, self.frames_per_batch],
             device=self.passing_device,
@@ -450,7 +464,13 @@ class SyncDataCollector(_DataCollector):
         self._tensordict.set("traj_ids", torch.arange(n).unsqueeze(-1))
 
         tensordict_out = []
-        with set_exploration_mode(self.exploration_mode):
+        fast_mode = (
+            self.fast_mode_warmup is not None
+            and 0 <= self.fast_mode_warmup <= self._frames
+        )
+        with set_exploration_mode(self.exploration_mode), tensordict_fast_mode(
+            fast_mode
+        ):
             for t in range(self.frames_per_batch):
                 if self._frames < self.init_random_frames:
                     self.env.rand_step(self._tensordict)
@@ -475,11 +495,15 @@ class SyncDataCollector(_DataCollector):
                 tensordict_out = torch.stack(tensordict_out, len(self.env.batch_size))
                 tensordict_out = tensordict_out.select(*self._tensordict_out.keys())
                 return self._tensordict_out.update_(tensordict_out)
-        return torch.stack(
+        first_rollout = self._tensordict_out.is_empty()
+        tensordict_out = torch.stack(
             tensordict_out,
             len(self.env.batch_size),
             out=self._tensordict_out,
         )  # dim 0 for single env, dim 1 for batch
+        if first_rollout:
+            tensordict_out.pack_()
+        return tensordict_out
 
     def reset(self, index=None, **kwargs) -> None:
         """Resets the environments to a new initial state."""
@@ -618,6 +642,10 @@ class _MultiDataCollector(_DataCollector):
        exploration_mode (str, optional): interaction mode to be used when collecting data. Must be one of "random",
             "mode" or "mean".
             default = "random"
+        fast_mode_warmup (int, optional): if provided, number of frames collected by each worker with the
+            validation of the tensordicts and of the environment outputs, after which these checks are skipped (see
+            `SyncDataCollector`). If None (or negative), the checks are kept for the whole collection.
+            default = None
 
     """
 
@@ -642,6 +670,7 @@ class _MultiDataCollector(_DataCollector):
         update_at_each_batch: bool = False,
         init_with_lag: bool = False,
         exploration_mode: str = "random",
+        fast_mode_warmup: Optional[int] = None,
     ):
         self.closed = True
         self.create_env_fn = create_env_fn
@@ -726,6 +755,7 @@ class _MultiDataCollector(_DataCollector):
         self.update_at_each_batch = update_at_each_batch
         self.init_with_lag = init_with_lag
         self.exploration_mode = exploration_mode
+        self.fast_mode_warmup = fast_mode_warmup
         self.frames_per_worker = np.inf
         self._run_processes()
         self._exclude_private_keys = True
@@ -777,6 +807,7 @@ class _MultiDataCollector(_DataCollector):
                 "pin_memory": self.pin_memory,
                 "init_with_lag": self.init_with_lag,
                 "exploration_mode": self.exploration_mode,
+                "fast_mode_warmup": self.fast_mode_warmup,
                 "idx": i,
             }
             proc = mp.Process(target=_main_async_collector, kwargs=kwargs)
@@ -1218,6 +1249,7 @@ def _main_async_collector(
     idx: int = 0,
     init_with_lag: bool = False,
     exploration_mode: str = "random",
+    fast_mode_warmup: Optional[int] = None,
     verbose: bool = False,
 ) -> None:
     pipe_parent.close()
@@ -1242,6 +1274,7 @@ def _main_async_collector(
         init_with_lag=init_with_lag,
         exploration_mode=exploration_mode,
         return_same_td=True,
+        fast_mode_warmup=fast_mode_warmup,
     )
     if verbose:
         print("Sync data collector created")
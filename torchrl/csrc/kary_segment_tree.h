@@ -0,0 +1,695 @@
+// Copyright (c) Meta Platforms, Inc. and affiliates.
+//
+// This source code is licensed under the MIT license found in the
+// LICENSE file in the root directory of this source tree.
+
+#pragma once
+
+#include <pybind11/numpy.h>
+#include <pybind11/pybind11.h>
+#include <torch/extension.h>
+#include <torch/torch.h>
+
+#include <algorithm>
+#include <bitset>
+#include <cassert>
+#include <cmath>
+#include <cstdint>
+#include <functional>
+#include <limits>
+#include <tuple>
+#include <vector>
+
+#include "torchrl/csrc/numpy_utils.h"
+#include "torchrl/csrc/segment_tree.h"
+#include "torchrl/csrc/torch_utils.h"
+
+namespace py = pybind11;
+
+namespace torchrl {
+
+// KarySegmentTree is a SegmentTree where each node has fanout children
+// instead of 2. The children of a node are stored next to each other, such
+// that with a fanout of 16 (fp32) or 8 (fp64) they fit in a single 64 bytes
+// cache line. The tree is stored level by level, starting from the leaves,
+// and each level is only padded to the next multiple of fanout: the memory
+// footprint is about size * fanout / (fanout - 1) values instead of up to
+// 4 * size for a binary tree padded to the next power of two.
+// Updates and queries visit O(log_fanout(N)) levels, which means much fewer
+// dependent cache misses than the binary tree for very large trees.
+// One example of a KarySegmentTree with size = 7 and fanout = 4 is shown
+// below, where the numbers are the positions in the storage and p denotes
+// padding nodes, that hold the identity element.
+//
+//                             12: [0, 7)
+//                  /          |          \         \
+//           8: [0, 4)        9: [4, 7)     10: p     11: p
+//       /    |    |    \     /   |   |   \
+//     0: 0 1: 1 2: 2 3: 3  4: 4 5: 5 6: 6 7: p
+
+template <typename T, class Operator>
+class KarySegmentTree {
+ public:
+  KarySegmentTree(int64_t size, int64_t fanout, const T& identity_element)
+      : size_(size), fanout_(fanout), identity_element_(identity_element) {
+    TORCH_CHECK(fanout >= 2, "the fanout must be greater or equal to 2");
+    TORCH_CHECK(size > 0, "the size must be strictly positive");
+    int64_t offset = 0;
+    int64_t n = size;
+    do {
+      const int64_t padded_n = (n + fanout - 1) / fanout * fanout;
+      offsets_.push_back(offset);
+      offset += padded_n;
+      n = padded_n / fanout;
+    } while (n > 1);
+    // root
+    offsets_.push_back(offset);
+    // the nodes are allocated by torch, which aligns them to 64 bytes: the
+    // children of a node then fill whole cache lines.
+    nodes_ = torch::full({offset + 1}, identity_element_,
+                         utils::TorchDataType<T>::value);
+    values_ = nodes_.data_ptr<T>();
+    if ((fanout & (fanout - 1)) == 0) {
+      int64_t shift = 0;
+      while ((int64_t{1} << shift) < fanout) {
+        ++shift;
+      }
+      fanout_shift_ = shift;
+    }
+  }
+
+  int64_t size() const { return size_; }
+
+  int64_t capacity() const { return offsets_[1]; }
+
+  // Memory used by the nodes of the tree, in bytes.
+  int64_t nbytes() const { return nodes_.numel() * sizeof(T); }
+
+  int64_t fanout() const { return fanout_; }
+
+  const T& identity_element() const { return identity_element_; }
+
+  const T& At(int64_t index) const {
+    CheckIndex(index);
+    return values_[index];
+  }
+
+  std::vector<T> At(const std::vector<int64_t>& index) const {
+    const int64_t n = index.size();
+    std::vector<T> value(n);
+    BatchAtImpl(n, index.data(), value.data());
+    return value;
+  }
+
+  py::array_t<T> At(const py::array_t<int64_t>& index) const {
+    py::array_t<T> value = utils::NumpyEmptyLike<int64_t, T>(index);
+    BatchAtImpl(index.size(), index.data(), value.mutable_data());
+    return value;
+  }
+
+  torch::Tensor At(const torch::Tensor& index) const {
+    assert(index.dtype() == torch::kInt64);
+    const torch::Tensor index_contiguous = index.contiguous();
+    const int64_t n = index_contiguous.numel();
+    torch::Tensor value =
+        torch::empty_like(index_contiguous, utils::TorchDataType<T>::value);
+    BatchAtImpl(n, index_contiguous.data_ptr<int64_t>(), value.data_ptr<T>());
+    return value;
+  }
+
+  // Update the item at index to value.
+  // Time complexity: O(fanout * log_fanout(N)).
+  void Update(int64_t index, const T& value) {
+    CheckIndex(index);
+    values_[index] = value;
+    const int64_t num_levels = offsets_.size();
+    for (int64_t level = 1; level < num_levels; ++level) {
+      index = Parent(index);
+      ReduceChildren(level, index);
+    }
+  }
+
+  void Update(const std::vector<int64_t>& index, const T& value) {
+    BatchUpdateImpl(index.size(), index.data(), value);
+  }
+
+  void Update(const std::vector<int64_t>& index, const std::vector<T>& value) {
+    assert(value.size() == 1 || index.size() == value.size());
+    const int64_t n = index.size();
+    if (value.size() == 1) {
+      BatchUpdateImpl(n, index.data(), value[0]);
+    } else {
+      BatchUpdateImpl(n, index.data(), value.data());
+    }
+  }
+
+  void Update(const py::array_t<int64_t>& index, const T& value) {
+    BatchUpdateImpl(index.size(), index.data(), value);
+  }
+
+  void Update(const py::array_t<int64_t>& index, const py::array_t<T>& value) {
+    assert(value.size() == 1 || index.size() == value.size());
+    const int64_t n = index.size();
+    if (value.size() == 1) {
+      BatchUpdateImpl(n, index.data(), *(value.data()));
+    } else {
+      BatchUpdateImpl(n, index.data(), value.data());
+    }
+  }
+
+  void Update(const torch::Tensor& index, const T& value) {
+    assert(index.dtype() == torch::kInt64);
+    const torch::Tensor index_contiguous = index.contiguous();
+    const int64_t n = index_contiguous.numel();
+    BatchUpdateImpl(n, index_contiguous.data_ptr<int64_t>(), value);
+  }
+
+  void Update(const torch::Tensor& index, const torch::Tensor& value) {
+    assert(index.dtype() == torch::kInt64);
+    assert(value.dtype() == utils::TorchDataType<T>::value);
+    assert(value.numel() == 1 || index.sizes() == value.sizes());
+    const torch::Tensor index_contiguous = index.contiguous();
+    const torch::Tensor value_contiguous = value.contiguous();
+    const int64_t n = index_contiguous.numel();
+    if (value_contiguous.numel() == 1) {
+      BatchUpdateImpl(n, index_contiguous.data_ptr<int64_t>(),
+                      *(value_contiguous.data_ptr<T>()));
+    } else {
+      BatchUpdateImpl(n, index_contiguous.data_ptr<int64_t>(),
+                      value_contiguous.data_ptr<T>());
+    }
+  }
+
+  // Reduce the range of [l, r) by Operator.
+  // Time complexity: O(fanout * log_fanout(N))
+  T Query(int64_t l, int64_t r) const {
+    assert(l < r);
+    if (l <= 0 && r >= size_) {
+      return Root();
+    }
+    T ret = identity_element_;
+    for (int64_t level = 0; l < r; ++level) {
+      const T* level_values = values_ + offsets_[level];
+      while (l < r && l % fanout_ != 0) {
+        ret = op_(ret, level_values[l++]);
+      }
+      while (l < r && r % fanout_ != 0) {
+        ret = op_(ret, level_values[--r]);
+      }
+      l /= fanout_;
+      r /= fanout_;
+    }
+    return ret;
+  }
+
+  std::vector<T> Query(const std::vector<int64_t>& l,
+                       const std::vector<int64_t>& r) const {
+    assert(l.size() == r.size());
+    std::vector<T> ret(l.size());
+    const int64_t n = l.size();
+    BatchQueryImpl(n, l.data(), r.data(), ret.data());
+    return ret;
+  }
+
+  py::array_t<T> Query(const py::array_t<int64_t>& l,
+                       const py::array_t<int64_t>& r) const {
+    py::array_t<T> ret = utils::NumpyEmptyLike<int64_t, T>(l);
+    BatchQueryImpl(l.size(), l.data(), r.data(), ret.mutable_data());
+    return ret;
+  }
+
+  torch::Tensor Query(const torch::Tensor& l, const torch::Tensor& r) const {
+    assert(l.dtype() == torch::kInt64);
+    assert(r.dtype() == torch::kInt64);
+    assert(l.sizes() == r.sizes());
+    const torch::Tensor l_contiguous = l.contiguous();
+    const torch::Tensor r_contiguous = r.contiguous();
+    torch::Tensor ret =
+        torch::empty_like(l_contiguous, utils::TorchDataType<T>::value);
+    const int64_t n = l_contiguous.numel();
+    BatchQueryImpl(n, l_contiguous.data_ptr<int64_t>(),
+                   r_contiguous.data_ptr<int64_t>(), ret.data_ptr<T>());
+    return ret;
+  }
+
+  py::array_t<T> DumpValues() const {
+    py::array_t<T> ret(size_);
+    std::memcpy(ret.mutable_data(), values_, size_ * sizeof(T));
+    return ret;
+  }
+
+  void LoadValues(const py::array_t<T>& values) {
+    TORCH_CHECK(values.size() == size_, "Expected ", size_, " values, got ",
+                values.size());
+    std::memcpy(values_, values.data(), size_ * sizeof(T));
+    const int64_t num_levels = offsets_.size();
+    for (int64_t level = 1; level < num_levels; ++level) {
+      // padding nodes have no children
+      const int64_t n = LevelSize(level - 1) / fanout_;
+      for (int64_t i = 0; i < n; ++i) {
+        ReduceChildren(level, i);
+      }
+    }
+  }
+
+ protected:
+  const T& Root() const { return values_[offsets_.back()]; }
+
+  int64_t LevelSize(int64_t level) const {
+    return level + 1 < static_cast<int64_t>(offsets_.size())
+               ? offsets_[level + 1] - offsets_[level]
+               : 1;
+  }
+
+  // Position of the parent of the node at position index of its level. The
+  // division is replaced by a shift for the power of two fanouts.
+  int64_t Parent(int64_t index) const {
+    return fanout_shift_ >= 0 ? index >> fanout_shift_ : index / fanout_;
+  }
+
+  void CheckIndex(int64_t index) const {
+    TORCH_CHECK(index >= 0 && index < size_, "index ", index,
+                " is out of range for a tree of size ", size_);
+  }
+
+  void CheckIndex(int64_t n, const int64_t* index) const {
+    for (int64_t i = 0; i < n; ++i) {
+      CheckIndex(index[i]);
+    }
+  }
+
+  // Recompute the node at position index of the given level from its
+  // fanout (contiguous) children. When the fanout is a multiple of 4, the
+  // children are reduced in 4 independent chains kept in registers, instead
+  // of a single chain of fanout dependent operations.
+  void ReduceChildren(int64_t level, int64_t index) {
+    const T* children = values_ + offsets_[level - 1] + index * fanout_;
+    T ret;
+    if (fanout_ % 4 == 0) {
+      T a = children[0];
+      T b = children[1];
+      T c = children[2];
+      T d = children[3];
+      for (int64_t k = 4; k < fanout_; k += 4) {
+        a = op_(a, children[k]);
+        b = op_(b, children[k + 1]);
+        c = op_(c, children[k + 2]);
+        d = op_(d, children[k + 3]);
+      }
+      ret = op_(op_(a, b), op_(c, d));
+    } else {
+      ret = children[0];
+      for (int64_t k = 1; k < fanout_; ++k) {
+        ret = op_(ret, children[k]);
+      }
+    }
+    values_[offsets_[level] + index] = ret;
+  }
+
+  void BatchAtImpl(int64_t n, const int64_t* index, T* value) const {
+    CheckIndex(n, index);
+    for (int64_t i = 0; i < n; ++i) {
+      value[i] = values_[index[i]];
+    }
+  }
+
+  // The leaves are written first, then the parents are recomputed level by
+  // level, the nodes of a level being independent of each other. The
+  // parents are written in place of their children in a single buffer, and
+  // the duplicates are dropped on the way:
+  // - in the levels of at most kMaxMarkedLevelSize nodes, where the parents
+  //   of a batch collide, with a bitset marking the parents already listed,
+  // - in the larger levels, where the random indices rarely share a parent,
+  //   only if they follow each other, which covers contiguous indices. The
+  //   other duplicates are recomputed twice, which is harmless.
+  void BatchUpdateParents(int64_t n, const int64_t* index) {
+    std::vector<int64_t> nodes(n);
+    std::bitset<kMaxMarkedLevelSize> marked;
+    const int64_t* children = index;
+    const int64_t num_levels = offsets_.size();
+    for (int64_t level = 1; level < num_levels; ++level) {
+      const bool mark = LevelSize(level) <= kMaxMarkedLevelSize;
+      int64_t m = 0;
+      for (int64_t i = 0; i < n; ++i) {
+        const int64_t node = Parent(children[i]);
+        if (mark) {
+          if (marked[node]) {
+            continue;
+          }
+          marked.set(node);
+        } else if (m > 0 && node == nodes[m - 1]) {
+          continue;
+        }
+        nodes[m++] = node;
+      }
+      n = m;
+      children = nodes.data();
+      for (int64_t i = 0; i < n; ++i) {
+        ReduceChildren(level, nodes[i]);
+        if (mark) {
+          marked.reset(nodes[i]);
+        }
+      }
+    }
+  }
+
+  void BatchUpdateImpl(int64_t n, const int64_t* index, const T& value) {
+    CheckIndex(n, index);
+    for (int64_t i = 0; i < n; ++i) {
+      values_[index[i]] = value;
+    }
+    BatchUpdateParents(n, index);
+  }
+
+  void BatchUpdateImpl(int64_t n, const int64_t* index, const T* value) {
+    CheckIndex(n, index);
+    for (int64_t i = 0; i < n; ++i) {
+      values_[index[i]] = value[i];
+    }
+    BatchUpdateParents(n, index);
+  }
+
+  void BatchQueryImpl(int64_t n, const int64_t* l, const int64_t* r,
+                      T* result) const {
+    for (int64_t i = 0; i < n; ++i) {
+      result[i] = Query(l[i], r[i]);
+    }
+  }
+
+  static constexpr int64_t kMaxMarkedLevelSize = 4096;
+
+  const Operator op_{};
+  const int64_t size_;
+  const int64_t fanout_;
+  // log2(fanout_) if fanout_ is a power of two, -1 otherwise.
+  int64_t fanout_shift_ = -1;
+  const T identity_element_;
+  // offsets_[l] is the position of the first node of level l in values_,
+  // level 0 being the leaves and the last level the root.
+  std::vector<int64_t> offsets_;
+  torch::Tensor nodes_;
+  T* values_;
+};
+
+template <typename T>
+class KaryMinSegmentTree final : public KarySegmentTree<T, MinOp<T>> {
+ public:
+  KaryMinSegmentTree(int64_t size, int64_t fanout)
+      : KarySegmentTree<T, MinOp<T>>(size, fanout,
+                                     std::numeric_limits<T>::max()) {}
+
+  // Get the index of the minimum value, the first one in case of ties.
+  // Time complexity: O(fanout * log_fanout(N))
+  int64_t ArgMin() const {
+    const int64_t fanout = this->fanout_;
+    const T& value = this->Root();
+    int64_t index = 0;
+    for (int64_t level = this->offsets_.size() - 2; level >= 0; --level) {
+      const T* children =
+          this->values_ + this->offsets_[level] + index * fanout;
+      int64_t k = 0;
+      for (; k < fanout - 1 && children[k] != value; ++k) {
+      }
+      index = index * fanout + k;
+    }
+    return std::min(index, this->size_ - 1);
+  }
+};
+
+template <typename T>
+class KarySumSegmentTree final : public KarySegmentTree<T, std::plus<T>> {
+ public:
+  KarySumSegmentTree(int64_t size, int64_t fanout)
+      : KarySegmentTree<T, std::plus<T>>(size, fanout, T(0)) {}
+
+  // Get the 1st index where the scan (prefix sum) is not less than value.
+  // Time complexity: O(fanout * log_fanout(N))
+  int64_t ScanLowerBound(const T& value) const {
+    if (value > this->Root()) {
+      return this->size_;
+    }
+    const int64_t fanout = this->fanout_;
+    int64_t index = 0;
+    T current_value = value;
+    for (int64_t level = this->offsets_.size() - 2; level >= 0; --level) {
+      const T* children =
+          this->values_ + this->offsets_[level] + index * fanout;
+      int64_t k = 0;
+      // the last child is picked if the value exceeds the previous ones,
+      // which also absorbs rounding errors.
+      for (; k < fanout - 1 && current_value > children[k]; ++k) {
+        current_value -= children[k];
+      }
+      index = index * fanout + k;
+    }
+    return std::min(index, this->size_ - 1);
+  }
+
+  std::vector<int64_t> ScanLowerBound(const std::vector<T>& value) const {
+    std::vector<int64_t> index(value.size());
+    BatchScanLowerBoundImpl(value.size(), value.data(), index.data());
+    return index;
+  }
+
+  py::array_t<int64_t> ScanLowerBound(const py::array_t<T>& value) const {
+    py::array_t<int64_t> index = utils::NumpyEmptyLike<T, int64_t>(value);
+    BatchScanLowerBoundImpl(value.size(), value.data(), index.mutable_data());
+    return index;
+  }
+
+  torch::Tensor ScanLowerBound(const torch::Tensor& value) const {
+    assert(value.dtype() == utils::TorchDataType<T>::value);
+    const torch::Tensor value_contiguous = value.contiguous();
+    torch::Tensor index = torch::empty_like(value_contiguous, torch::kInt64);
+    const int64_t n = value_contiguous.numel();
+    BatchScanLowerBoundImpl(n, value_contiguous.data_ptr<T>(),
+                            index.data_ptr<int64_t>());
+    return index;
+  }
+
+  // See SumSegmentTree::StratifiedSample.
+  // Time complexity: O(batch_size * fanout * log_fanout(N))
+  std::tuple<torch::Tensor, torch::Tensor> StratifiedSample(
+      const KaryMinSegmentTree<T>& min_tree, int64_t batch_size, double beta,
+      int64_t max_index) const {
+    const T p_sum = this->Root();
+    const T p_min = min_tree.Query(0, min_tree.size());
+    TORCH_CHECK(p_sum > 0, "negative p_sum");
+    TORCH_CHECK(p_min > 0, "negative p_min");
+    const torch::Tensor mass =
+        torch::rand({batch_size}, utils::TorchDataType<T>::value);
+    torch::Tensor index = torch::empty({batch_size}, torch::kInt64);
+    torch::Tensor weight =
+        torch::empty({batch_size}, utils::TorchDataType<T>::value);
+    T* mass_data = mass.data_ptr<T>();
+    int64_t* index_data = index.data_ptr<int64_t>();
+    T* weight_data = weight.data_ptr<T>();
+    const T segment = p_sum / static_cast<T>(batch_size);
+    for (int64_t i = 0; i < batch_size; ++i) {
+      mass_data[i] = (static_cast<T>(i) + mass_data[i]) * segment;
+    }
+    BatchScanLowerBoundImpl(batch_size, mass_data, index_data);
+    for (int64_t i = 0; i < batch_size; ++i) {
+      const int64_t j = std::min(index_data[i], max_index);
+      index_data[i] = j;
+      weight_data[i] = static_cast<T>(
+          std::pow(static_cast<double>(this->values_[j] / p_min), -beta));
+    }
+    return std::make_tuple(index, weight);
+  }
+
+ protected:
+  // Same as ScanLowerBound, but the whole batch descends the tree one level
+  // at a time: the searches of a level do not depend on each other, such
+  // that their cache misses overlap instead of being paid one after the
+  // other.
+  void BatchScanLowerBoundImpl(int64_t n, const T* value,
+                               int64_t* index) const {
+    const int64_t fanout = this->fanout_;
+    std::vector<T> current_value(value, value + n);
+    std::fill(index, index + n, 0);
+    for (int64_t level = this->offsets_.size() - 2; level >= 0; --level) {
+      const T* level_values = this->values_ + this->offsets_[level];
+      for (int64_t i = 0; i < n; ++i) {
+        const T* children = level_values + index[i] * fanout;
+        T v = current_value[i];
+        int64_t k = 0;
+        for (; k < fanout - 1 && v > children[k]; ++k) {
+          v -= children[k];
+        }
+        current_value[i] = v;
+        index[i] = index[i] * fanout + k;
+      }
+    }
+    const T total = this->Root();
+    for (int64_t i = 0; i < n; ++i) {
+      index[i] = value[i] > total ? this->size_
+                                 : std::min(index[i], this->size_ - 1);
+    }
+  }
+};
+
+template <typename T>
+void DefineKarySumSegmentTree(const std::string& type, py::module& m) {
+  const std::string pyclass = "KarySumSegmentTree" + type;
+  py::class_<KarySumSegmentTree<T>, std::shared_ptr<KarySumSegmentTree<T>>>(
+      m, pyclass.c_str())
+      .def(py::init<int64_t, int64_t>(), py::arg("size"), py::arg("fanout"))
+      .def_property_readonly("size", &KarySumSegmentTree<T>::size)
+      .def_property_readonly("capacity", &KarySumSegmentTree<T>::capacity)
+      .def_property_readonly("fanout", &KarySumSegmentTree<T>::fanout)
+      .def_property_readonly("identity_element",
+                             &KarySumSegmentTree<T>::identity_element)
+      .def("__len__", &KarySumSegmentTree<T>::size)
+      .def("__getitem__",
+           py::overload_cast<int64_t>(&KarySumSegmentTree<T>::At, py::const_))
+      .def("__getitem__", py::overload_cast<const py::array_t<int64_t>&>(
+                              &KarySumSegmentTree<T>::At, py::const_))
+      .def("__getitem__", py::overload_cast<const torch::Tensor&>(
+                              &KarySumSegmentTree<T>::At, py::const_))
+      .def("at",
+           py::overload_cast<int64_t>(&KarySumSegmentTree<T>::At, py::const_))
+      .def("at", py::overload_cast<const py::array_t<int64_t>&>(
+                     &KarySumSegmentTree<T>::At, py::const_))
+      .def("at", py::overload_cast<const torch::Tensor&>(
+                     &KarySumSegmentTree<T>::At, py::const_))
+      .def("__setitem__",
+           py::overload_cast<int64_t, const T&>(&KarySumSegmentTree<T>::Update))
+      .def("__setitem__",
+           py::overload_cast<const py::array_t<int64_t>&, const T&>(
+               &KarySumSegmentTree<T>::Update))
+      .def(
+          "__setitem__",
+          py::overload_cast<const py::array_t<int64_t>&, const py::array_t<T>&>(
+              &KarySumSegmentTree<T>::Update))
+      .def("__setitem__", py::overload_cast<const torch::Tensor&, const T&>(
+                              &KarySumSegmentTree<T>::Update))
+      .def("__setitem__",
+           py::overload_cast<const torch::Tensor&, const torch::Tensor&>(
+               &KarySumSegmentTree<T>::Update))
+      .def("update",
+           py::overload_cast<int64_t, const T&>(&KarySumSegmentTree<T>::Update))
+      .def("update", py::overload_cast<const py::array_t<int64_t>&, const T&>(
+                         &KarySumSegmentTree<T>::Update))
+      .def(
+          "update",
+          py::overload_cast<const py::array_t<int64_t>&, const py::array_t<T>&>(
+              &KarySumSegmentTree<T>::Update))
+      .def("update", py::overload_cast<const torch::Tensor&, const T&>(
+                         &KarySumSegmentTree<T>::Update))
+      .def("update",
+           py::overload_cast<const torch::Tensor&, const torch::Tensor&>(
+               &KarySumSegmentTree<T>::Update))
+      .def("query", py::overload_cast<int64_t, int64_t>(
+                        &KarySumSegmentTree<T>::Query, py::const_))
+      .def("query", py::overload_cast<const py::array_t<int64_t>&,
+                                      const py::array_t<int64_t>&>(
+                        &KarySumSegmentTree<T>::Query, py::const_))
+      .def("query",
+           py::overload_cast<const torch::Tensor&, const torch::Tensor&>(
+               &KarySumSegmentTree<T>::Query, py::const_))
+      .def("scan_lower_bound",
+           py::overload_cast<const T&>(&KarySumSegmentTree<T>::ScanLowerBound,
+                                       py::const_))
+      .def("scan_lower_bound",
+           py::overload_cast<const py::array_t<T>&>(
+               &KarySumSegmentTree<T>::ScanLowerBound, py::const_))
+      .def("scan_lower_bound",
+           py::overload_cast<const torch::Tensor&>(
+               &KarySumSegmentTree<T>::ScanLowerBound, py::const_))
+      .def("stratified_sample", &KarySumSegmentTree<T>::StratifiedSample,
+           py::arg("min_tree"), py::arg("batch_size"), py::arg("beta"),
+           py::arg("max_index"), py::call_guard<py::gil_scoped_release>())
+      .def("dump_values", &KarySumSegmentTree<T>::DumpValues)
+      .def("load_values", &KarySumSegmentTree<T>::LoadValues)
+      .def("nbytes", &KarySumSegmentTree<T>::nbytes)
+      .def(py::pickle(
+          [](const KarySumSegmentTree<T>& s) {
+            return py::make_tuple(s.DumpValues(), s.fanout());
+          },
+          [](const py::tuple& t) {
+            assert(t.size() == 2);
+            const py::array_t<T>& arr = t[0].cast<py::array_t<T>>();
+            KarySumSegmentTree<T> s(arr.size(), t[1].cast<int64_t>());
+            s.LoadValues(arr);
+            return s;
+          }));
+}
+
+template <typename T>
+void DefineKaryMinSegmentTree(const std::string& type, py::module& m) {
+  const std::string pyclass = "KaryMinSegmentTree" + type;
+  py::class_<KaryMinSegmentTree<T>, std::shared_ptr<KaryMinSegmentTree<T>>>(
+      m, pyclass.c_str())
+      .def(py::init<int64_t, int64_t>(), py::arg("size"), py::arg("fanout"))
+      .def_property_readonly("size", &KaryMinSegmentTree<T>::size)
+      .def_property_readonly("capacity", &KaryMinSegmentTree<T>::capacity)
+      .def_property_readonly("fanout", &KaryMinSegmentTree<T>::fanout)
+      .def_property_readonly("identity_element",
+                             &KaryMinSegmentTree<T>::identity_element)
+      .def("__len__", &KaryMinSegmentTree<T>::size)
+      .def("__getitem__",
+           py::overload_cast<int64_t>(&KaryMinSegmentTree<T>::At, py::const_))
+      .def("__getitem__", py::overload_cast<const py::array_t<int64_t>&>(
+                              &KaryMinSegmentTree<T>::At, py::const_))
+      .def("__getitem__", py::overload_cast<const torch::Tensor&>(
+                              &KaryMinSegmentTree<T>::At, py::const_))
+      .def("at",
+           py::overload_cast<int64_t>(&KaryMinSegmentTree<T>::At, py::const_))
+      .def("at", py::overload_cast<const py::array_t<int64_t>&>(
+                     &KaryMinSegmentTree<T>::At, py::const_))
+      .def("at", py::overload_cast<const torch::Tensor&>(
+                     &KaryMinSegmentTree<T>::At, py::const_))
+      .def("__setitem__",
+           py::overload_cast<int64_t, const T&>(&KaryMinSegmentTree<T>::Update))
+      .def("__setitem__",
+           py::overload_cast<const py::array_t<int64_t>&, const T&>(
+               &KaryMinSegmentTree<T>::Update))
+      .def(
+          "__setitem__",
+          py::overload_cast<const py::array_t<int64_t>&, const py::array_t<T>&>(
+              &KaryMinSegmentTree<T>::Update))
+      .def("__setitem__", py::overload_cast<const torch::Tensor&, const T&>(
+                              &KaryMinSegmentTree<T>::Update))
+      .def("__setitem__",
+           py::overload_cast<const torch::Tensor&, const torch::Tensor&>(
+               &KaryMinSegmentTree<T>::Update))
+      .def("update",
+           py::overload_cast<int64_t, const T&>(&KaryMinSegmentTree<T>::Update))
+      .def("update", py::overload_cast<const py::array_t<int64_t>&, const T&>(
+                         &KaryMinSegmentTree<T>::Update))
+      .def(
+          "update",
+          py::overload_cast<const py::array_t<int64_t>&, const py::array_t<T>&>(
+              &KaryMinSegmentTree<T>::Update))
+      .def("update", py::overload_cast<const torch::Tensor&, const T&>(
+                         &KaryMinSegmentTree<T>::Update))
+      .def("update",
+           py::overload_cast<const torch::Tensor&, const torch::Tensor&>(
+               &KaryMinSegmentTree<T>::Update))
+      .def("query", py::overload_cast<int64_t, int64_t>(
+                        &KaryMinSegmentTree<T>::Query, py::const_))
+      .def("query", py::overload_cast<const py::array_t<int64_t>&,
+                                      const py::array_t<int64_t>&>(
+                        &KaryMinSegmentTree<T>::Query, py::const_))
+      .def("query",
+           py::overload_cast<const torch::Tensor&, const torch::Tensor&>(
+               &KaryMinSegmentTree<T>::Query, py::const_))
+      .def("argmin", &KaryMinSegmentTree<T>::ArgMin)
+      .def("dump_values", &KaryMinSegmentTree<T>::DumpValues)
+      .def("load_values", &KaryMinSegmentTree<T>::LoadValues)
+      .def("nbytes", &KaryMinSegmentTree<T>::nbytes)
+      .def(py::pickle(
+          [](const KaryMinSegmentTree<T>& s) {
+            return py::make_tuple(s.DumpValues(), s.fanout());
+          },
+          [](const py::tuple& t) {
+            assert(t.size() == 2);
+            const py::array_t<T>& arr = t[0].cast<py::array_t<T>>();
+            KaryMinSegmentTree<T> s(arr.size(), t[1].cast<int64_t>());
+            s.LoadValues(arr);
+            return s;
+          }));
+}
+
+}  // namespace torchrl
@@ -10,6 +10,7 @@
 
 #include <memory>
 
+#include "kary_segment_tree.h"
 #include "segment_tree.h"
 
 namespace py = pybind11;
@@ -20,4 +21,10 @@ PYBIND11_MODULE(_torchrl, m) {
 
   torchrl::DefineMinSegmentTree<float>("Fp32", m);
   torchrl::DefineMinSegmentTree<double>("Fp64", m);
+
+  torchrl::DefineKarySumSegmentTree<float>("Fp32", m);
+  torchrl::DefineKarySumSegmentTree<double>("Fp64", m);
+
+  torchrl::DefineKaryMinSegmentTree<float>("Fp32", m);
+  torchrl::DefineKaryMinSegmentTree<double>("Fp64", m);
 }
@@ -11,9 +11,11 @@
 #include <torch/torch.h>
 
 #include <cassert>
+#include <cmath>
 #include <cstdint>
 #include <functional>
 #include <limits>
+#include <tuple>
 #include <vector>
 
 #include "torchrl/csrc/numpy_utils.h"
@@ -45,13 +47,42 @@ class SegmentTree {
       : size_(size), identity_element_(identity_element) {
     for (capacity_ = 1; capacity_ < size; capacity_ <<= 1)
       ;
-    values_.assign(2 * capacity_, identity_element_);
+    nodes_ = torch::full({2 * capacity_}, identity_element_,
+                         utils::TorchDataType<T>::value);
+    values_ = nodes_.data_ptr<T>();
+  }
+
+  // Build a tree on top of the 2 * capacity elements of nodes, e.g. a tensor
+  // in shared memory to share the tree between processes. The nodes are used
+  // as they are: they must hold a valid tree (identity elements for an empty
+  // one).
+  SegmentTree(int64_t size, const T& identity_element,
+              const torch::Tensor& nodes)
+      : size_(size), identity_element_(identity_element) {
+    for (capacity_ = 1; capacity_ < size; capacity_ <<= 1)
+      ;
+    TORCH_CHECK(nodes.device().is_cpu() && nodes.is_contiguous(),
+                "Expected a contiguous CPU tensor of nodes");
+    TORCH_CHECK(nodes.scalar_type() == utils::TorchDataType<T>::value,
+                "Expected nodes of type ", utils::TorchDataType<T>::value,
+                ", got ", nodes.scalar_type());
+    TORCH_CHECK(nodes.numel() == 2 * capacity_, "Expected ", 2 * capacity_,
+                " nodes, got ", nodes.numel());
+    nodes_ = nodes;
+    values_ = nodes_.data_ptr<T>();
   }
 
   int64_t size() const { return size_; }
 
   int64_t capacity() const { return capacity_; }
 
+  // Memory used by the nodes of the tree, in bytes.
+  int64_t nbytes() const { return nodes_.numel() * sizeof(T); }
+
+  // The nodes of the tree, the root at index 1 and the leaves in the second
+  // half. Writing them does not update the ancestors.
+  const torch::Tensor& nodes() const { return nodes_; }
+
   const T& identity_element() const { return identity_element_; }
 
   const T& At(int64_t index) const { return values_[index | capacity_]; }
@@ -194,14 +225,15 @@ class SegmentTree {
 
   py::array_t<T> DumpValues() const {
     py::array_t<T> ret(size_);
-    std::memcpy(ret.mutable_data(), values_.data() + capacity_,
+    std::memcpy(ret.mutable_data(), values_ + capacity_,
                 size_ * sizeof(T));
     return ret;
   }
 
   void LoadValues(const py::array_t<T>& values) {
-    assert(values.size() == size_);
-    std::memcpy(values_.data() + capacity_, values.data(), size_ * sizeof(T));
+    TORCH_CHECK(values.size() == size_, "Expected ", size_, " values, got ",
+                values.size());
+    std::memcpy(values_ + capacity_, values.data(), size_ * sizeof(T));
     for (int64_t i = capacity_ - 1; i > 0; --i) {
       values_[i] = op_(values_[(i << 1)], values_[(i << 1) | 1]);
     }
@@ -237,7 +269,37 @@ class SegmentTree {
   const int64_t size_;
   int64_t capacity_;
   const T identity_element_;
-  std::vector<T> values_;
+  torch::Tensor nodes_;
+  T* values_;
+};
+
+template <typename T>
+struct MinOp {
+  T operator()(const T& lhs, const T& rhs) const { return std::min(lhs, rhs); }
+};
+
+template <typename T>
+class MinSegmentTree final : public SegmentTree<T, MinOp<T>> {
+ public:
+  MinSegmentTree(int64_t size)
+      : SegmentTree<T, MinOp<T>>(size, std::numeric_limits<T>::max()) {}
+
+  MinSegmentTree(int64_t size, const torch::Tensor& nodes)
+      : SegmentTree<T, MinOp<T>>(size, std::numeric_limits<T>::max(),
+                                 nodes) {}
+
+  // Get the index of the minimum value, the first one in case of ties.
+  // Time complexity: O(logN)
+  int64_t ArgMin() const {
+    int64_t index = 1;
+    while (index < this->capacity_) {
+      index <<= 1;
+      if (this->values_[index] != this->values_[index >> 1]) {
+        index |= 1;
+      }
+    }
+    return index ^ this->capacity_;
+  }
 };
 
 template <typename T>
@@ -245,6 +307,9 @@ class SumSegmentTree final : public SegmentTree<T, std::plus<T>> {
  public:
   SumSegmentTree(int64_t size) : SegmentTree<T, std::plus<T>>(size, T(0)) {}
 
+  SumSegmentTree(int64_t size, const torch::Tensor& nodes)
+      : SegmentTree<T, std::plus<T>>(size, T(0), nodes) {}
+
   // Get the 1st index where the scan (prefix sum) is not less than value.
   // Time complexity: O(logN)
   int64_t ScanLowerBound(const T& value) const {
@@ -286,6 +351,44 @@ class SumSegmentTree final : public SegmentTree<T, std::plus<T>> {
     return index;
   }
 
+  // Draw batch_size indices with a probability proportional to their value,
+  // using stratified sampling: the i-th index is drawn uniformly in the i-th
+  // of batch_size segments of equal mass. The indices are clamped to
+  // max_index. The importance sampling weights normalized by the maximum
+  // weight are returned too:
+  //   weight_i = (p_i / sum(p) * N) ^ (-beta) / max_j(w_j)
+  //            = (p_i / min(p)) ^ (-beta)
+  // where min(p) is read from min_tree.
+  // This does not hold the GIL, such that it can run in parallel with other
+  // python threads.
+  // Time complexity: O(batch_size * logN)
+  std::tuple<torch::Tensor, torch::Tensor> StratifiedSample(
+      const MinSegmentTree<T>& min_tree, int64_t batch_size, double beta,
+      int64_t max_index) const {
+    const T p_sum = this->values_[1];
+    const T p_min = min_tree.Query(0, min_tree.size());
+    TORCH_CHECK(p_sum > 0, "negative p_sum");
+    TORCH_CHECK(p_min > 0, "negative p_min");
+    const torch::Tensor mass =
+        torch::rand({batch_size}, utils::TorchDataType<T>::value);
+    torch::Tensor index = torch::empty({batch_size}, torch::kInt64);
+    torch::Tensor weight =
+        torch::empty({batch_size}, utils::TorchDataType<T>::value);
+    const T* mass_data = mass.data_ptr<T>();
+    int64_t* index_data = index.data_ptr<int64_t>();
+    T* weight_data = weight.data_ptr<T>();
+    const T segment = p_sum / static_cast<T>(batch_size);
+    for (int64_t i = 0; i < batch_size; ++i) {
+      const int64_t j = std::min(
+          ScanLowerBound((static_cast<T>(i) + mass_data[i]) * segment),
+          max_index);
+      index_data[i] = j;
+      weight_data[i] = static_cast<T>(
+          std::pow(static_cast<double>(this->At(j) / p_min), -beta));
+    }
+    return std::make_tuple(index, weight);
+  }
+
  protected:
   void BatchScanLowerBoundImpl(int64_t n, const T* value,
                                int64_t* index) const {
@@ -295,25 +398,16 @@ class SumSegmentTree final : public SegmentTree<T, std::plus<T>> {
   }
 };
 
-template <typename T>
-struct MinOp {
-  T operator()(const T& lhs, const T& rhs) const { return std::min(lhs, rhs); }
-};
-
-template <typename T>
-class MinSegmentTree final : public SegmentTree<T, MinOp<T>> {
- public:
-  MinSegmentTree(int64_t size)
-      : SegmentTree<T, MinOp<T>>(size, std::numeric_limits<T>::max()) {}
-};
-
 template <typename T>
 void DefineSumSegmentTree(const std::string& type, py::module& m) {
   const std::string pyclass = "SumSegmentTree" + type;
   py::class_<SumSegmentTree<T>, std::shared_ptr<SumSegmentTree<T>>>(
       m, pyclass.c_str())
       .def(py::init<int64_t>())
+      .def(py::init<int64_t, const torch::Tensor&>(), py::arg("size"),
+           py::arg("nodes"))
       .def_property_readonly("size", &SumSegmentTree<T>::size)
+      .def_property_readonly("nodes", &SumSegmentTree<T>::nodes)
       .def_property_readonly("capacity", &SumSegmentTree<T>::capacity)
       .def_property_readonly("identity_element",
                              &SumSegmentTree<T>::identity_element)
@@ -373,6 +467,12 @@ void DefineSumSegmentTree(const std::string& type, py::module& m) {
       .def("scan_lower_bound",
            py::overload_cast<const torch::Tensor&>(
                &SumSegmentTree<T>::ScanLowerBound, py::const_))
+      .def("stratified_sample", &SumSegmentTree<T>::StratifiedSample,
+           py::arg("min_tree"), py::arg("batch_size"), py::arg("beta"),
+           py::arg("max_index"), py::call_guard<py::gil_scoped_release>())
+      .def("dump_values", &SumSegmentTree<T>::DumpValues)
+      .def("load_values", &SumSegmentTree<T>::LoadValues)
+      .def("nbytes", &SumSegmentTree<T>::nbytes)
       .def(py::pickle(
           [](const SumSegmentTree<T>& s) {
             return py::make_tuple(s.DumpValues());
@@ -392,7 +492,10 @@ void DefineMinSegmentTree(const std::string& type, py::module& m) {
   py::class_<MinSegmentTree<T>, std::shared_ptr<MinSegmentTree<T>>>(
       m, pyclass.c_str())
       .def(py::init<int64_t>())
+      .def(py::init<int64_t, const torch::Tensor&>(), py::arg("size"),
+           py::arg("nodes"))
       .def_property_readonly("size", &MinSegmentTree<T>::size)
+      .def_property_readonly("nodes", &MinSegmentTree<T>::nodes)
       .def_property_readonly("capacity", &MinSegmentTree<T>::capacity)
       .def_property_readonly("identity_element",
                              &MinSegmentTree<T>::identity_element)
@@ -443,6 +546,10 @@ void DefineMinSegmentTree(const std::string& type, py::module& m) {
       .def("query",
            py::overload_cast<const torch::Tensor&, const torch::Tensor&>(
                &MinSegmentTree<T>::Query, py::const_))
+      .def("argmin", &MinSegmentTree<T>::ArgMin)
+      .def("dump_values", &MinSegmentTree<T>::DumpValues)
+      .def("load_values", &MinSegmentTree<T>::LoadValues)
+      .def("nbytes", &MinSegmentTree<T>::nbytes)
       .def(py::pickle(
           [](const MinSegmentTree<T>& s) {
             return py::make_tuple(s.DumpValues());
@@ -14,7 +14,7 @@ from torch.nn import functional as F
 from torchrl.data.tensordict.tensordict import _TensorDict
 from torchrl.data.utils import expand_as_right
 
-__all__ = ["MultiStep"]
+__all__ = ["MultiStep", "StreamingMultiStep"]
 
 
 def _conv1d_reward(
@@ -216,3 +216,144 @@ class MultiStep(nn.Module):
 
         tensordict.set_("done", done)
         return tensordict
+
+
+class StreamingMultiStep(nn.Module):
+    """
+    Multistep reward computed on a stream of collector batches.
+
+    Unlike :obj:`MultiStep`, the batches do not need to be split in
+    trajectories: the module reads the `B x T` batches of a
+    :obj:`SyncDataCollector` or :obj:`MultiSyncDataCollector` (with
+    `split_trajs=False`) as they are, each row being the stream of one
+    environment. The last `n_steps_max` steps of each row cannot be
+    completed yet and are kept until the next call, such that every
+    transition gets its full look-ahead, including at the edges of the
+    batches. The first call thus returns `T - n_steps_max` steps per row, and
+    the next ones `T` steps.
+
+    A trajectory ends at a `"done"` step or before a step whose `"step_count"`
+    is 1 (the first step after a reset, which also covers the trajectories
+    truncated by the collector). The returns are computed for all steps at
+    once by the same convolution as :obj:`MultiStep`, after `n_steps_max`
+    zeros have been inserted after each trajectory.
+
+    The rows must hold the same environments from one call to the next,
+    which is not the case for the batches of a :obj:`MultiaSyncDataCollector`.
+
+    Args:
+        gamma (float): Discount factor for return computation
+        n_steps_max (integer): maximum look-ahead steps.
+
+    Examples:
+        >>> ms = StreamingMultiStep(gamma=0.99, n_steps_max=3)
+        >>> collector = SyncDataCollector(create_env_fn, policy,
+        ...     frames_per_batch=200, split_trajs=False, postproc=ms)
+        >>> for data in collector:
+        ...     rb.extend(data.view(-1))
+
+    """
+
+    def __init__(
+        self,
+        gamma: float,
+        n_steps_max: int,
+    ):
+        super().__init__()
+        if n_steps_max < 0:
+            raise ValueError("n_steps_max must be a null or positive integer")
+        if not (gamma > 0 and gamma <= 1):
+            raise ValueError(f"got out-of-bounds gamma decay: gamma={gamma}")
+
+        self.gamma = gamma
+        self.n_steps_max = n_steps_max
+        self.register_buffer(
+            "gammas",
+            torch.tensor(
+                [gamma ** i for i in range(n_steps_max + 1)],
+                dtype=torch.float,
+            ).reshape(1, 1, -1),
+        )
+        self._tail = None
+
+    def reset(self) -> None:
+        """Discards the steps kept from the previous batches."""
+        self._tail = None
+
+    def forward(self, tensordict: _TensorDict) -> _TensorDict:
+        """Args:
+            tensordict: TensorDict instance with Batch x Time-steps x ...
+                dimensions, the steps of each row following the ones of the
+                previous call. The TensorDict must contain a "reward" and
+                "done" key, and preferably a "step_count" key.
+
+        Returns:
+            a new tensordict containing the steps that could be completed,
+            with the same keys as the output of :obj:`MultiStep` (except
+            "nonterminal", as no step is padded): the "next_" values and
+            "done" are read at the last step of the look-ahead.
+
+        """
+        if tensordict.batch_dims != 2:
+            raise RuntimeError("Expected a tensordict with B x T x ... dimensions")
+        if "mask" in tensordict.keys():
+            raise RuntimeError(
+                f"{self.__class__.__name__} expects unsplit batches, got a "
+                f"'mask' entry. Set split_trajs=False in the collector."
+            )
+        n_steps_max = self.n_steps_max
+        if self._tail is not None:
+            if self._tail.batch_size[0] != tensordict.batch_size[0]:
+                raise RuntimeError(
+                    f"Expected {self._tail.batch_size[0]} rows as in the "
+                    f"previous batches, got {tensordict.batch_size[0]}."
+                )
+            tensordict = torch.cat([self._tail.to(tensordict.device), tensordict], 1)
+        b, T = tensordict.batch_size
+        T_out = max(T - n_steps_max, 0)
+        # the data is copied as collectors may write the next batch in place
+        self._tail = tensordict[:, T_out:].clone()
+        out = tensordict[:, :T_out].clone()
+        if not T_out:
+            return out
+
+        # end[:, t] is True if step t is the last of its trajectory
+        end = tensordict.get("done").reshape(b, T, -1).any(-1)
+        if "step_count" in tensordict.keys():
+            step_count = tensordict.get("step_count").reshape(b, T, -1)[..., 0]
+            end[:, :-1] |= step_count[:, 1:] == 1
+        # summed[:, t, i] is True if the reward of step t + i is part of the
+        # return of step t, i.e. if the trajectory did not end before
+        end_window = end.unfold(1, n_steps_max + 1, 1)
+        summed = end_window.cumsum(-1) == end_window.long()
+        steps_to_next_obs = summed.sum(-1)
+
+        # Discounted summed reward: the steps are spread such that each
+        # trajectory is followed by n_steps_max null rewards, which stops the
+        # convolution at the end of the trajectories
+        reward = tensordict.get("reward")
+        position = torch.arange(T, device=end.device) + n_steps_max * (
+            end.cumsum(1) - end.long()
+        )
+        reward_spread = torch.zeros(
+            b, int(position[:, -1].max()) + 1, 1, device=reward.device
+        )
+        reward_spread.scatter_(
+            1, position.unsqueeze(-1), reward.reshape(b, T, 1).to(reward_spread.dtype)
+        )
+        partial_return = _conv1d_reward(reward_spread, self.gammas, n_steps_max)
+        partial_return = partial_return.gather(1, position[:, :T_out].unsqueeze(-1))
+
+        # next observations and done flags are read at the last summed step
+        last = torch.arange(T_out, device=end.device) + steps_to_next_obs - 1
+        rows = torch.arange(b, device=end.device).unsqueeze(-1)
+        for key in tensordict.keys():
+            if key.startswith("next_") or key == "done":
+                out.set(key, tensordict.get(key)[rows, last])
+
+        steps_to_next_obs = steps_to_next_obs.unsqueeze(-1)
+        out.set("gamma", self.gamma ** steps_to_next_obs.to(reward.dtype))
+        out.set("steps_to_next_obs", steps_to_next_obs)
+        out.rename_key("reward", "original_reward")
+        out.set("reward", partial_return.to(reward.dtype))
+        return out
@@ -3,4 +3,11 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
+from .datasets import *
 from .replay_buffers import *
+from .samplers import *
+from .shared import *
+from .stats import *
+from .storages import *
+from .trajectories import *
+from .writers import *
@@ -0,0 +1,323 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import collections
+import concurrent.futures
+import itertools
+import json
+import os
+import pickle
+import zipfile
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import torch
+
+from torchrl.data.replay_buffers.replay_buffers import (
+    ReplayBuffer,
+    TensorDictReplayBuffer,
+)
+from torchrl.data.replay_buffers.storages import (
+    _COUNTERS_FILE,
+    _map_column,
+    _METADATA_FILE,
+    LazyTensorStorage,
+)
+from torchrl.data.tensordict.tensordict import _TensorDict, TensorDict
+
+__all__ = ["OfflineDataset"]
+
+# common names of the offline RL datasets, mapped to the torchrl keys
+_DEFAULT_KEY_MAP = {
+    "observations": "observation",
+    "obs": "observation",
+    "next_observations": "next_observation",
+    "next_obs": "next_observation",
+    "actions": "action",
+    "rewards": "reward",
+    "terminals": "done",
+    "dones": "done",
+}
+_SHARD_EXTENSIONS = (".npz", ".pt")
+
+
+class OfflineDataset:
+    """A dataset of transitions stored in local files, to be streamed into a
+    replay buffer.
+
+    The dataset can be:
+
+    - a `.npz` file, or a directory of `.npz` shards, each containing one
+      array per key with the transitions along the first dimension;
+    - a directory of dicts of tensors saved with :obj:`torch.save` in `.pt`
+      files, or of TensorDicts with one batch dimension if
+      :obj:`allow_pickle` is True;
+    - a memory-mapped directory, as written by :obj:`ReplayBuffer.dumps` (in
+      its `"storage"` sub-directory) or by a :obj:`LazyMemmapStorage`.
+
+    The shards are read in order by a pool of background threads, while the
+    previous shards are written in the buffer, and the transitions are
+    written in chunks of :obj:`chunk_size`: no Python object is created per
+    transition. The keys are renamed after the torchrl conventions
+    (`"observation"`, `"next_observation"`, `"action"`, `"reward"` and
+    `"done"`), and the rewards and done flags get a trailing singleton
+    dimension.
+
+    Args:
+        path (str or path): file or directory of the dataset.
+        key_map (dict, optional): renaming of the keys of the dataset,
+            which completes the default one (e.g. `"observations"` to
+            `"observation"` or `"terminals"` to `"done"`). Keys mapped to
+            `None` are not loaded.
+        num_workers (int, optional): number of threads reading the shards
+            ahead. Default is `4`.
+        chunk_size (int, optional): maximum number of transitions written in
+            the buffer at once. Default is `65536`.
+        allow_pickle (bool, optional): if True, the `.pt` shards are
+            unpickled without restriction, which is required to load saved
+            TensorDicts but can execute arbitrary code: only use it with
+            trusted files. Otherwise only tensors and containers of tensors
+            are loaded (`torch.load(..., weights_only=True)`). Default is
+            `False`.
+
+    Examples:
+        >>> dataset = OfflineDataset("/datasets/hopper-medium")
+        >>> size = len(dataset)
+        >>> rb = TensorDictReplayBuffer(size, storage=LazyTensorStorage(size))
+        >>> dataset.load(rb)
+        >>> # memory-mapped datasets are sampled without being copied
+        >>> rb = OfflineDataset("/checkpoints/buffer/storage").to_replay_buffer()
+
+    """
+
+    def __init__(
+        self,
+        path: Union[str, os.PathLike],
+        key_map: Optional[Dict[str, Optional[str]]] = None,
+        num_workers: int = 4,
+        chunk_size: int = 2**16,
+        allow_pickle: bool = False,
+    ) -> None:
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be strictly positive, got {chunk_size}.")
+        self.path = str(path)
+        self.key_map = {**_DEFAULT_KEY_MAP, **(key_map or {})}
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        self.allow_pickle = allow_pickle
+        self.is_memmap = os.path.exists(os.path.join(self.path, _METADATA_FILE))
+        if self.is_memmap or not os.path.isdir(self.path):
+            self._shards = [self.path]
+        else:
+            self._shards = sorted(
+                os.path.join(self.path, name)
+                for name in os.listdir(self.path)
+                if name.endswith(_SHARD_EXTENSIONS)
+            )
+        if not self._shards:
+            raise ValueError(
+                f"No dataset was found in {self.path}: expected .npz or .pt "
+                f"files, or a memory-mapped directory."
+            )
+        self._lengths = None
+
+    @property
+    def shards(self) -> List[str]:
+        return list(self._shards)
+
+    def __len__(self) -> int:
+        if self._lengths is None:
+            self._lengths = [self._shard_length(shard) for shard in self._shards]
+        return sum(self._lengths)
+
+    def __iter__(self) -> Iterator[_TensorDict]:
+        """Iterates over the transitions of the dataset, in chunks of at most
+        :obj:`chunk_size` transitions."""
+        return self._iter(self.chunk_size)
+
+    def load(self, replay_buffer: ReplayBuffer) -> int:
+        """Writes the whole dataset in :obj:`replay_buffer`, and returns the
+        number of transitions written.
+
+        The chunks never exceed the capacity of the buffer: if the dataset
+        is larger, the buffer keeps the transitions its writer retains (the
+        last ones for the default writer).
+        """
+        count = 0
+        for data in self._iter(min(self.chunk_size, replay_buffer.capacity)):
+            replay_buffer.extend(data)
+            count += data.batch_size[0]
+        return count
+
+    def to_replay_buffer(self, **kwargs) -> TensorDictReplayBuffer:
+        """Returns a :obj:`TensorDictReplayBuffer` holding exactly the
+        dataset, with a :obj:`LazyTensorStorage`.
+
+        A memory-mapped dataset is not copied: the storage maps its files
+        in copy-on-write mode, such that the dataset is never modified.
+        Other datasets are loaded with :obj:`load`.
+
+        Args:
+            **kwargs: keyword arguments of the :obj:`TensorDictReplayBuffer`,
+                such as :obj:`prefetch` or :obj:`pin_memory`.
+
+        """
+        if self.is_memmap:
+            data = self._read_shard(self.path)
+            length = data.batch_size[0]
+            storage = LazyTensorStorage(length)
+            # the columns are the memory-mapped files themselves
+            storage._storage = data
+            storage.initialized = True
+            storage._len = storage._last_cursor = length
+            return TensorDictReplayBuffer(length, storage=storage, **kwargs)
+        length = len(self)
+        replay_buffer = TensorDictReplayBuffer(
+            length, storage=LazyTensorStorage(length), **kwargs
+        )
+        self.load(replay_buffer)
+        return replay_buffer
+
+    def _iter(self, chunk_size: int) -> Iterator[_TensorDict]:
+        if not self.num_workers:
+            for shard in self._shards:
+                yield from _chunks(self._read_shard(shard), chunk_size)
+            return
+        executor = concurrent.futures.ThreadPoolExecutor(self.num_workers)
+        futures = collections.deque()
+        shards = iter(self._shards)
+        try:
+            # at most num_workers shards are read ahead
+            for shard in itertools.islice(shards, self.num_workers):
+                futures.append(executor.submit(self._read_shard, shard))
+            while futures:
+                data = futures.popleft().result()
+                for shard in itertools.islice(shards, 1):
+                    futures.append(executor.submit(self._read_shard, shard))
+                yield from _chunks(data, chunk_size)
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def _read_shard(self, shard: str) -> _TensorDict:
+        if self.is_memmap:
+            columns = _read_memmap(shard)
+        elif shard.endswith(".npz"):
+            columns = _read_npz(shard)
+        else:
+            # the shards are dicts of tensors or, if pickling is allowed,
+            # saved TensorDicts
+            try:
+                data = torch.load(
+                    shard, map_location="cpu", weights_only=not self.allow_pickle
+                )
+            except pickle.UnpicklingError as err:
+                raise RuntimeError(
+                    f"{shard} does not hold only tensors. If it is a saved "
+                    f"TensorDict from a trusted source, pass allow_pickle=True "
+                    f"to load it."
+                ) from err
+            if isinstance(data, _TensorDict):
+                if data.batch_dims != 1:
+                    raise RuntimeError(
+                        f"The TensorDicts of an offline dataset must have one "
+                        f"batch dimension, got batch_size={data.batch_size} in "
+                        f"{shard}."
+                    )
+            columns = dict(data.items())
+        return self._to_tensordict(columns, shard)
+
+    def _to_tensordict(
+        self, columns: Dict[str, torch.Tensor], shard: str
+    ) -> TensorDict:
+        out = {}
+        for key, value in columns.items():
+            key = self.key_map.get(key, key)
+            if key is None:
+                continue
+            if key in ("reward", "done") and value.ndimension() == 1:
+                value = value.unsqueeze(-1)
+            if key == "done" and value.dtype is not torch.bool:
+                value = value.to(torch.bool)
+            out[key] = value
+        lengths = {value.shape[0] for value in out.values()}
+        if len(lengths) != 1:
+            raise RuntimeError(
+                f"The keys of {shard} do not have the same number of "
+                f"transitions: "
+                f"{ {key: value.shape[0] for key, value in out.items()} }."
+            )
+        return TensorDict(out, batch_size=[lengths.pop()])
+
+    def _shard_length(self, shard: str) -> int:
+        if self.is_memmap:
+            return int(np.fromfile(os.path.join(shard, _COUNTERS_FILE), np.int64)[0])
+        if shard.endswith(".npz"):
+            # only the header of the first array is read
+            with zipfile.ZipFile(shard) as file:
+                with file.open(file.namelist()[0]) as array:
+                    shape, _, _ = _read_npy_header(array)
+            return shape[0]
+        return self._read_shard(shard).batch_size[0]
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(path={self.path}, "
+            f"shards={len(self._shards)}, num_workers={self.num_workers})"
+        )
+
+
+def _read_npy_header(file) -> Tuple[Tuple[int, ...], bool, np.dtype]:
+    # each shard is read by a single thread, with its own file handle
+    if np.lib.format.read_magic(file) == (1, 0):
+        return np.lib.format.read_array_header_1_0(file)
+    return np.lib.format.read_array_header_2_0(file)
+
+
+def _read_npz(path: str) -> Dict[str, torch.Tensor]:
+    columns = {}
+    with zipfile.ZipFile(path) as file:
+        for name in file.namelist():
+            with file.open(name) as array:
+                shape, fortran_order, dtype = _read_npy_header(array)
+                if dtype.hasobject:
+                    # the array would have to be unpickled
+                    raise ValueError(
+                        f"The array {name} of {path} has the object dtype "
+                        f"{dtype}, only numeric arrays can be loaded."
+                    )
+                # the arrays are decompressed straight into their buffer
+                buffer = bytearray(int(np.prod(shape)) * dtype.itemsize)
+                if array.readinto(buffer) != len(buffer):
+                    raise RuntimeError(f"The array {name} of {path} is truncated.")
+            value = np.frombuffer(buffer, dtype=dtype).reshape(
+                shape, order="F" if fortran_order else "C"
+            )
+            columns[name[: -len(".npy")]] = torch.from_numpy(value)
+    return columns
+
+
+def _read_memmap(path: str) -> Dict[str, torch.Tensor]:
+    with open(os.path.join(path, _METADATA_FILE), "r") as file:
+        metadata = json.load(file)
+    length = int(np.fromfile(os.path.join(path, _COUNTERS_FILE), np.int64)[0])
+    return {
+        key: _map_column(path, key, value, length)
+        for key, value in metadata["keys"].items()
+    }
+
+
+def _chunks(data: _TensorDict, chunk_size: int) -> Iterator[_TensorDict]:
+    length = data.batch_size[0]
+    if length <= chunk_size:
+        yield data
+        return
+    for start in range(0, length, chunk_size):
+        # the chunks are views on the shard
+        yield TensorDict(
+            {key: value[start : start + chunk_size] for key, value in data.items()},
+            batch_size=[min(chunk_size, length - start)],
+        )
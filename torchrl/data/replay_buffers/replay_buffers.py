@@ -6,24 +6,33 @@
 import collections
 import concurrent.futures
 import functools
+import json
+import os
 import threading
-from typing import Any, Callable, List, Optional, Sequence, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import torch
 from torch import Tensor
 
 from torchrl._torchrl import (
+    KaryMinSegmentTreeFp32,
+    KaryMinSegmentTreeFp64,
+    KarySumSegmentTreeFp32,
+    KarySumSegmentTreeFp64,
     MinSegmentTreeFp32,
     MinSegmentTreeFp64,
     SumSegmentTreeFp32,
     SumSegmentTreeFp64,
 )
+from torchrl.data.replay_buffers.stats import _NULL_TIMER, ReplayBufferStats
+from torchrl.data.replay_buffers.storages import ListStorage, Storage
 from torchrl.data.replay_buffers.utils import (
     cat_fields_to_device,
     to_numpy,
     to_torch,
 )
+from torchrl.data.replay_buffers.writers import RoundRobinWriter, Writer
 
 __all__ = [
     "ReplayBuffer",
@@ -83,19 +92,55 @@ def pin_memory_output(fun) -> Callable:
     def decorated_fun(self, *args, **kwargs):
         output = fun(self, *args, **kwargs)
         if self._pin_memory:
-            _tuple_out = True
-            if not isinstance(output, tuple):
-                _tuple_out = False
-                output = (output,)
-            output = tuple(_pin_memory(_output) for _output in output)
-            if _tuple_out:
-                return output
-            return output[0]
+            with self._timer("sample/pin"):
+                return _pin_outputs(output)
         return output
 
     return decorated_fun
 
 
+def _pin_outputs(output: Any) -> Any:
+    _tuple_out = True
+    if not isinstance(output, tuple):
+        _tuple_out = False
+        output = (output,)
+    output = tuple(_pin_memory(_output) for _output in output)
+    if _tuple_out:
+        return output
+    return output[0]
+
+
+def _as_batch(data: Any) -> Tuple[Any, int]:
+    if isinstance(data, _TensorDict):
+        return data, data.batch_size[0] if data.batch_dims else 0
+    if not isinstance(data, (list, torch.Tensor)):
+        data = list(data)
+    return data, len(data)
+
+
+def _select_items(data: Any, mask: np.ndarray) -> Any:
+    if isinstance(data, (_TensorDict, torch.Tensor)):
+        return data[torch.as_tensor(mask)]
+    return [item for item, keep in zip(data, mask) if keep]
+
+
+def _collate_list_tensordict(x):
+    return stack_td(x, 0, contiguous=True)
+
+
+def _collate_contiguous(x):
+    return x
+
+
+def _get_default_collate(storage: Storage, _is_tensordict: bool = True) -> Callable:
+    if isinstance(storage, ListStorage):
+        if _is_tensordict:
+            return _collate_list_tensordict
+        return stack_tensors
+    # contiguous storages return ready-made batches
+    return _collate_contiguous
+
+
 class ReplayBuffer:
     """
     Circular replay buffer.
@@ -109,6 +154,32 @@ class ReplayBuffer:
             samples.
         prefetch (int, optional): number of next batches to be prefetched
             using multithreading.
+        storage (Storage, optional): the storage to be used. If none is
+            provided, a :obj:`ListStorage` of capacity `size` is used.
+        num_output_buffers (int, optional): if provided, samples are gathered
+            directly in this many preallocated outputs (pinned if
+            `pin_memory` is True), used in turn, such that sampling does not
+            allocate memory. A sample is then overwritten after
+            `num_output_buffers` further samples have been gathered,
+            including the prefetched ones: it must be at least `prefetch + 1`.
+            Requires a contiguous storage such as :obj:`LazyTensorStorage`.
+        writer (Writer, optional): the policy deciding where the new data is
+            written, and hence which data is evicted. If none is provided, a
+            :obj:`RoundRobinWriter` (first in, first out) is used.
+        transform (callable, optional): a function called on each sampled
+            batch with the batch and the storage indices of its elements, and
+            returning the (possibly modified) batch, e.g. a
+            :obj:`HindsightRelabel`. It runs in the prefetching threads, if
+            any, once the lock of the buffer is released. Transforms that
+            read the buffer can define a :obj:`_fetch(index)` method, which
+            is called with the lock held, before the sampled slots can be
+            overwritten: its result is then passed to the transform as a
+            third argument.
+
+    Writers only hold the lock of the buffer to reserve the slots they write
+    and to commit them once written: if the storage supports concurrent
+    writes (see :obj:`Storage`), the data is copied while other threads keep
+    sampling. Samples are only drawn from committed slots.
     """
 
     def __init__(
@@ -117,19 +188,54 @@ class ReplayBuffer:
         collate_fn: Optional[Callable] = None,
         pin_memory: bool = False,
         prefetch: Optional[int] = None,
+        storage: Optional[Storage] = None,
+        num_output_buffers: Optional[int] = None,
+        writer: Optional[Writer] = None,
+        transform: Optional[Callable[[Any, np.ndarray], Any]] = None,
     ):
-        self._storage = []
+        if storage is None:
+            storage = ListStorage(size)
+        elif storage.max_size != size:
+            raise ValueError(
+                f"The storage capacity ({storage.max_size}) does not match the "
+                f"replay buffer size ({size})."
+            )
+        self._storage = storage
         self._capacity = size
-        self._cursor = 0
+        # storages re-opened from disk may already contain data
+        self._cursor = getattr(storage, "_last_cursor", len(storage)) % size
+        # number of slots reserved so far, including the ones being written
+        self._len = len(storage)
+        # number of writers of each slot, and number of slots being written
+        self._writing = np.zeros(size, dtype=np.int64)
+        self._n_writing = 0
+        # incremented whenever the set of committed slots changes
+        self._generation = 0
+        if writer is None:
+            writer = RoundRobinWriter()
+        if storage._round_robin_writes and not isinstance(writer, RoundRobinWriter):
+            raise TypeError(
+                f"{type(storage).__name__} requires a RoundRobinWriter, got "
+                f"{type(writer).__name__} instead."
+            )
+        writer.register(self)
+        self._writer = writer
+        # indices kept up to date with the content of the buffer, such as a
+        # TrajectoryIndex
+        self._listeners = []
+        self._transform = transform
+        # latency statistics, see enable_stats
+        self._stats = None
         if collate_fn is not None:
             self._collate_fn = collate_fn
         else:
-            self._collate_fn = stack_tensors
+            self._collate_fn = _get_default_collate(self._storage, _is_tensordict=False)
         self._pin_memory = pin_memory
 
         self._prefetch = prefetch is not None and prefetch > 0
         self._prefetch_cap = prefetch if prefetch is not None else 0
-        self._prefetch_fut = collections.deque()
+        # prefetched samples, by sampling arguments other than the batch size
+        self._prefetch_fut = collections.defaultdict(collections.deque)
         if self._prefetch_cap > 0:
             self._prefetch_executor = concurrent.futures.ThreadPoolExecutor(
                 max_workers=self._prefetch_cap
@@ -138,19 +244,54 @@ class ReplayBuffer:
         self._replay_lock = threading.RLock()
         self._future_lock = threading.RLock()
 
+        if num_output_buffers is not None:
+            if isinstance(storage, ListStorage):
+                raise ValueError(
+                    "Preallocated outputs require a contiguous storage, such "
+                    "as LazyTensorStorage."
+                )
+            if num_output_buffers < max(1, self._prefetch_cap + 1):
+                raise ValueError(
+                    f"num_output_buffers must be at least prefetch + 1 "
+                    f"({self._prefetch_cap + 1}), got {num_output_buffers}."
+                )
+        self._num_output_buffers = num_output_buffers
+        self._outputs = None
+        self._output_cursor = 0
+
+    def _next_output(self, batch_size: int) -> Any:
+        # must be called with the replay lock held
+        if self._outputs is None or self._outputs_batch_size != batch_size:
+            return None
+        out = self._outputs[self._output_cursor]
+        self._output_cursor = (self._output_cursor + 1) % len(self._outputs)
+        return out
+
+    def _init_outputs(self, data: Any, batch_size: int) -> None:
+        with self._replay_lock:
+            if self._outputs is not None and self._outputs_batch_size == batch_size:
+                return
+            outputs = []
+            for _ in range(self._num_output_buffers):
+                out = data.clone()
+                if self._pin_memory:
+                    out = _pin_memory(out)
+                outputs.append(out)
+            self._outputs = outputs
+            self._outputs_batch_size = batch_size
+            self._output_cursor = 0
+
     def __len__(self) -> int:
         with self._replay_lock:
-            return len(self._storage)
+            return self._len
 
     @pin_memory_output
     def __getitem__(self, index: Union[int, Tensor]) -> Any:
         index = to_numpy(index)
 
         with self._replay_lock:
-            if isinstance(index, int):
-                data = self._storage[index]
-            else:
-                data = [self._storage[i] for i in index]
+            data = self._storage._fetch(index)
+        data = self._storage._decode(data)
 
         if isinstance(data, list):
             data = self._collate_fn(data)
@@ -165,6 +306,14 @@ class ReplayBuffer:
         with self._replay_lock:
             return self._cursor
 
+    @property
+    def transform(self) -> Optional[Callable[[Any, np.ndarray], Any]]:
+        return self._transform
+
+    @transform.setter
+    def transform(self, transform: Optional[Callable[[Any, np.ndarray], Any]]):
+        self._transform = transform
+
     def add(self, data: Any) -> int:
         """Add a single element to the replay buffer.
 
@@ -174,14 +323,11 @@ class ReplayBuffer:
         Returns:
             index where the data lives in the replay buffer.
         """
-        with self._replay_lock:
-            ret = self._cursor
-            if self._cursor >= len(self._storage):
-                self._storage.append(data)
-            else:
-                self._storage[self._cursor] = data
-            self._cursor = (self._cursor + 1) % self._capacity
-            return ret
+        return self._add(data)
+
+    def _add(self, data: Any, **commit_kwargs) -> int:
+        with self._timer("extend"):
+            return int(self._write(data, 1, True, **commit_kwargs)[0])
 
     def extend(self, data: Sequence[Any]):
         """Extends the replay buffer with one or more elements contained in
@@ -195,56 +341,137 @@ class ReplayBuffer:
             Indices of the data aded to the replay buffer.
 
         """
-        if not len(data):
+        return self._extend(data)
+
+    def _extend(self, data: Sequence[Any], **commit_kwargs) -> np.ndarray:
+        data, batch_size = _as_batch(data)
+        if not batch_size:
             raise Exception("extending with empty data is not supported")
-        if not isinstance(data, list):
-            data = list(data)
+        with self._timer("extend"):
+            return self._write(data, batch_size, False, **commit_kwargs)
+
+    def _write(
+        self, data: Any, batch_size: int, single: bool, **commit_kwargs
+    ) -> np.ndarray:
         with self._replay_lock:
-            cur_size = len(self._storage)
-            batch_size = len(data)
-            storage = self._storage
-            cursor = self._cursor
-            if cur_size + batch_size <= self._capacity:
-                index = np.arange(cur_size, cur_size + batch_size)
-                self._storage += data
-                self._cursor = (self._cursor + batch_size) % self._capacity
-            elif cur_size < self._capacity:
-                d = self._capacity - cur_size
-                index = np.empty(batch_size, dtype=np.int64)
-                index[:d] = np.arange(cur_size, self._capacity)
-                index[d:] = np.arange(batch_size - d)
-                storage += data[:d]
-                for i, v in enumerate(data[d:]):
-                    storage[i] = v
-                self._cursor = batch_size - d
-            elif self._cursor + batch_size <= self._capacity:
-                index = np.arange(self._cursor, self._cursor + batch_size)
-                for i, v in enumerate(data):
-                    storage[cursor + i] = v
-                self._cursor = (self._cursor + batch_size) % self._capacity
-            else:
-                d = self._capacity - self._cursor
-                index = np.empty(batch_size, dtype=np.int64)
-                index[:d] = np.arange(self._cursor, self._capacity)
-                index[d:] = np.arange(batch_size - d)
-                for i, v in enumerate(data[:d]):
-                    storage[cursor + i] = v
-                for i, v in enumerate(data[d:]):
-                    storage[i] = v
-                self._cursor = batch_size - d
-
-            return index
+            index = self._reserve(batch_size)
+            keep = index >= 0
+            if not keep.all():
+                # the writer discarded some elements
+                data = data if single else _select_items(data, keep)
+                if not keep.any():
+                    self._commit(index, **commit_kwargs)
+                    return index
+            cursor = int(index[0]) if single else index[keep]
+            if not self._storage._concurrent_writes:
+                self._storage[cursor] = data
+                self._commit(index, **commit_kwargs)
+                return index
+        # the slots cannot be sampled until they are committed, the copy can
+        # thus happen without holding the lock
+        try:
+            self._storage[cursor] = data
+        except BaseException:
+            with self._replay_lock:
+                self._commit(index)
+            raise
+        with self._replay_lock:
+            self._commit(index, **commit_kwargs)
+        return index
+
+    def _reserve(self, batch_size: int) -> np.ndarray:
+        # must be called with the replay lock held. The writer returns the
+        # slot of each element, -1 for the elements that are discarded
+        index = self._writer._select(batch_size)
+        slots = np.unique(index[index >= 0])
+        if len(slots):
+            self._len = max(self._len, int(slots[-1]) + 1)
+        self._n_writing += int(np.count_nonzero(self._writing[slots] == 0))
+        self._writing[slots] += 1
+        self._generation += 1
+        for listener in self._listeners:
+            listener._on_reserve(index)
+        return index
+
+    def _commit(self, index: np.ndarray, **kwargs) -> None:
+        # must be called with the replay lock held
+        slots = np.unique(index[index >= 0])
+        self._writing[slots] -= 1
+        self._n_writing -= int(np.count_nonzero(self._writing[slots] == 0))
+        self._generation += 1
+        for listener in self._listeners:
+            listener._on_commit(index)
+
+    def _hide(self, index: np.ndarray) -> None:
+        """Called by the writer, with the replay lock held, when the slots
+        of :obj:`index` expire."""
+        self._generation += 1
+
+    def _unavailable(self, index: np.ndarray) -> Optional[np.ndarray]:
+        # must be called with the replay lock held. Mask of the slots that
+        # are being written or have expired, None if there is none
+        mask = self._writing[index] > 0 if self._n_writing else None
+        expired = self._writer._expired(index)
+        if expired is None:
+            return mask
+        return expired if mask is None else mask | expired
+
+    def _check_committed(self) -> None:
+        # must be called with the replay lock held
+        if self._len <= self._n_writing + self._writer._n_expired:
+            raise RuntimeError("Cannot sample from an empty buffer.")
+
+    def _sample_index(self, batch_size: int) -> np.ndarray:
+        # must be called with the replay lock held
+        self._check_committed()
+        index = self._draw_index(batch_size)
+        # draw again the indices of slots being written
+        unavailable = self._unavailable(index)
+        while unavailable is not None and unavailable.any():
+            index[unavailable] = self._draw_index(int(unavailable.sum()))
+            unavailable = self._unavailable(index)
+        return index
+
+    def _draw_index(self, batch_size: int) -> np.ndarray:
+        # the expired slots are excluded by the writer
+        index = self._writer._sample_index(batch_size)
+        if index is None:
+            index = np.random.randint(0, self._len, size=batch_size)
+        return index
 
     @pin_memory_output
     def _sample(self, batch_size: int) -> Any:
-        index = np.random.randint(0, len(self._storage), size=batch_size)
-
         with self._replay_lock:
-            data = [self._storage[i] for i in index]
-
-        data = self._collate_fn(data)
+            with self._timer("sample/index"):
+                index = self._sample_index(batch_size)
+            with self._timer("sample/gather"):
+                out = self._next_output(batch_size)
+                data = self._storage._fetch(index, out=out)
+                transform_data = self._fetch_transform(index)
+
+        with self._timer("sample/collate"):
+            data = self._collate_fn(self._storage._decode(data, out=out))
+            if out is None and self._num_output_buffers:
+                self._init_outputs(data, batch_size)
+            data = self._apply_transform(data, index, transform_data)
         return data
 
+    def _fetch_transform(self, index: np.ndarray) -> Any:
+        # must be called with the replay lock held
+        fetch = getattr(self._transform, "_fetch", None)
+        if fetch is None:
+            return None
+        return fetch(index)
+
+    def _apply_transform(
+        self, data: Any, index: np.ndarray, transform_data: Any
+    ) -> Any:
+        if self._transform is None:
+            return data
+        if getattr(self._transform, "_fetch", None) is None:
+            return self._transform(data, index)
+        return self._transform(data, index, transform_data)
+
     def sample(self, batch_size: int) -> Any:
         """Samples a batch of data from the replay buffer.
 
@@ -255,21 +482,157 @@ class ReplayBuffer:
             A batch of data randomly selected in the replay buffer.
 
         """
+        with self._timer("sample"):
+            return self._sample_or_prefetch(batch_size)
+
+    def _sample_or_prefetch(self, batch_size: int, *args) -> Any:
         if not self._prefetch:
-            return self._sample(batch_size)
+            return self._sample(batch_size, *args)
 
         with self._future_lock:
-            if len(self._prefetch_fut) == 0:
-                ret = self._sample(batch_size)
+            prefetch_fut = self._prefetch_fut[args]
+            if len(prefetch_fut) == 0:
+                ret = self._sample(batch_size, *args)
             else:
-                ret = self._prefetch_fut.popleft().result()
+                ret = prefetch_fut.popleft().result()
 
-            while len(self._prefetch_fut) < self._prefetch_cap:
-                fut = self._prefetch_executor.submit(self._sample, batch_size)
-                self._prefetch_fut.append(fut)
+            while len(prefetch_fut) < self._prefetch_cap:
+                fut = self._prefetch_executor.submit(self._sample, batch_size, *args)
+                prefetch_fut.append(fut)
 
             return ret
 
+    def _timer(self, name: str) -> Any:
+        stats = self._stats
+        if stats is None:
+            return _NULL_TIMER
+        return stats.timer(name)
+
+    def enable_stats(
+        self, window: int = 1000, record_function: bool = False
+    ) -> ReplayBufferStats:
+        """Starts timing the calls to the replay buffer (see
+        :obj:`ReplayBufferStats`) and returns the statistics.
+
+        Args:
+            window (int, optional): number of durations kept per phase to
+                compute the percentiles. Default is `1000`.
+            record_function (bool, optional): if True, the phases are also
+                labelled in the :obj:`torch.profiler` traces. Default is
+                `False`.
+
+        """
+        self._stats = ReplayBufferStats(window, record_function)
+        return self._stats
+
+    def disable_stats(self) -> None:
+        """Stops timing the calls to the replay buffer."""
+        self._stats = None
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Returns the memory used by the replay buffer, in bytes.
+
+        The keys are `"storage/<key>"` for each key of the storage,
+        `"storage"` for the whole storage, `"bytes_per_transition"` and
+        `"total"`. The bytes per transition are computed over the stored
+        elements for a :obj:`ListStorage`, and over the capacity of the
+        buffer for the preallocated storages.
+        """
+        usage = self._storage.memory_usage()
+        out = {f"storage/{key}": nbytes for key, nbytes in usage.items()}
+        out["storage"] = sum(usage.values())
+        if isinstance(self._storage, ListStorage):
+            n = len(self._storage)
+        else:
+            n = self._capacity
+        out["bytes_per_transition"] = out["storage"] // n if n else 0
+        out["total"] = out["storage"]
+        return out
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the memory usage of the replay buffer (see
+        :obj:`memory_usage`), with keys prefixed by `"memory/"`, and the
+        latency statistics if they are enabled (see :obj:`enable_stats`)."""
+        out = {f"memory/{key}": value for key, value in self.memory_usage().items()}
+        stats = self._stats
+        if stats is not None:
+            out.update(stats.summary())
+        return out
+
+    _metadata_file = "buffer_metadata.json"
+
+    def dumps(self, path: Union[str, os.PathLike]) -> None:
+        """Saves the replay buffer in the directory :obj:`path`.
+
+        The storage is written in the `"storage"` sub-directory (see the
+        :obj:`dumps` method of the storages): contiguous storages stream each
+        key to disk in chunks, and can be re-opened as a
+        :obj:`LazyMemmapStorage` without being copied. The buffer must not
+        be written while it is saved.
+
+        Args:
+            path (str or path): directory where the buffer is to be saved.
+
+        Examples:
+            >>> rb.dumps("/checkpoints/buffer")
+            >>> # after a restart
+            >>> rb = TensorDictReplayBuffer(size, storage=LazyTensorStorage(size))
+            >>> rb.loads("/checkpoints/buffer")
+
+        """
+        with self._replay_lock:
+            if self._n_writing:
+                raise RuntimeError(
+                    "Cannot save a replay buffer while it is being written."
+                )
+            os.makedirs(path, exist_ok=True)
+            self._storage.dumps(os.path.join(path, "storage"))
+            state = self._dumps_state(path)
+            with open(os.path.join(path, self._metadata_file), "w") as file:
+                json.dump(state, file)
+
+    def loads(self, path: Union[str, os.PathLike]) -> None:
+        """Restores a replay buffer saved by :obj:`dumps` in the directory
+        :obj:`path`. The buffer must have the same capacity and a storage of
+        the same type as the saved one."""
+        with open(os.path.join(path, self._metadata_file), "r") as file:
+            state = json.load(file)
+        self._check_state(path, state)
+        with self._replay_lock:
+            if self._n_writing:
+                raise RuntimeError(
+                    "Cannot load a replay buffer while it is being written."
+                )
+            self._storage.loads(os.path.join(path, "storage"))
+            self._loads_state(path, state)
+
+    def _dumps_state(self, path: Union[str, os.PathLike]) -> dict:
+        # must be called with the replay lock held
+        return {
+            "capacity": self._capacity,
+            "cursor": self._cursor,
+            "len": self._len,
+            "writer": self._writer._dumps_state(path),
+        }
+
+    def _check_state(self, path: Union[str, os.PathLike], state: dict) -> None:
+        # called before anything is loaded
+        if state["capacity"] != self._capacity:
+            raise ValueError(
+                f"The replay buffer found in {path} has a capacity of "
+                f"{state['capacity']}, but the capacity of this buffer is "
+                f"{self._capacity}."
+            )
+
+    def _loads_state(self, path: Union[str, os.PathLike], state: dict) -> None:
+        # must be called with the replay lock held
+        self._cursor = state["cursor"]
+        self._len = state["len"]
+        self._writer._loads_state(path, state["writer"])
+        self._generation += 1
+        for listener in self._listeners:
+            listener._rebuild()
+
     def __repr__(self) -> str:
         string = (
             f"{self.__class__.__name__}(size={len(self)}, "
@@ -292,6 +655,7 @@ class PrioritizedReplayBuffer(ReplayBuffer):
         beta (float): importance sampling negative exponent.
         eps (float): delta added to the priorities to ensure that the buffer
             does not contain null priorities.
+        dtype (torch.dtype): dtype of the priorities. Default is `torch.float`.
         collate_fn (callable, optional): merges a list of samples to form a
             mini-batch of Tensor(s)/outputs.  Used when using batched
             loading from a map-style dataset.
@@ -299,6 +663,45 @@ class PrioritizedReplayBuffer(ReplayBuffer):
             samples.
         prefetch (int, optional): number of next batches to be prefetched
             using multithreading.
+        storage (Storage, optional): the storage to be used. If none is
+            provided, a :obj:`ListStorage` of capacity `size` is used.
+        num_output_buffers (int, optional): number of preallocated outputs
+            the samples are gathered in. See :obj:`ReplayBuffer` for more
+            details.
+        fanout (int, optional): number of children per node of the sum and
+            min trees. If none is provided, binary trees padded to the next
+            power of two are used. Otherwise, the trees have `fanout`
+            children per node stored contiguously and are not padded, which
+            reduces the memory footprint and the number of cache misses for
+            very large buffers (a fanout of 16 fills a cache line with fp32
+            priorities).
+        deferred_updates (int, optional): if provided, :obj:`update_priority`
+            does not write the trees: the updates are staged, without
+            waiting for the buffer lock nor moving the priorities to the
+            CPU, and are applied in a single batched write before the next
+            sample is drawn or once `deferred_updates` priorities have been
+            staged. Updates of elements that have been overwritten in the
+            meantime are discarded.
+        writer (Writer, optional): the policy deciding where the new data is
+            written. Default is :obj:`RoundRobinWriter`; a
+            :obj:`PriorityWriter` evicts the elements of lowest priority.
+        transform (callable, optional): a function applied to the sampled
+            batches. See :obj:`ReplayBuffer` for more details.
+        channels (dict, optional): additional named priority channels,
+            mapping each name to its `(alpha, beta)` exponents. Each channel
+            has its own segment trees and shares the storage of the buffer:
+            the elements can be sampled according to the priorities of any
+            channel with :obj:`sample`, and the priorities of a channel are
+            updated with :obj:`update_priority`. New elements get the
+            maximum priority of each channel.
+
+    Examples:
+        >>> rb = PrioritizedReplayBuffer(
+        ...     1000, alpha=0.7, beta=0.5, channels={"actor": (0.5, 0.4)})
+        >>> rb.extend(data, priority=td_error)
+        >>> critic_batch, weight, index = rb.sample(256)
+        >>> actor_batch, weight, index = rb.sample(256, channel="actor")
+        >>> rb.update_priority(index, advantage, channel="actor")
     """
 
     def __init__(
@@ -311,9 +714,29 @@ class PrioritizedReplayBuffer(ReplayBuffer):
         collate_fn=None,
         pin_memory: bool = False,
         prefetch: Optional[int] = None,
+        storage: Optional[Storage] = None,
+        num_output_buffers: Optional[int] = None,
+        fanout: Optional[int] = None,
+        deferred_updates: Optional[int] = None,
+        writer: Optional[Writer] = None,
+        transform: Optional[Callable[[Any, np.ndarray], Any]] = None,
+        channels: Optional[Dict[str, Tuple[float, float]]] = None,
     ) -> None:
+        # the trees must exist when the writer is registered
+        self._init_trees(size, dtype, fanout)
+        self._channels = {
+            name: _PriorityChannel(size, channel_alpha, channel_beta, dtype, fanout)
+            for name, (channel_alpha, channel_beta) in (channels or {}).items()
+        }
         super(PrioritizedReplayBuffer, self).__init__(
-            size, collate_fn, pin_memory, prefetch
+            size,
+            collate_fn,
+            pin_memory,
+            prefetch,
+            storage,
+            num_output_buffers,
+            writer,
+            transform,
         )
         if alpha <= 0:
             raise ValueError(
@@ -325,33 +748,42 @@ class PrioritizedReplayBuffer(ReplayBuffer):
         self._alpha = alpha
         self._beta = beta
         self._eps = eps
-        if dtype in (torch.float, torch.FloatType, torch.float32):
-            self._sum_tree = SumSegmentTreeFp32(size)
-            self._min_tree = MinSegmentTreeFp32(size)
-        elif dtype in (torch.double, torch.DoubleTensor, torch.float64):
-            self._sum_tree = SumSegmentTreeFp64(size)
-            self._min_tree = MinSegmentTreeFp64(size)
-        else:
-            raise NotImplementedError(
-                f"dtype {dtype} not supported by PrioritizedReplayBuffer"
-            )
         self._max_priority = 1.0
 
+        if deferred_updates is not None and deferred_updates < 1:
+            raise ValueError(
+                f"deferred_updates must be strictly positive, got {deferred_updates}."
+            )
+        self._deferred_updates = deferred_updates
+        # (index, priority, write count) tuples. Appending to a deque is
+        # atomic, such that the updates can be staged without the lock
+        self._staged_updates = collections.deque()
+        self._n_staged = 0
+        # number of writes, and write count at which each slot was last
+        # reserved, used to find stale updates
+        self._write_count = 0
+        self._slot_write_count = np.zeros(size, dtype=np.int64)
+
+    def _init_trees(self, size: int, dtype: torch.dtype, fanout: Optional[int]):
+        self._fanout = fanout
+        self._sum_tree, self._min_tree = _make_trees(size, dtype, fanout)
+
     @pin_memory_output
     def __getitem__(self, index: Union[int, Tensor]) -> Any:
         index = to_numpy(index)
 
         with self._replay_lock:
+            self._apply_staged_updates()
             p_min = self._min_tree.query(0, self._capacity)
             if p_min <= 0:
                 raise ValueError(f"p_min must be greater than 0, got p_min={p_min}")
+            data = self._storage._fetch(index)
             if isinstance(index, int):
-                data = self._storage[index]
                 weight = np.array(self._sum_tree[index])
             else:
-                data = [self._storage[i] for i in index]
                 weight = self._sum_tree[index]
 
+        data = self._storage._decode(data)
         if isinstance(data, list):
             data = self._collate_fn(data)
         # weight = np.power(weight / (p_min + self._eps), -self._beta)
@@ -379,9 +811,54 @@ class PrioritizedReplayBuffer(ReplayBuffer):
         with self._replay_lock:
             return self._max_priority
 
+    @property
+    def channels(self) -> Tuple[str, ...]:
+        """Names of the additional priority channels."""
+        return tuple(self._channels)
+
+    def _get_channel(self, channel: str) -> "_PriorityChannel":
+        try:
+            return self._channels[channel]
+        except KeyError:
+            raise KeyError(
+                f"Unknown priority channel {channel}, the channels of this "
+                f"buffer are {self.channels}."
+            )
+
     @property
     def _default_priority(self) -> float:
-        return (self._max_priority + self._eps) ** self._alpha
+        return float((self._max_priority + self._eps) ** self._alpha)
+
+    def _reserve(self, batch_size: int) -> np.ndarray:
+        index = super()._reserve(batch_size)
+        self._write_count += 1
+        slots = index[index >= 0]
+        self._slot_write_count[slots] = self._write_count
+        # the slots are hidden from the sampler until they are committed
+        self._hide(slots)
+        return index
+
+    def _commit(self, index: np.ndarray, priority: Any = None) -> None:
+        super()._commit(index)
+        if priority is None:
+            return
+        keep = index >= 0
+        if not keep.all():
+            # elements discarded by the writer
+            if not isinstance(priority, float) and len(priority) == len(index):
+                priority = priority[keep]
+            index = index[keep]
+        self._sum_tree[index] = priority
+        self._min_tree[index] = priority
+        for channel in self._channels.values():
+            channel.write(index, channel.default_priority(self._eps))
+
+    def _hide(self, index: np.ndarray) -> None:
+        super()._hide(index)
+        self._sum_tree[index] = 0.0
+        self._min_tree[index] = self._min_tree.identity_element
+        for channel in self._channels.values():
+            channel.hide(index)
 
     def _add_or_extend(
         self,
@@ -400,25 +877,23 @@ class PrioritizedReplayBuffer(ReplayBuffer):
                 priority = self._default_priority
 
         if do_add:
-            index = super(PrioritizedReplayBuffer, self).add(data)
+            batch_size = 1
         else:
-            index = super(PrioritizedReplayBuffer, self).extend(data)
-
+            data, batch_size = _as_batch(data)
         if not (
             isinstance(priority, float)
             or len(priority) == 1
-            or len(priority) == len(index)
+            or len(priority) == batch_size
         ):
             raise RuntimeError(
                 "priority should be a scalar or an iterable of the same "
                 "length as index"
             )
 
-        with self._replay_lock:
-            self._sum_tree[index] = priority
-            self._min_tree[index] = priority
-
-        return index
+        # the priorities are set when the data is committed
+        if do_add:
+            return super(PrioritizedReplayBuffer, self)._add(data, priority=priority)
+        return super(PrioritizedReplayBuffer, self)._extend(data, priority=priority)
 
     def add(self, data: Any, priority: Optional[torch.Tensor] = None) -> torch.Tensor:
         return self._add_or_extend(data, priority, True)
@@ -429,34 +904,71 @@ class PrioritizedReplayBuffer(ReplayBuffer):
         return self._add_or_extend(data, priority, False)
 
     @pin_memory_output
-    def _sample(self, batch_size: int) -> Tuple[Any, torch.Tensor, torch.Tensor]:
-        with self._replay_lock:
-            p_sum = self._sum_tree.query(0, self._capacity)
-            p_min = self._min_tree.query(0, self._capacity)
-            if p_sum <= 0:
-                raise RuntimeError("negative p_sum")
-            if p_min <= 0:
-                raise RuntimeError("negative p_min")
-            mass = np.random.uniform(0.0, p_sum, size=batch_size)
-            index = self._sum_tree.scan_lower_bound(mass)
-            if isinstance(index, torch.Tensor):
-                index.clamp_max_(len(self._storage) - 1)
-            else:
-                index = np.clip(index, None, len(self._storage) - 1)
-            data = [self._storage[i] for i in index]
-            weight = self._sum_tree[index]
-
-        data = self._collate_fn(data)
-
-        # Importance sampling weight formula:
+    def _sample(
+        self, batch_size: int, channel: Optional[str] = None
+    ) -> Tuple[Any, torch.Tensor, torch.Tensor]:
+        if channel is None:
+            sum_tree, min_tree, beta = self._sum_tree, self._min_tree, self._beta
+        else:
+            channel = self._get_channel(channel)
+            sum_tree, min_tree, beta = channel.sum_tree, channel.min_tree, channel.beta
+        # The indices are drawn with stratified sampling and the importance
+        # sampling weights are computed in a single call that releases the
+        # GIL. The weights are normalized by the max weight:
         #   w_i = (p_i / sum(p) * N) ^ (-beta)
         #   weight_i = w_i / max(w)
         #   weight_i = (p_i / sum(p) * N) ^ (-beta) /
         #       ((min(p) / sum(p) * N) ^ (-beta))
         #   weight_i = ((p_i / sum(p) * N) / (min(p) / sum(p) * N)) ^ (-beta)
         #   weight_i = (p_i / min(p)) ^ (-beta)
-        # weight = np.power(weight / (p_min + self._eps), -self._beta)
-        weight = np.power(weight / p_min, -self._beta)
+        # Slots being written or expired have a null priority and are not
+        # sampled, unless a draw is clamped to the last index.
+        # The trees are read without holding the replay lock, such that
+        # writers and other samplers are not blocked by the draw: the drawn
+        # indices are then checked with the lock held, and drawn again if
+        # their slots have been reserved, have expired or are past the end
+        # of the buffer in the meantime. The weights reflect the priorities
+        # at the time of the draw.
+        with self._replay_lock:
+            self._apply_staged_updates()
+            self._check_committed()
+            max_index = self._len - 1
+            # taken before the draw, such that the prefetched samples get the
+            # output buffers in the order they were requested
+            out = self._next_output(batch_size)
+        while True:
+            with self._timer("sample/index"):
+                try:
+                    index, weight = sum_tree.stratified_sample(
+                        min_tree, batch_size, beta, max_index
+                    )
+                except RuntimeError:
+                    # the priorities may all have been hidden by concurrent
+                    # writers: the draw is done again with the lock held,
+                    # where the errors are genuine
+                    index = None
+            with self._replay_lock:
+                if index is None:
+                    self._check_committed()
+                    index, weight = sum_tree.stratified_sample(
+                        min_tree, batch_size, beta, self._len - 1
+                    )
+                unavailable = self._unavailable(index)
+                if (unavailable is None or not unavailable.any()) and (
+                    index < self._len
+                ).all():
+                    with self._timer("sample/gather"):
+                        data = self._storage._fetch(index, out=out)
+                        transform_data = self._fetch_transform(index)
+                    break
+                self._check_committed()
+                max_index = self._len - 1
+
+        with self._timer("sample/collate"):
+            data = self._collate_fn(self._storage._decode(data, out=out))
+            if out is None and self._num_output_buffers:
+                self._init_outputs(data, batch_size)
+            data = self._apply_transform(data, index, transform_data)
 
         # x = first_field(data)  # avoid calling tree.flatten
         # if isinstance(x, torch.Tensor):
@@ -464,34 +976,45 @@ class PrioritizedReplayBuffer(ReplayBuffer):
         weight = to_torch(weight, device, self._pin_memory)
         return data, weight, index
 
-    def sample(self, batch_size: int) -> Tuple[Any, np.ndarray, torch.Tensor]:
+    def sample(
+        self, batch_size: int, channel: Optional[str] = None
+    ) -> Tuple[Any, np.ndarray, torch.Tensor]:
         """Gather a batch of data according to the non-uniform multinomial
         distribution with weights computed with the provided priorities of
         each input.
 
         Args:
             batch_size (int): float of data to be collected.
+            channel (str, optional): the priority channel the batch is drawn
+                from. If none is provided, the main priorities are used.
 
         Returns:
 
         """
-        if not self._prefetch:
-            return self._sample(batch_size)
-
-        with self._future_lock:
-            if len(self._prefetch_fut) == 0:
-                ret = self._sample(batch_size)
-            else:
-                ret = self._prefetch_fut.popleft().result()
-
-            while len(self._prefetch_fut) < self._prefetch_cap:
-                fut = self._prefetch_executor.submit(self._sample, batch_size)
-                self._prefetch_fut.append(fut)
-
-            return ret
+        with self._timer("sample"):
+            if channel is None:
+                return self._sample_or_prefetch(batch_size)
+            return self._sample_or_prefetch(batch_size, channel)
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Returns the memory used by the replay buffer, in bytes, including
+        the `"sum_tree"` and `"min_tree"` holding the priorities (see
+        :obj:`ReplayBuffer.memory_usage`)."""
+        out = super().memory_usage()
+        out["sum_tree"] = self._sum_tree.nbytes()
+        out["min_tree"] = self._min_tree.nbytes()
+        out["total"] += out["sum_tree"] + out["min_tree"]
+        for name, channel in self._channels.items():
+            out[f"sum_tree/{name}"] = channel.sum_tree.nbytes()
+            out[f"min_tree/{name}"] = channel.min_tree.nbytes()
+            out["total"] += out[f"sum_tree/{name}"] + out[f"min_tree/{name}"]
+        return out
 
     def update_priority(
-        self, index: Union[int, Tensor], priority: Union[float, Tensor]
+        self,
+        index: Union[int, Tensor],
+        priority: Union[float, Tensor],
+        channel: Optional[str] = None,
     ) -> None:
         """Updates the priority of the data pointed by the index.
 
@@ -500,9 +1023,13 @@ class PrioritizedReplayBuffer(ReplayBuffer):
                 updated.
             priority (Number or torch.Tensor): new priorities of the
                 indexed elements
+            channel (str, optional): the priority channel to be updated. If
+                none is provided, the main priorities are updated.
 
 
         """
+        if channel is not None:
+            self._get_channel(channel)
         if isinstance(index, int):
             if not isinstance(priority, float):
                 if len(priority) != 1:
@@ -520,19 +1047,245 @@ class PrioritizedReplayBuffer(ReplayBuffer):
                     "priority should be a number or an iterable of the same "
                     "length as index"
                 )
-            index = to_numpy(index)
-            priority = to_numpy(priority)
+            if not self._deferred_updates:
+                index = to_numpy(index)
+                priority = to_numpy(priority)
 
+        if self._deferred_updates:
+            self._stage_update(index, priority, channel)
+            return
         with self._replay_lock:
-            self._max_priority = max(self._max_priority, np.max(priority))
-            priority = np.power(priority + self._eps, self._alpha)
-            self._sum_tree[index] = priority
-            self._min_tree[index] = priority
+            self._set_priority(index, priority, channel)
+
+    def _set_priority(
+        self, index: np.ndarray, priority: np.ndarray, channel: Optional[str]
+    ) -> None:
+        # must be called with the replay lock held
+        if channel is not None:
+            self._channels[channel].update(index, priority, self._eps)
+            return
+        self._max_priority = max(self._max_priority, np.max(priority))
+        priority = np.power(priority + self._eps, self._alpha)
+        self._sum_tree[index] = priority
+        self._min_tree[index] = priority
+
+    def _dumps_state(self, path: Union[str, os.PathLike]) -> dict:
+        self._apply_staged_updates()
+        # the leaves of the trees are saved raw, their ancestors are rebuilt
+        # when they are loaded
+        np.save(os.path.join(path, "sum_tree.npy"), self._sum_tree.dump_values())
+        np.save(os.path.join(path, "min_tree.npy"), self._min_tree.dump_values())
+        for name, channel in self._channels.items():
+            channel.dumps(path, name)
+        state = super()._dumps_state(path)
+        state["max_priority"] = float(self._max_priority)
+        state["channels"] = {
+            name: float(channel.max_priority)
+            for name, channel in self._channels.items()
+        }
+        return state
+
+    def _check_state(self, path: Union[str, os.PathLike], state: dict) -> None:
+        super()._check_state(path, state)
+        channels = state.get("channels", {})
+        if set(channels) != set(self._channels):
+            raise ValueError(
+                f"The replay buffer found in {path} has the priority channels "
+                f"{tuple(channels)}, but the channels of this buffer are "
+                f"{self.channels}."
+            )
+
+    def _loads_state(self, path: Union[str, os.PathLike], state: dict) -> None:
+        super()._loads_state(path, state)
+        for name, max_priority in state.get("channels", {}).items():
+            self._channels[name].loads(path, name, max_priority)
+        self._sum_tree.load_values(
+            np.load(os.path.join(path, "sum_tree.npy"), mmap_mode="r")
+        )
+        self._min_tree.load_values(
+            np.load(os.path.join(path, "min_tree.npy"), mmap_mode="r")
+        )
+        self._max_priority = state["max_priority"]
+        # the staged updates refer to the previous content of the buffer
+        self._staged_updates.clear()
+        self._n_staged = 0
+
+    def _stage_update(
+        self,
+        index: Tensor,
+        priority: Union[float, Tensor],
+        channel: Optional[str] = None,
+    ) -> None:
+        # the tensors are copied as the samples may be overwritten before the
+        # update is applied, and are kept on their device to avoid a sync
+        if isinstance(index, torch.Tensor):
+            index = index.detach().reshape(-1).clone()
+        else:
+            index = np.array(index).reshape(-1)
+        if isinstance(priority, torch.Tensor):
+            priority = priority.detach().reshape(-1).clone()
+        elif not isinstance(priority, float):
+            priority = np.array(priority).reshape(-1)
+        self._staged_updates.append((index, priority, self._write_count, channel))
+        # the count is only used to trigger the write, races are harmless
+        self._n_staged += len(index)
+        if self._n_staged >= self._deferred_updates:
+            with self._replay_lock:
+                self._apply_staged_updates()
+
+    def _apply_staged_updates(self) -> None:
+        # must be called with the replay lock held
+        if not self._staged_updates:
+            return
+        updates = []
+        while self._staged_updates:
+            updates.append(self._staged_updates.popleft())
+        self._n_staged = 0
+        # one batched write per channel
+        by_channel = collections.defaultdict(list)
+        for _index, _priority, _write_count, _channel in updates:
+            by_channel[_channel].append((_index, _priority, _write_count))
+        for channel, channel_updates in by_channel.items():
+            self._apply_channel_updates(channel, channel_updates)
+
+    def _apply_channel_updates(self, channel: Optional[str], updates: list) -> None:
+        index, priority, write_count = [], [], []
+        for _index, _priority, _write_count in updates:
+            _index = to_numpy(_index)
+            index.append(_index)
+            priority.append(np.broadcast_to(to_numpy(_priority), _index.shape))
+            write_count.append(np.broadcast_to(to_numpy(_write_count), _index.shape))
+        index = np.concatenate(index)
+        priority = np.concatenate(priority)
+        write_count = np.concatenate(write_count)
+        if (priority < 0).any():
+            raise RuntimeError(
+                f"Priority must be a positive value, got "
+                f"{(priority < 0).sum()} negative priority values."
+            )
+        # the slots written since an update was staged hold new data
+        fresh = self._slot_write_count[index] <= write_count
+        if not fresh.all():
+            index = index[fresh]
+            priority = priority[fresh]
+        if not len(index):
+            return
+        self._set_priority(index, priority, channel)
+
+
+def _make_trees(
+    size: int,
+    dtype: torch.dtype,
+    fanout: Optional[int],
+    nodes: Optional[Tuple[Tensor, Tensor]] = None,
+) -> Tuple:
+    if dtype in (torch.float, torch.FloatType, torch.float32):
+        sum_cls, min_cls = SumSegmentTreeFp32, MinSegmentTreeFp32
+        kary_sum_cls, kary_min_cls = KarySumSegmentTreeFp32, KaryMinSegmentTreeFp32
+    elif dtype in (torch.double, torch.DoubleTensor, torch.float64):
+        sum_cls, min_cls = SumSegmentTreeFp64, MinSegmentTreeFp64
+        kary_sum_cls, kary_min_cls = KarySumSegmentTreeFp64, KaryMinSegmentTreeFp64
+    else:
+        raise NotImplementedError(
+            f"dtype {dtype} not supported by PrioritizedReplayBuffer"
+        )
+    if fanout is not None:
+        if nodes is not None:
+            raise NotImplementedError("K-ary trees cannot be built on given nodes.")
+        return kary_sum_cls(size, fanout), kary_min_cls(size, fanout)
+    if nodes is not None:
+        # the trees are built on the given (sum, min) nodes, e.g. tensors
+        # placed in shared memory
+        return sum_cls(size, nodes[0]), min_cls(size, nodes[1])
+    return sum_cls(size), min_cls(size)
+
+
+class _PriorityChannel:
+    """The segment trees and the exponents of a named priority channel of a
+    :obj:`PrioritizedReplayBuffer`. Its methods must be called with the
+    replay lock of the buffer held."""
+
+    def __init__(
+        self,
+        size: int,
+        alpha: float,
+        beta: float,
+        dtype: torch.dtype,
+        fanout: Optional[int],
+    ) -> None:
+        if alpha <= 0:
+            raise ValueError(
+                f"alpha must be strictly greater than 0, got alpha={alpha}"
+            )
+        if beta < 0:
+            raise ValueError(f"beta must be greater or equal to 0, got beta={beta}")
+        self.alpha = alpha
+        self.beta = beta
+        self.max_priority = 1.0
+        self.sum_tree, self.min_tree = _make_trees(size, dtype, fanout)
+
+    def default_priority(self, eps: float) -> float:
+        return float((self.max_priority + eps) ** self.alpha)
+
+    def write(self, index: np.ndarray, priority: Any) -> None:
+        self.sum_tree[index] = priority
+        self.min_tree[index] = priority
+
+    def update(self, index: np.ndarray, priority: np.ndarray, eps: float) -> None:
+        self.max_priority = max(self.max_priority, np.max(priority))
+        self.write(index, np.power(priority + eps, self.alpha))
+
+    def hide(self, index: np.ndarray) -> None:
+        self.sum_tree[index] = 0.0
+        self.min_tree[index] = self.min_tree.identity_element
+
+    def dumps(self, path: Union[str, os.PathLike], name: str) -> None:
+        np.save(os.path.join(path, f"sum_tree_{name}.npy"), self.sum_tree.dump_values())
+        np.save(os.path.join(path, f"min_tree_{name}.npy"), self.min_tree.dump_values())
+
+    def loads(
+        self, path: Union[str, os.PathLike], name: str, max_priority: float
+    ) -> None:
+        self.sum_tree.load_values(
+            np.load(os.path.join(path, f"sum_tree_{name}.npy"), mmap_mode="r")
+        )
+        self.min_tree.load_values(
+            np.load(os.path.join(path, f"min_tree_{name}.npy"), mmap_mode="r")
+        )
+        self.max_priority = max_priority
 
 
 class TensorDictReplayBuffer(ReplayBuffer):
     """
     TensorDict-specific wrapper around the ReplayBuffer class.
+
+    Args:
+        size (int): integer indicating the maximum size of the replay buffer.
+        collate_fn (callable, optional): merges a list of samples to form a
+            mini-batch of Tensor(s)/outputs.  Used when using batched
+            loading from a map-style dataset.
+        pin_memory (bool): whether pin_memory() should be called on the rb
+            samples.
+        prefetch (int, optional): number of next batches to be prefetched
+            using multithreading.
+        storage (Storage, optional): the storage to be used. If none is
+            provided, a :obj:`ListStorage` of capacity `size` is used.
+            A :obj:`LazyTensorStorage` keeps the data in one contiguous
+            tensor per key, which avoids stacking the samples.
+        num_output_buffers (int, optional): number of preallocated outputs
+            the samples are gathered in. See :obj:`ReplayBuffer` for more
+            details.
+        writer (Writer, optional): the policy deciding where the new data is
+            written. Default is :obj:`RoundRobinWriter`.
+        transform (callable, optional): a function applied to the sampled
+            batches. See :obj:`ReplayBuffer` for more details.
+
+    Examples:
+        >>> from torchrl.data.replay_buffers.storages import LazyTensorStorage
+        >>> rb = TensorDictReplayBuffer(1000, storage=LazyTensorStorage(1000))
+        >>> rb.extend(TensorDict({"obs": torch.randn(10, 4)}, batch_size=[10]))
+        >>> rb.sample(5).get("obs").shape
+        torch.Size([5, 4])
     """
 
     def __init__(
@@ -541,13 +1294,26 @@ class TensorDictReplayBuffer(ReplayBuffer):
         collate_fn: Optional[Callable] = None,
         pin_memory: bool = False,
         prefetch: Optional[int] = None,
+        storage: Optional[Storage] = None,
+        num_output_buffers: Optional[int] = None,
+        writer: Optional[Writer] = None,
+        transform: Optional[Callable[[_TensorDict, np.ndarray], _TensorDict]] = None,
     ):
+        if storage is None:
+            storage = ListStorage(size)
         if collate_fn is None:
-
-            def collate_fn(x):
-                return stack_td(x, 0, contiguous=True)
-
-        super().__init__(size, collate_fn, pin_memory, prefetch)
+            collate_fn = _get_default_collate(storage)
+
+        super().__init__(
+            size,
+            collate_fn,
+            pin_memory,
+            prefetch,
+            storage,
+            num_output_buffers,
+            writer,
+            transform,
+        )
 
     def sample(self, size: int) -> Any:
         return super(TensorDictReplayBuffer, self).sample(size)
@@ -577,6 +1343,29 @@ class TensorDictPrioritizedReplayBuffer(PrioritizedReplayBuffer):
             the rb samples. Default is `False`.
         prefetch (int, optional): number of next batches to be prefetched
             using multithreading.
+        storage (Storage, optional): the storage to be used. If none is
+            provided, a :obj:`ListStorage` of capacity `size` is used.
+        num_output_buffers (int, optional): number of preallocated outputs
+            the samples are gathered in. The `"index"` and `"_weight"`
+            entries are written in these outputs too. See
+            :obj:`ReplayBuffer` for more details.
+        fanout (int, optional): number of children per node of the sum and
+            min trees. If none is provided, binary trees are used.
+            See :obj:`PrioritizedReplayBuffer` for more details.
+        deferred_updates (int, optional): if provided, priority updates are
+            staged and applied in batches of up to this many priorities.
+            See :obj:`PrioritizedReplayBuffer` for more details.
+        writer (Writer, optional): the policy deciding where the new data is
+            written. Default is :obj:`RoundRobinWriter`.
+        transform (callable, optional): a function applied to the sampled
+            batches. See :obj:`ReplayBuffer` for more details.
+        channels (dict, optional): additional named priority channels,
+            mapping each name to its `(alpha, beta)` exponents. The
+            priorities of a channel are read from the key of the same name
+            by :obj:`update_priority`. See :obj:`PrioritizedReplayBuffer`
+            for more details.
+        dtype (torch.dtype, optional): dtype of the priorities. Default is
+            `torch.float`.
     """
 
     def __init__(
@@ -589,20 +1378,36 @@ class TensorDictPrioritizedReplayBuffer(PrioritizedReplayBuffer):
         collate_fn=None,
         pin_memory: bool = False,
         prefetch: Optional[int] = None,
+        storage: Optional[Storage] = None,
+        num_output_buffers: Optional[int] = None,
+        fanout: Optional[int] = None,
+        deferred_updates: Optional[int] = None,
+        writer: Optional[Writer] = None,
+        transform: Optional[Callable[[_TensorDict, np.ndarray], _TensorDict]] = None,
+        channels: Optional[Dict[str, Tuple[float, float]]] = None,
+        dtype: torch.dtype = torch.float,
     ) -> None:
+        if storage is None:
+            storage = ListStorage(size)
         if collate_fn is None:
-
-            def collate_fn(x):
-                return stack_td(x, 0, contiguous=True)
+            collate_fn = _get_default_collate(storage)
 
         super(TensorDictPrioritizedReplayBuffer, self).__init__(
             size=size,
             alpha=alpha,
             beta=beta,
             eps=eps,
+            dtype=dtype,
             collate_fn=collate_fn,
             pin_memory=pin_memory,
             prefetch=prefetch,
+            storage=storage,
+            num_output_buffers=num_output_buffers,
+            fanout=fanout,
+            deferred_updates=deferred_updates,
+            writer=writer,
+            transform=transform,
+            channels=channels,
         )
         self.priority_key = priority_key
 
@@ -638,6 +1443,10 @@ class TensorDictPrioritizedReplayBuffer(PrioritizedReplayBuffer):
             if tensordicts.batch_dims > 1:
                 tensordicts = tensordicts.clone(recursive=False)
                 tensordicts.batch_size = tensordicts.batch_size[:1]
+            if not isinstance(self._storage, ListStorage):
+                # contiguous storages get the whole batch at once, the
+                # index is written in the samples
+                return super().extend(tensordicts, priorities)
             tensordicts = list(tensordicts.unbind(0))
         else:
             priorities = [self._get_priority(td) for td in tensordicts]
@@ -647,25 +1456,34 @@ class TensorDictPrioritizedReplayBuffer(PrioritizedReplayBuffer):
         stacked_td.set("index", idx)
         return idx
 
-    def update_priority(self, tensordict: _TensorDict) -> None:
+    def update_priority(
+        self, tensordict: _TensorDict, channel: Optional[str] = None
+    ) -> None:
         """Updates the priorities of the tensordicts stored in the replay
         buffer.
 
         Args:
             tensordict: tensordict with key-value pairs 'self.priority_key'
-                and 'index'.
+                (or the name of the channel) and 'index'.
+            channel (str, optional): the priority channel to be updated. If
+                none is provided, the main priorities are updated.
 
 
         """
-        priority = tensordict.get(self.priority_key)
-        if (priority < 0).any():
+        priority = tensordict.get(self.priority_key if channel is None else channel)
+        # deferred updates are checked when they are applied
+        if not self._deferred_updates and (priority < 0).any():
             raise RuntimeError(
                 f"Priority must be a positive value, got "
                 f"{(priority < 0).sum()} negative priority values."
             )
-        return super().update_priority(tensordict.get("index"), priority=priority)
+        return super().update_priority(
+            tensordict.get("index"), priority=priority, channel=channel
+        )
 
-    def sample(self, size: int, return_weight: bool = False) -> _TensorDict:
+    def sample(
+        self, size: int, return_weight: bool = False, channel: Optional[str] = None
+    ) -> _TensorDict:
         """
         Gather a batch of tensordicts according to the non-uniform multinomial
         distribution with weights computed with the priority_key of each
@@ -676,14 +1494,21 @@ class TensorDictPrioritizedReplayBuffer(PrioritizedReplayBuffer):
             return_weight (bool, optional): if True, a '_weight' key will be
                 written in the output tensordict that indicates the weight
                 of the selected items
+            channel (str, optional): the priority channel the batch is drawn
+                from. If none is provided, the main priorities are used.
 
         Returns:
             Stack of tensordicts
 
         """
-        td, weight, _ = super(TensorDictPrioritizedReplayBuffer, self).sample(size)
+        td, weight, index = super(TensorDictPrioritizedReplayBuffer, self).sample(
+            size, channel
+        )
+        # preallocated outputs are updated in place
+        if not isinstance(self._storage, ListStorage):
+            td.set("index", torch.as_tensor(index, device=td.device), inplace=True)
         if return_weight:
-            td.set("_weight", weight)
+            td.set("_weight", weight, inplace=True)
         return td
 
 
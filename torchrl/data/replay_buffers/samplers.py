@@ -0,0 +1,193 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+from typing import Optional, Sequence
+
+import numpy as np
+import torch
+
+from torchrl.data.replay_buffers.replay_buffers import ReplayBuffer
+from torchrl.data.replay_buffers.storages import LazyTensorStorage
+from torchrl.data.replay_buffers.writers import RoundRobinWriter
+from torchrl.data.tensordict.tensordict import _TensorDict, TensorDict
+
+__all__ = ["SequenceSampler"]
+
+
+class SequenceSampler:
+    """Samples windows of consecutive steps from a replay buffer.
+
+    Each sample is a sequence of :obj:`seq_len` consecutive transitions that
+    belong to the same trajectory: a window never crosses a `"done"` flag,
+    a change of `"traj_ids"`, the write cursor of the buffer (where the
+    newest data meets the oldest), a slot that is being written or an
+    expired slot. Valid window starts are computed with a cumulative sum
+    over the trajectory boundaries, and each key is then read with a single
+    gather, such that trajectories never need to be split and padded.
+
+    The replay buffer must hold its data in a :obj:`LazyTensorStorage` (or
+    a subclass of it) and the data must be written in time order, as is the
+    case when extending the buffer with flattened collector batches through
+    a :obj:`RoundRobinWriter` (or a subclass of it). Storages that keep some
+    keys outside of their columns (e.g. :obj:`FrameStackStorage` or
+    :obj:`CompressedStorage`) are read through their own gathering path, in
+    which case the recurrent states are read at every step of the windows.
+
+    Args:
+        replay_buffer (ReplayBuffer): the buffer to sample from.
+        seq_len (int): number of consecutive steps in each window.
+        recurrent_state_keys (sequence of str, optional): keys of the stored
+            recurrent states (e.g. `"hidden0"` and `"hidden1"`). For these
+            keys, only the value at the start of each window is read, and it
+            is expanded along the time dimension: the network can then be
+            unrolled over the window from its stored initial state.
+
+    Examples:
+        >>> rb = TensorDictReplayBuffer(1000, storage=LazyTensorStorage(1000))
+        >>> rb.extend(collector_batch.reshape(-1))
+        >>> sampler = SequenceSampler(rb, seq_len=8,
+        ...     recurrent_state_keys=["hidden0", "hidden1"])
+        >>> batch = sampler.sample(32)
+        >>> batch.shape
+        torch.Size([32, 8])
+
+    """
+
+    def __init__(
+        self,
+        replay_buffer: ReplayBuffer,
+        seq_len: int,
+        recurrent_state_keys: Optional[Sequence[str]] = None,
+    ) -> None:
+        if not isinstance(replay_buffer._storage, LazyTensorStorage):
+            raise TypeError(
+                f"{self.__class__.__name__} requires a LazyTensorStorage, got "
+                f"{type(replay_buffer._storage)} instead."
+            )
+        if not isinstance(replay_buffer._writer, RoundRobinWriter):
+            raise TypeError(
+                f"{self.__class__.__name__} requires a RoundRobinWriter, got "
+                f"{type(replay_buffer._writer)} instead."
+            )
+        if seq_len < 1:
+            raise ValueError(f"seq_len must be strictly positive, got {seq_len}.")
+        self.replay_buffer = replay_buffer
+        self.seq_len = seq_len
+        self.recurrent_state_keys = set(
+            recurrent_state_keys if recurrent_state_keys is not None else []
+        )
+        # window starts of the last generation of the buffer
+        self._starts = None
+        self._generation = None
+
+    def _window_starts(self) -> torch.Tensor:
+        # must be called with the replay lock held
+        if self._generation == self.replay_buffer._generation:
+            return self._starts
+        storage = self.replay_buffer._storage
+        columns = storage._storage
+        length = self.replay_buffer._len
+        if not isinstance(columns, _TensorDict) or not (
+            {"traj_ids", "done"} & set(columns.keys())
+        ):
+            raise KeyError(
+                "The storage must contain a 'traj_ids' or a 'done' entry to "
+                "delimit trajectories."
+            )
+        # last[i] is True if step i is the last one of a contiguous segment
+        last = torch.zeros(length, dtype=torch.bool, device=storage.device)
+        if "done" in columns.keys():
+            last |= columns.get("done")[:length].reshape(length, -1).any(-1)
+        if "traj_ids" in columns.keys():
+            traj_ids = columns.get("traj_ids")[:length].reshape(length, -1)[:, 0]
+            last[:-1] |= traj_ids[1:] != traj_ids[:-1]
+            last[-1] |= traj_ids[0] != traj_ids[-1]
+        last[(self.replay_buffer._cursor - 1) % length] = True
+        writing = self.replay_buffer._unavailable(np.arange(length))
+        if writing is not None:
+            # slots being written or expired end the segment that precedes them
+            writing = torch.from_numpy(writing).to(last.device)
+            last |= writing | writing.roll(-1)
+
+        # a window starting at i is valid if none of its first seq_len - 1
+        # steps is the last of a segment. Segments can wrap around the end
+        # of the storage, hence the repeated boundaries.
+        cum_last = torch.zeros(2 * length + 1, dtype=torch.long, device=last.device)
+        torch.cumsum(last.repeat(2), 0, out=cum_last[1:])
+        start = torch.arange(length, device=last.device)
+        n_boundaries = cum_last[start + self.seq_len - 1] - cum_last[start]
+        valid = n_boundaries == 0
+        if writing is not None:
+            valid &= ~writing
+        self._starts = start[valid]
+        self._generation = self.replay_buffer._generation
+        return self._starts
+
+    def sample(self, batch_size: int) -> TensorDict:
+        """Samples :obj:`batch_size` windows of :obj:`seq_len` steps.
+
+        Returns:
+            a tensordict of batch size `[batch_size, seq_len]`, with an
+            additional `"index"` entry containing the storage index of
+            each step.
+
+        """
+        with self.replay_buffer._replay_lock:
+            storage = self.replay_buffer._storage
+            length = self.replay_buffer._len
+            if length < self.seq_len:
+                raise RuntimeError(
+                    f"Cannot sample sequences of length {self.seq_len} from "
+                    f"a buffer containing {length} elements."
+                )
+            starts = self._window_starts()
+            if not starts.numel():
+                raise RuntimeError(
+                    f"No trajectory segment of length {self.seq_len} could "
+                    f"be found in the buffer."
+                )
+            starts = starts[
+                torch.randint(starts.numel(), (batch_size,), device=starts.device)
+            ]
+            index = (
+                starts.unsqueeze(1) + torch.arange(self.seq_len, device=starts.device)
+            ) % length
+            flat_index = index.view(-1)
+            if (
+                type(storage).get is LazyTensorStorage.get
+                and type(storage)._fetch is LazyTensorStorage._fetch
+            ):
+                # all the keys are columns of the storage: the recurrent states
+                # are only read at the start of the windows
+                data = None
+                out = {}
+                for key, value in storage._storage.items():
+                    if key in self.recurrent_state_keys:
+                        value = value.index_select(0, starts).unsqueeze(1)
+                        out[key] = value.expand(
+                            batch_size, self.seq_len, *value.shape[2:]
+                        )
+                    else:
+                        value = value.index_select(0, flat_index)
+                        out[key] = value.view(
+                            batch_size, self.seq_len, *value.shape[1:]
+                        )
+            else:
+                # storages that keep some keys outside of their columns (e.g.
+                # stacked frames or compressed keys) are read through _fetch
+                data = storage._fetch(flat_index)
+        if data is not None:
+            out = {}
+            for key, value in storage._decode(data).items():
+                value = value.view(batch_size, self.seq_len, *value.shape[1:])
+                if key in self.recurrent_state_keys:
+                    value = value[:, :1].expand_as(value)
+                out[key] = value
+        out["index"] = index
+        return TensorDict(
+            out,
+            batch_size=[batch_size, self.seq_len],
+            device=storage.device,
+        )
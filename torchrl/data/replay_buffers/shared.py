@@ -0,0 +1,339 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import threading
+from typing import Optional, Union
+
+import numpy as np
+import torch
+from torch import multiprocessing as mp
+
+from torchrl.data.replay_buffers.replay_buffers import (
+    _make_trees,
+    TensorDictPrioritizedReplayBuffer,
+    TensorDictReplayBuffer,
+)
+from torchrl.data.replay_buffers.storages import LazyTensorStorage
+from torchrl.data.tensordict.tensordict import _TensorDict
+
+__all__ = ["SharedTensorDictReplayBuffer", "SharedTensorDictPrioritizedReplayBuffer"]
+
+
+def _shared_value(name: str, index: int) -> property:
+    """An attribute of a replay buffer stored in the shared tensor
+    :obj:`name`, such that all the processes see the same value."""
+
+    def fget(self) -> Union[int, float]:
+        return getattr(self, name)[index].item()
+
+    def fset(self, value: Union[int, float]) -> None:
+        getattr(self, name)[index] = torch.as_tensor(value)
+
+    return property(fget, fset)
+
+
+def _make_shared_storage(size: int, tensordict: _TensorDict) -> LazyTensorStorage:
+    if tensordict.batch_dims:
+        tensordict = tensordict[(0,) * tensordict.batch_dims]
+    storage = LazyTensorStorage(size)
+    storage._init(tensordict)
+    storage._storage.share_memory_()
+    return storage
+
+
+class _SharedReplayBufferMixin:
+    """Keeps the state of a replay buffer in shared memory: the storage, the
+    counters and the per-slot arrays are placed in shared tensors, the
+    numpy arrays used by the buffer being views on them, and the lock is an
+    inter-process lock. The reserve/commit logic of :obj:`ReplayBuffer` is
+    thus used as is by all the processes."""
+
+    _cursor = _shared_value("_shared_counters", 0)
+    _len = _shared_value("_shared_counters", 1)
+    _n_writing = _shared_value("_shared_counters", 2)
+    _generation = _shared_value("_shared_counters", 3)
+    _n_counters = 4
+
+    # numpy views on the shared tensor of the same name prefixed by "_shared"
+    _shared_arrays = ("_writing",)
+
+    def _init_shared_state(self, size: int) -> None:
+        # must be called before the replay buffer is initialized
+        self._shared_counters = torch.zeros(
+            self._n_counters, dtype=torch.long
+        ).share_memory_()
+        self._shared_writing = torch.zeros(size, dtype=torch.long).share_memory_()
+
+    def _share(self) -> None:
+        # must be called once the replay buffer is initialized
+        self._replay_lock = mp.RLock()
+        self._map_shared_arrays()
+
+    def _map_shared_arrays(self) -> None:
+        for name in self._shared_arrays:
+            setattr(self, name, getattr(self, f"_shared{name}").numpy())
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        # pickling the numpy views would copy them, the thread lock cannot
+        # be pickled
+        for name in self._shared_arrays:
+            state.pop(name, None)
+        state.pop("_future_lock", None)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._future_lock = threading.RLock()
+        self._map_shared_arrays()
+
+    def _check_keys(self, tensordict: _TensorDict, *optional_keys: str) -> None:
+        keys = set(tensordict.keys()).difference(optional_keys)
+        stored = set(self._storage._storage.keys()).difference(optional_keys)
+        if keys != stored:
+            raise KeyError(
+                f"The buffer stores the keys {sorted(stored)}, got {sorted(keys)} "
+                f"instead."
+            )
+
+    def dumps(self, path: Union[str, os.PathLike]) -> None:
+        with self._replay_lock:
+            # the length of the storage is only tracked by the processes that
+            # have written it
+            self._storage._len = self._len
+            self._storage._last_cursor = self._cursor
+            super().dumps(path)
+
+
+class SharedTensorDictReplayBuffer(_SharedReplayBufferMixin, TensorDictReplayBuffer):
+    """A :obj:`TensorDictReplayBuffer` that can be written and sampled by
+    several processes.
+
+    The storage, the counters and the per-slot state of the buffer are kept
+    in tensors placed in shared memory and protected by an inter-process
+    lock. Collector processes can thus extend the buffer directly with the
+    data they have collected, without sending it through a queue to the
+    trainer process, while one or more learner processes sample from it
+    concurrently. The buffer must be passed to the processes when they are
+    created.
+
+    As in :obj:`ReplayBuffer`, the lock is only held to reserve the slots
+    of the new elements and to commit them once written: the data is copied
+    without holding it, and the slots being written are not sampled.
+
+    As the storage must be allocated before being shared, an example of
+    the data to be stored is required at construction time.
+
+    Args:
+        size (int): maximum number of elements that the buffer can hold.
+        tensordict (_TensorDict): an example of the data to be stored. If it
+            has a batch dimension, its first element is used.
+
+    Examples:
+        >>> rb = SharedTensorDictReplayBuffer(100_000, example_td)
+        >>> def collect(rb):
+        ...     for data in collector:
+        ...         rb.extend(data.view(-1))
+        >>> procs = [mp.Process(target=collect, args=(rb,)) for _ in range(4)]
+        >>> for proc in procs:
+        ...     proc.start()
+        >>> sample = rb.sample(256)
+
+    """
+
+    def __init__(self, size: int, tensordict: _TensorDict) -> None:
+        self._init_shared_state(size)
+        super().__init__(size, storage=_make_shared_storage(size, tensordict))
+        self._share()
+
+    def extend(self, tensordict: _TensorDict) -> np.ndarray:
+        """Writes a batch of data in the buffer.
+
+        Args:
+            tensordict (_TensorDict): data to be written, the first batch
+                dimension indexing the elements.
+
+        Returns:
+            the indices where the data was written.
+
+        """
+        self._check_keys(tensordict)
+        return super().extend(tensordict)
+
+
+class SharedTensorDictPrioritizedReplayBuffer(
+    _SharedReplayBufferMixin, TensorDictPrioritizedReplayBuffer
+):
+    """A :obj:`TensorDictPrioritizedReplayBuffer` that can be written and
+    sampled by several processes.
+
+    The nodes of the sum and min trees are placed in shared memory along
+    with the state described in :obj:`SharedTensorDictReplayBuffer`, each
+    process building its trees on them.
+
+    The sampled tensordicts hold a `"_write_count"` entry along with the
+    `"index"`: the updates of :obj:`update_priority` are discarded for the
+    elements that have been overwritten since they were sampled, possibly by
+    another process.
+
+    Args:
+        size (int): maximum number of elements that the buffer can hold.
+        tensordict (_TensorDict): an example of the data to be stored. If it
+            has a batch dimension, its first element is used. It may or may
+            not contain the priority key.
+        alpha (float): prioritization exponent.
+        beta (float, optional): importance sampling negative exponent.
+            Default is `0.4`.
+        priority_key (str, optional): key where the priority value can be
+            found in the stored tensordicts. Default is `"td_error"`.
+        eps (float, optional): delta added to the priorities to ensure that
+            the buffer does not contain null priorities. Default is `1e-8`.
+        dtype (torch.dtype, optional): dtype of the priorities. Default is
+            `torch.float`.
+
+    Examples:
+        >>> rb = SharedTensorDictPrioritizedReplayBuffer(100_000, example_td, 0.7)
+        >>> procs = [mp.Process(target=collect, args=(rb,)) for _ in range(4)]
+        >>> for proc in procs:
+        ...     proc.start()
+        >>> sample = rb.sample(256, return_weight=True)
+        >>> sample.set("td_error", loss_module(sample).get("td_error"))
+        >>> rb.update_priority(sample)
+
+    """
+
+    _write_count = _shared_value("_shared_counters", 4)
+    _n_counters = 5
+    _max_priority = _shared_value("_shared_max_priority", 0)
+
+    _shared_arrays = ("_writing", "_slot_write_count")
+
+    def __init__(
+        self,
+        size: int,
+        tensordict: _TensorDict,
+        alpha: float,
+        beta: float = 0.4,
+        priority_key: str = "td_error",
+        eps: float = 1e-8,
+        dtype: torch.dtype = torch.float,
+    ) -> None:
+        self._init_shared_state(size)
+        self._shared_slot_write_count = torch.zeros(
+            size, dtype=torch.long
+        ).share_memory_()
+        self._shared_max_priority = torch.ones(1, dtype=torch.double).share_memory_()
+        super().__init__(
+            size,
+            alpha,
+            beta,
+            priority_key=priority_key,
+            eps=eps,
+            storage=_make_shared_storage(size, tensordict),
+            dtype=dtype,
+        )
+        self._share()
+
+    def _init_trees(self, size: int, dtype: torch.dtype, fanout: Optional[int]):
+        self._fanout = fanout
+        sum_tree, min_tree = _make_trees(size, dtype, fanout)
+        # the nodes are moved to shared memory and the trees built on them
+        self._sum_nodes = sum_tree.nodes.clone().share_memory_()
+        self._min_nodes = min_tree.nodes.clone().share_memory_()
+        self._build_trees()
+
+    def _build_trees(self) -> None:
+        self._sum_tree, self._min_tree = _make_trees(
+            len(self._shared_writing),
+            self._sum_nodes.dtype,
+            self._fanout,
+            (self._sum_nodes, self._min_nodes),
+        )
+
+    def __getstate__(self) -> dict:
+        state = super().__getstate__()
+        # pickling the trees would copy their nodes
+        state.pop("_sum_tree", None)
+        state.pop("_min_tree", None)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        super().__setstate__(state)
+        self._build_trees()
+
+    def extend(self, tensordict: _TensorDict) -> np.ndarray:
+        """Writes a batch of data in the buffer. The priorities are read from
+        the priority key if it is present, and stored only if the example
+        tensordict had this key.
+
+        Args:
+            tensordict (_TensorDict): data to be written, the first batch
+                dimension indexing the elements.
+
+        Returns:
+            the indices where the data was written.
+
+        """
+        self._check_keys(tensordict, self.priority_key)
+        if (
+            self.priority_key in tensordict.keys()
+            and self.priority_key not in self._storage._storage.keys()
+        ):
+            priority = tensordict.get(self.priority_key)
+            return super(TensorDictPrioritizedReplayBuffer, self).extend(
+                tensordict.exclude(self.priority_key), priority
+            )
+        return super().extend(tensordict)
+
+    def sample(self, size: int, return_weight: bool = False) -> _TensorDict:
+        """Samples a batch of data from the buffer. See
+        :obj:`TensorDictPrioritizedReplayBuffer.sample`."""
+        # read before the sample is drawn, such that the updates of the
+        # elements overwritten in the meantime are discarded
+        write_count = self._write_count
+        td = super().sample(size, return_weight)
+        td.set("_write_count", torch.full((size,), write_count, dtype=torch.long))
+        return td
+
+    def update_priority(self, tensordict: _TensorDict) -> None:
+        """Updates the priorities of the elements of a sampled tensordict.
+
+        The updates of the elements that have been overwritten since they
+        were sampled are discarded. If the tensordict has no
+        `"_write_count"` entry, only the elements being written are skipped.
+
+        Args:
+            tensordict (_TensorDict): tensordict with key-value pairs
+                `self.priority_key`, `"index"` and, optionally,
+                `"_write_count"`.
+
+        """
+        index = tensordict.get("index").reshape(-1)
+        priority = tensordict.get(self.priority_key).reshape(-1)
+        write_count = tensordict.get("_write_count", None)
+        if write_count is not None:
+            write_count = write_count.reshape(-1)
+        with self._replay_lock:
+            if write_count is None:
+                write_count = self._write_count
+            self._apply_channel_updates(None, [(index, priority, write_count)])
+
+    def _set_priority(
+        self, index: np.ndarray, priority: np.ndarray, channel: Optional[str]
+    ) -> None:
+        # the slots being (re-)written by another process stay hidden
+        written = self._writing[index] == 0
+        if not written.all():
+            index = index[written]
+            priority = priority[written]
+        if len(index):
+            super()._set_priority(index, priority, channel)
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(size={len(self)}, "
+            f"capacity={self._capacity}, alpha={self._alpha})"
+        )
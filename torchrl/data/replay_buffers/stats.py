@@ -0,0 +1,122 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import contextlib
+import threading
+import time
+from typing import Dict
+
+import numpy as np
+import torch
+
+__all__ = ["ReplayBufferStats"]
+
+# shared by the buffers whose statistics are disabled
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class _Timer:
+    def __init__(self, stats: "ReplayBufferStats", name: str) -> None:
+        self.stats = stats
+        self.name = name
+        self._record_function = None
+
+    def __enter__(self) -> None:
+        if self.stats.record_function:
+            self._record_function = torch.profiler.record_function(
+                f"ReplayBuffer.{self.name}"
+            )
+            self._record_function.__enter__()
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stats.record(self.name, time.perf_counter() - self.t0)
+        if self._record_function is not None:
+            self._record_function.__exit__(exc_type, exc_val, exc_tb)
+            self._record_function = None
+
+
+class ReplayBufferStats:
+    """Latency statistics of a replay buffer.
+
+    The replay buffers time the phases of their calls when their statistics
+    are enabled with :obj:`ReplayBuffer.enable_stats`:
+
+    - `"sample"`: a call to `sample`, as seen by the caller (with
+      prefetching, the time spent waiting for a prefetched batch);
+    - `"sample/index"`: drawing the indices;
+    - `"sample/gather"`: reading the sampled elements from the storage;
+    - `"sample/collate"`: decoding and collating the elements, and applying
+      the transform of the buffer;
+    - `"sample/pin"`: pinning the memory of the batch;
+    - `"extend"`: a call to `add` or `extend`.
+
+    The last :obj:`window` durations of each phase are kept to compute
+    percentiles. With :obj:`record_function`, each phase is also labelled
+    `"ReplayBuffer.<phase>"` in the :obj:`torch.profiler` traces.
+
+    Args:
+        window (int, optional): number of durations kept per phase. Default
+            is `1000`.
+        record_function (bool, optional): if True, the phases are labelled
+            in the profiler traces. Default is `False`.
+
+    """
+
+    def __init__(self, window: int = 1000, record_function: bool = False) -> None:
+        if window < 1:
+            raise ValueError(f"window must be strictly positive, got {window}.")
+        self.window = window
+        self.record_function = record_function
+        self._durations = {}
+        self._counts = {}
+        # phases are recorded from the prefetching threads too
+        self._lock = threading.Lock()
+
+    def timer(self, name: str) -> _Timer:
+        """Returns a context manager timing the phase :obj:`name`."""
+        return _Timer(self, name)
+
+    def record(self, name: str, duration: float) -> None:
+        """Records a duration, in seconds, for the phase :obj:`name`."""
+        with self._lock:
+            if name not in self._durations:
+                self._durations[name] = np.zeros(self.window)
+                self._counts[name] = 0
+            self._durations[name][self._counts[name] % self.window] = duration
+            self._counts[name] += 1
+
+    def reset(self) -> None:
+        """Discards the durations recorded so far."""
+        with self._lock:
+            self._durations.clear()
+            self._counts.clear()
+
+    def summary(self) -> Dict[str, float]:
+        """Returns the number of calls and the mean, median, 90th and 99th
+        percentiles of the latest durations of each phase, in milliseconds,
+        with keys such as `"sample/index_p99_ms"`."""
+        with self._lock:
+            durations = {
+                name: values[: min(self._counts[name], self.window)].copy()
+                for name, values in self._durations.items()
+            }
+            counts = dict(self._counts)
+        out = {}
+        for name, values in durations.items():
+            values = values * 1000
+            p50, p90, p99 = np.percentile(values, [50, 90, 99])
+            out[f"{name}_count"] = counts[name]
+            out[f"{name}_mean_ms"] = float(values.mean())
+            out[f"{name}_p50_ms"] = float(p50)
+            out[f"{name}_p90_ms"] = float(p90)
+            out[f"{name}_p99_ms"] = float(p99)
+        return out
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(window={self.window}, "
+            f"record_function={self.record_function})"
+        )
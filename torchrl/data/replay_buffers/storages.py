@@ -0,0 +1,1166 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import abc
+import collections
+import functools
+import json
+import lzma
+import os
+import tempfile
+import threading
+import zlib
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import torch
+
+from torchrl.data.tensordict.tensordict import _TensorDict, TensorDict
+from torchrl.data.utils import DEVICE_TYPING, torch_to_numpy_dtype_dict
+
+__all__ = [
+    "Storage",
+    "ListStorage",
+    "LazyTensorStorage",
+    "LazyMemmapStorage",
+    "FrameStackStorage",
+    "CompressedStorage",
+]
+
+INT_CLASSES = (int, np.integer)
+
+_METADATA_FILE = "storage_metadata.json"
+_COUNTERS_FILE = "counters.memmap"
+# size of the chunks in which the storages are saved and restored
+_CHUNK_NBYTES = 64 * 2**20
+
+
+class Storage:
+    """A Storage is the container of a replay buffer.
+
+    Every storage must have a set, get and __len__ methods implemented.
+    Get and set should support integers as well as list of integers.
+
+    The storage does not need to have a definite size, but if it does one
+    should make sure that it is compatible with the buffer size.
+
+    Storages that set :obj:`_concurrent_writes` to True can be written
+    from several threads at once, on disjoint indices, and read at indices
+    that are not being written. Replay buffers then copy the data outside of
+    their lock.
+
+    Storages that set :obj:`_round_robin_writes` to True rely on the
+    elements being overwritten from the oldest to the newest, and can only
+    be used with a :obj:`RoundRobinWriter` (or a subclass of it).
+
+    Args:
+        max_size (int): maximum number of elements that the storage can hold.
+
+    """
+
+    _concurrent_writes = False
+    _round_robin_writes = False
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = int(max_size)
+
+    @abc.abstractmethod
+    def set(self, cursor: Union[int, Sequence[int]], data: Any) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get(self, index: Union[int, Sequence[int]]) -> Any:
+        raise NotImplementedError
+
+    def __getitem__(self, item: Union[int, Sequence[int]]) -> Any:
+        return self.get(item)
+
+    def __setitem__(self, index: Union[int, Sequence[int]], value: Any) -> None:
+        return self.set(index, value)
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def _fetch(self, index: Union[int, Sequence[int]], out: Any = None) -> Any:
+        """Reads the items at :obj:`index`. Replay buffers call this method
+        while holding their lock, and pass the result to :obj:`_decode`
+        once the lock is released. If :obj:`out` is provided, storages that
+        can do so write the items directly in it."""
+        return self.get(index)
+
+    def _decode(self, data: Any, out: Any = None) -> Any:
+        """Completes a read started by :obj:`_fetch`. Storages can defer
+        expensive work (e.g. decompression) to this method, which runs in the
+        prefetching threads of the replay buffer."""
+        if out is None or data is out:
+            return data
+        if isinstance(out, torch.Tensor):
+            return out.copy_(data)
+        return out.update_(data)
+
+    def dumps(self, path: Union[str, os.PathLike]) -> None:
+        """Saves the content of the storage in the directory :obj:`path`."""
+        raise NotImplementedError(
+            f"{self.__class__.__name__} does not support checkpointing."
+        )
+
+    def loads(self, path: Union[str, os.PathLike]) -> None:
+        """Restores the content saved by :obj:`dumps` in the directory
+        :obj:`path`."""
+        raise NotImplementedError(
+            f"{self.__class__.__name__} does not support checkpointing."
+        )
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Returns the number of bytes held by the storage for each key."""
+        raise NotImplementedError
+
+
+class ListStorage(Storage):
+    """A storage that keeps each element as a separate python object in a list.
+
+    This is the default storage of the replay buffers. Sampling from it
+    requires the elements to be collated (e.g. stacked) together.
+
+    Args:
+        max_size (int): maximum number of elements that the storage can hold.
+
+    """
+
+    _concurrent_writes = True
+
+    def __init__(self, max_size: int) -> None:
+        super().__init__(max_size)
+        self._storage = []
+        self._lock = threading.Lock()
+
+    def _grow(self, size: int) -> None:
+        if size > self.max_size:
+            raise RuntimeError(
+                f"Cannot append data to the list storage: "
+                f"maximum capacity is {self.max_size} "
+                f"and the index of the item to be set is {size - 1}."
+            )
+        # slots reserved by concurrent writers are filled with None until
+        # their data is written
+        with self._lock:
+            if size > len(self._storage):
+                self._storage.extend([None] * (size - len(self._storage)))
+
+    def set(self, cursor: Union[int, Sequence[int]], data: Any) -> None:
+        if isinstance(cursor, INT_CLASSES):
+            self._grow(cursor + 1)
+            self._storage[cursor] = data
+            return
+        cursor = [int(_cursor) for _cursor in cursor]
+        self._grow(max(cursor) + 1)
+        for _cursor, _data in zip(cursor, data):
+            self._storage[_cursor] = _data
+
+    def get(self, index: Union[int, Sequence[int]]) -> Any:
+        if isinstance(index, INT_CLASSES):
+            return self._storage[index]
+        return [self._storage[i] for i in index]
+
+    def __len__(self) -> int:
+        return len(self._storage)
+
+    # number of elements pickled together when saving the storage
+    _items_per_file = 10_000
+
+    def dumps(self, path: Union[str, os.PathLike]) -> None:
+        """Saves the elements in the directory :obj:`path`, in files of
+        :obj:`_items_per_file` elements such that they are never all
+        serialized in memory at once. Contiguous storages such as
+        :obj:`LazyTensorStorage` are much faster to save."""
+        os.makedirs(path, exist_ok=True)
+        starts = range(0, len(self._storage), self._items_per_file)
+        for i, start in enumerate(starts):
+            torch.save(
+                self._storage[start : start + self._items_per_file],
+                os.path.join(path, f"items_{i}.pt"),
+            )
+        _write_metadata(path, {"max_size": self.max_size, "n_files": len(starts)})
+
+    def loads(self, path: Union[str, os.PathLike]) -> None:
+        metadata = _read_metadata(path, self.max_size)
+        storage = []
+        for i in range(metadata["n_files"]):
+            # the items are TensorDicts written by dumps
+            storage.extend(
+                torch.load(os.path.join(path, f"items_{i}.pt"), weights_only=False)
+            )
+        with self._lock:
+            self._storage = storage
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Returns the number of bytes held by the tensors of the stored
+        elements, for each key. The elements are visited one by one."""
+        with self._lock:
+            items = [item for item in self._storage if item is not None]
+        nbytes = collections.defaultdict(int)
+        for item in items:
+            if isinstance(item, (tuple, list)):
+                for i, value in enumerate(item):
+                    _add_nbytes(nbytes, str(i), value)
+            else:
+                _add_nbytes(nbytes, "tensor", item)
+        return dict(nbytes)
+
+
+class LazyTensorStorage(Storage):
+    """A pre-allocated columnar storage for tensors and tensordicts.
+
+    On the first call to `set`, one contiguous tensor is allocated for each
+    key of the data, with the storage capacity as leading dimension. Writes
+    then amount to a single indexed copy per key and reads to a single
+    `index_select` per key, such that sampled batches do not need to be
+    stacked.
+
+    Args:
+        max_size (int): maximum number of elements that the storage can hold.
+        device (torch.device, optional): device where the storage is to be
+            allocated. Default is `"cpu"`.
+
+    Examples:
+        >>> storage = LazyTensorStorage(100)
+        >>> data = TensorDict({"obs": torch.randn(10, 4)}, batch_size=[10])
+        >>> storage.set(range(10), data)
+        >>> storage.get(torch.tensor([0, 3])).get("obs").shape
+        torch.Size([2, 4])
+
+    """
+
+    _concurrent_writes = True
+
+    def __init__(self, max_size: int, device: DEVICE_TYPING = "cpu") -> None:
+        super().__init__(max_size)
+        self.device = torch.device(device)
+        self.initialized = False
+        self._len = 0
+        self._last_cursor = 0
+        self._storage = None
+        # protects the allocation and the length, not the copies
+        self._lock = threading.Lock()
+
+    def _init(self, data: Union[_TensorDict, torch.Tensor]) -> None:
+        if isinstance(data, torch.Tensor):
+            out = torch.empty(
+                self.max_size,
+                *data.shape,
+                device=self.device,
+                dtype=data.dtype,
+            )
+        else:
+            out = TensorDict(
+                {
+                    key: torch.empty(
+                        self.max_size,
+                        *tensor.shape,
+                        device=self.device,
+                        dtype=tensor.dtype,
+                    )
+                    for key, tensor in data.items()
+                },
+                batch_size=[self.max_size, *data.batch_size],
+                device=self.device,
+            )
+        self._storage = out
+        self.initialized = True
+
+    def set(
+        self,
+        cursor: Union[int, Sequence[int], slice, torch.Tensor],
+        data: Union[_TensorDict, torch.Tensor],
+    ) -> None:
+        if isinstance(cursor, INT_CLASSES):
+            with self._lock:
+                self._len = max(self._len, int(cursor) + 1)
+                self._last_cursor = int(cursor) + 1
+                if not self.initialized:
+                    self._init(data)
+        else:
+            if isinstance(data, (list, tuple)):
+                data = torch.stack(list(data), 0)
+            cursor = torch.as_tensor(cursor, dtype=torch.long, device=self.device)
+            with self._lock:
+                self._len = max(self._len, int(cursor.max()) + 1)
+                self._last_cursor = int(cursor[-1]) + 1
+                if not self.initialized:
+                    self._init(data[0])
+            cursor = _contiguous_index(cursor)
+        if isinstance(self._storage, torch.Tensor):
+            self._storage[cursor] = data
+            return
+        for key, value in data.items():
+            # copy straight into the preallocated columns
+            self._storage.get(key)[cursor] = value
+
+    def get(
+        self,
+        index: Union[int, Sequence[int], slice, torch.Tensor],
+        out: Optional[Union[_TensorDict, torch.Tensor]] = None,
+    ) -> Any:
+        """Reads the items at :obj:`index`.
+
+        If :obj:`out` is provided, the items are gathered directly in it
+        (which must have the appropriate shape) and no memory is allocated.
+        """
+        if not self.initialized:
+            raise RuntimeError("Cannot get an item from an empty storage.")
+        if isinstance(index, (INT_CLASSES, slice)):
+            return self._storage[index]
+        index = torch.as_tensor(index, dtype=torch.long, device=self.device)
+        if isinstance(self._storage, torch.Tensor):
+            return torch.index_select(self._storage, 0, index, out=out)
+        if out is not None:
+            for key, value in self._storage.items():
+                torch.index_select(value, 0, index, out=out.get(key))
+            return out
+        return TensorDict(
+            {key: value.index_select(0, index) for key, value in self._storage.items()},
+            batch_size=[index.numel(), *self._storage.batch_size[1:]],
+            device=self.device,
+        )
+
+    def _fetch(
+        self,
+        index: Union[int, Sequence[int], slice, torch.Tensor],
+        out: Optional[Union[_TensorDict, torch.Tensor]] = None,
+    ) -> Any:
+        return self.get(index, out=out)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        # locks cannot be pickled, each copy of the storage gets its own
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _columns(self) -> Dict[str, torch.Tensor]:
+        if isinstance(self._storage, torch.Tensor):
+            return {"tensor": self._storage}
+        return dict(self._storage.items())
+
+    def dumps(self, path: Union[str, os.PathLike]) -> None:
+        """Saves the storage in the directory :obj:`path`, in the format of
+        :obj:`LazyMemmapStorage`.
+
+        Each key is streamed to a raw file in chunks, such that saving does
+        not require additional memory. A :obj:`LazyMemmapStorage` whose
+        scratch directory is :obj:`path` re-opens the saved storage without
+        copying it.
+        """
+        if not self.initialized:
+            raise RuntimeError("Cannot save an empty storage.")
+        os.makedirs(path, exist_ok=True)
+        columns = self._columns()
+        _write_metadata(
+            path,
+            {
+                "max_size": self.max_size,
+                "is_tensor": isinstance(self._storage, torch.Tensor),
+                "batch_size": list(self._storage.shape[1:])
+                if isinstance(self._storage, torch.Tensor)
+                else list(self._storage.batch_size[1:]),
+                "keys": {
+                    key: _dump_column(path, key, value, self._len)
+                    for key, value in columns.items()
+                },
+            },
+        )
+        counters = np.memmap(
+            os.path.join(path, _COUNTERS_FILE), dtype=np.int64, mode="w+", shape=(2,)
+        )
+        counters[:] = (self._len, self._last_cursor)
+        counters.flush()
+
+    def loads(self, path: Union[str, os.PathLike]) -> None:
+        """Restores a storage saved by :obj:`dumps`. The saved files are
+        memory-mapped and copied in chunks."""
+        metadata = _read_metadata(path, self.max_size)
+        length, last_cursor = (
+            int(c) for c in np.fromfile(os.path.join(path, _COUNTERS_FILE), np.int64)
+        )
+        source = {
+            key: _map_column(path, key, value, self.max_size)
+            for key, value in metadata["keys"].items()
+        }
+        with self._lock:
+            if not self.initialized:
+                if metadata["is_tensor"]:
+                    self._init(source["tensor"][0])
+                else:
+                    self._init(
+                        TensorDict(
+                            {key: value[0] for key, value in source.items()},
+                            batch_size=metadata["batch_size"],
+                        )
+                    )
+            columns = self._columns()
+            for key, value in source.items():
+                for rows in _row_chunks(value, length):
+                    columns[key][rows] = value[rows]
+            self._len = length
+            self._last_cursor = last_cursor
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Returns the number of bytes allocated for each key. The whole
+        capacity is allocated on the first write."""
+        if not self.initialized:
+            return {}
+        return {
+            key: value.numel() * value.element_size()
+            for key, value in self._columns().items()
+        }
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(max_size={self.max_size}, "
+            f"len={len(self)}, device={self.device})"
+        )
+
+
+class LazyMemmapStorage(LazyTensorStorage):
+    """A memory-mapped storage for tensors and tensordicts.
+
+    Like :obj:`LazyTensorStorage`, one array per key is allocated on the first
+    write, but each array is backed by a file in :obj:`scratch_dir`. The
+    buffer can thus be larger than the available RAM, and writes and reads
+    go straight through the memory-mapped files.
+
+    If :obj:`scratch_dir` already contains a storage, it is re-opened
+    without copying its content, such that a buffer can be recovered after
+    a restart.
+
+    Args:
+        max_size (int): maximum number of elements that the storage can hold.
+        scratch_dir (str or path, optional): directory where the files will
+            be stored. If none is provided, a temporary directory is created
+            and deleted once the storage is out of scope.
+
+    Examples:
+        >>> storage = LazyMemmapStorage(1_000_000, scratch_dir="/tmp/buffer")
+        >>> rb = TensorDictReplayBuffer(1_000_000, storage=storage)
+        >>> rb.extend(TensorDict({"pixels": torch.zeros(10, 4, 84, 84,
+        ...     dtype=torch.uint8)}, batch_size=[10]))
+        >>> # in a new process
+        >>> storage = LazyMemmapStorage(1_000_000, scratch_dir="/tmp/buffer")
+        >>> rb = TensorDictReplayBuffer(1_000_000, storage=storage)
+        >>> len(rb)
+        10
+
+    """
+
+    _metadata_file = _METADATA_FILE
+    _counters_file = _COUNTERS_FILE
+
+    def __init__(
+        self, max_size: int, scratch_dir: Optional[Union[str, os.PathLike]] = None
+    ) -> None:
+        super().__init__(max_size, device="cpu")
+        if scratch_dir is None:
+            self._tmp_dir = tempfile.TemporaryDirectory()
+            scratch_dir = self._tmp_dir.name
+        self.scratch_dir = str(scratch_dir)
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        self._memmaps = {}
+        self._counters = None
+        if os.path.exists(os.path.join(self.scratch_dir, self._metadata_file)):
+            self._load()
+
+    def _memmap(
+        self, name: str, shape: Sequence[int], dtype: np.dtype, mode: str
+    ) -> np.memmap:
+        memmap = np.memmap(
+            os.path.join(self.scratch_dir, name), dtype=dtype, mode=mode, shape=shape
+        )
+        self._memmaps[name] = memmap
+        return memmap
+
+    def _column(
+        self, key: str, shape: Sequence[int], dtype: np.dtype, mode: str
+    ) -> torch.Tensor:
+        # the tensor shares the pages of the memmap: no copy is involved
+        return torch.from_numpy(
+            self._memmap(f"{key}.memmap", (self.max_size, *shape), dtype, mode)
+        )
+
+    def _init(self, data: Union[_TensorDict, torch.Tensor]) -> None:
+        is_tensor = isinstance(data, torch.Tensor)
+        if is_tensor:
+            items = {"tensor": data}
+            batch_size = []
+        else:
+            items = dict(data.items())
+            batch_size = list(data.batch_size)
+        keys = {
+            key: {
+                "shape": list(value.shape),
+                "dtype": torch_to_numpy_dtype_dict[value.dtype].name,
+            }
+            for key, value in items.items()
+        }
+        _write_metadata(
+            self.scratch_dir,
+            {
+                "max_size": self.max_size,
+                "is_tensor": is_tensor,
+                "batch_size": batch_size,
+                "keys": keys,
+            },
+        )
+        self._build(keys, is_tensor, batch_size, mode="w+")
+
+    def _build(
+        self, keys: dict, is_tensor: bool, batch_size: Sequence[int], mode: str
+    ) -> None:
+        columns = {
+            key: self._column(key, value["shape"], np.dtype(value["dtype"]), mode)
+            for key, value in keys.items()
+        }
+        if is_tensor:
+            self._storage = columns["tensor"]
+        else:
+            self._storage = TensorDict(
+                columns, batch_size=[self.max_size, *batch_size], device="cpu"
+            )
+        self._counters = self._memmap(self._counters_file, (2,), np.int64, mode)
+        self.initialized = True
+
+    def _load(self) -> None:
+        metadata = _read_metadata(self.scratch_dir, self.max_size)
+        self._build(
+            metadata["keys"], metadata["is_tensor"], metadata["batch_size"], mode="r+"
+        )
+        self._len, self._last_cursor = (int(c) for c in self._counters)
+
+    def set(
+        self,
+        cursor: Union[int, Sequence[int], slice, torch.Tensor],
+        data: Union[_TensorDict, torch.Tensor],
+    ) -> None:
+        super().set(cursor, data)
+        self._counters[0] = self._len
+        self._counters[1] = self._last_cursor
+
+    def flush(self) -> None:
+        """Writes the content of the storage to disk."""
+        for memmap in self._memmaps.values():
+            memmap.flush()
+
+    def _is_scratch_dir(self, path: Union[str, os.PathLike]) -> bool:
+        return os.path.realpath(path) == os.path.realpath(self.scratch_dir)
+
+    def dumps(self, path: Union[str, os.PathLike]) -> None:
+        """Saves the storage in the directory :obj:`path`. If :obj:`path` is
+        the scratch directory, the storage is only flushed."""
+        self.flush()
+        if not self._is_scratch_dir(path):
+            super().dumps(path)
+
+    def loads(self, path: Union[str, os.PathLike]) -> None:
+        if self._is_scratch_dir(path):
+            self._load()
+            return
+        super().loads(path)
+        self._counters[0] = self._len
+        self._counters[1] = self._last_cursor
+        self.flush()
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(max_size={self.max_size}, "
+            f"len={len(self)}, scratch_dir={self.scratch_dir})"
+        )
+
+
+class FrameStackStorage(LazyTensorStorage):
+    """A storage for stacked pixel observations that keeps each frame once.
+
+    When :obj:`CatFrames` is applied in the environment, every transition
+    holds `N` frames in `"pixels"` and `N` frames in `"next_pixels"`, most
+    of which are shared with the neighbouring transitions of the trajectory.
+    This storage splits the stacked observations into frames, stores each
+    distinct frame once in a ring buffer and keeps, for every transition, the
+    index of the frames it is made of. The stacks are rebuilt with a single
+    gather at sample time, such that the padding of the first steps of an
+    episode is reproduced exactly as :obj:`CatFrames` produced it.
+
+    Frames are deduplicated within each transition and against the previous
+    transition written, which is where the frames of a trajectory repeat.
+    Candidate duplicates are found with a fingerprint of each frame and
+    confirmed by an exact comparison, so the content returned is always the
+    one that was written. All other keys are stored as in
+    :obj:`LazyTensorStorage`. As frames are evicted in the order they were
+    written, the transitions must be overwritten in the same order: the
+    replay buffer must use a :obj:`RoundRobinWriter` (or a subclass of it).
+
+    Args:
+        max_size (int): maximum number of transitions that the storage can
+            hold.
+        n_frames (int, optional): number of frames stacked in each
+            observation (i.e. the `N` of :obj:`CatFrames`). Default is `4`.
+        cat_dim (int, optional): dimension along which the frames are
+            stacked. Default is `-3`.
+        keys (sequence of str, optional): keys of the stacked observations.
+            Default is `("pixels", "next_pixels")`.
+        frame_capacity (int, optional): number of frames in the ring buffer.
+            A trajectory usually contributes one new frame per step, plus one
+            per episode. Default is `max_size + max_size // 2`.
+        device (torch.device, optional): device where the storage is to be
+            allocated. Default is `"cpu"`.
+
+    Examples:
+        >>> storage = FrameStackStorage(1_000_000, n_frames=4)
+        >>> rb = TensorDictReplayBuffer(1_000_000, storage=storage)
+        >>> rb.extend(collector_batch.view(-1))
+        >>> rb.sample(32).get("pixels").shape
+        torch.Size([32, 4, 84, 84])
+
+    """
+
+    # frames are deduplicated against the previous write
+    _concurrent_writes = False
+    # the frames of the oldest transition are the first to be evicted
+    _round_robin_writes = True
+
+    def __init__(
+        self,
+        max_size: int,
+        n_frames: int = 4,
+        cat_dim: int = -3,
+        keys: Optional[Sequence[str]] = None,
+        frame_capacity: Optional[int] = None,
+        device: DEVICE_TYPING = "cpu",
+    ) -> None:
+        super().__init__(max_size, device=device)
+        self.n_frames = n_frames
+        self.cat_dim = cat_dim
+        self.keys = list(keys) if keys is not None else ["pixels", "next_pixels"]
+        if frame_capacity is None:
+            frame_capacity = max_size + max_size // 2
+        self.frame_capacity = int(frame_capacity)
+        self._frames = None
+        self._frame_ids = None
+        self._next_frame_id = 0
+        self._last_frames = None
+        self._last_frame_ids = None
+
+    def _split_frames(self, data: _TensorDict) -> torch.Tensor:
+        # [B, *stacked] -> [B, len(keys) * N, *frame]
+        frames = []
+        for key in self.keys:
+            value = data.get(key)
+            dim = self.cat_dim % (value.ndimension() - 1) + 1
+            value = value.unflatten(dim, (self.n_frames, -1)).movedim(dim, 1)
+            frames.append(value)
+        return torch.cat(frames, 1)
+
+    def _stack_frames(self, frames: torch.Tensor) -> Dict[str, torch.Tensor]:
+        # [B, len(keys) * N, *frame] -> {key: [B, *stacked]}
+        out = {}
+        for key, value in zip(self.keys, frames.split(self.n_frames, 1)):
+            dim = self.cat_dim % (value.ndimension() - 2) + 1
+            out[key] = value.movedim(1, dim).flatten(dim, dim + 1)
+        return out
+
+    def _frame_index(self, frames: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Assigns a frame id to each frame, reusing the id of an identical
+        frame of the same or of the previous transition.
+
+        Returns the ids of the frames, with the same leading dimensions as
+        :obj:`frames`, and a boolean mask of the frames that must be written.
+        New frames are numbered from :obj:`self._next_frame_id` onwards.
+        """
+        batch, n_frames = frames.shape[:2]
+        has_last = self._last_frames is not None
+        if has_last:
+            frames = torch.cat([self._last_frames.unsqueeze(0), frames], 0)
+        rows = frames.shape[0]
+        flat_frames = frames.reshape(rows * n_frames, -1)
+        # integer projection of a subset of the pixels of each frame, only
+        # used to find the candidates
+        stride = max(1, flat_frames.shape[-1] // 1024)
+        sub_frames = flat_frames[:, ::stride].long()
+        generator = torch.Generator().manual_seed(0)
+        weight = torch.randint(1 << 30, sub_frames.shape[-1:], generator=generator)
+        fingerprint = (sub_frames * weight.to(frames.device)).sum(-1)
+        fingerprint = fingerprint.view(rows, n_frames)
+
+        node = torch.arange(rows * n_frames, device=frames.device).view(rows, n_frames)
+        pointer = node.clone()
+        first = int(has_last)
+        # candidates within the transition: the first identical frame
+        same = fingerprint[first:].unsqueeze(-1) == fingerprint[first:].unsqueeze(-2)
+        same &= torch.ones(
+            n_frames, n_frames, dtype=torch.bool, device=frames.device
+        ).tril()
+        pointer[first:] = node[first:].gather(1, same.long().argmax(-1))
+        # candidates in the previous transition take precedence
+        if rows > 1:
+            prev = fingerprint[1:].unsqueeze(-1) == fingerprint[:-1].unsqueeze(-2)
+            has_prev = prev.any(-1)
+            prev_pointer = node[:-1].gather(1, prev.long().argmax(-1))
+            pointer[1:] = torch.where(has_prev, prev_pointer, pointer[1:])
+        pointer = pointer.view(-1)
+        # confirm the candidates with an exact comparison
+        matched = pointer != node.view(-1)
+        candidates = matched.nonzero().squeeze(-1)
+        equal = (flat_frames[candidates] == flat_frames[pointer[candidates]]).all(-1)
+        pointer[candidates[~equal]] = candidates[~equal]
+        if has_last:
+            pointer[:n_frames] = node[0]
+        # follow the pointers up to the first occurrence of each frame
+        while True:
+            next_pointer = pointer[pointer]
+            if (next_pointer == pointer).all():
+                break
+            pointer = next_pointer
+
+        is_new = pointer == node.view(-1)
+        ids = torch.empty_like(pointer)
+        if has_last:
+            is_new[:n_frames] = False
+            ids[:n_frames] = self._last_frame_ids
+        n_new = int(is_new.sum())
+        ids[is_new] = self._next_frame_id + torch.arange(n_new, device=ids.device)
+        ids = ids[pointer]
+        ids = ids.view(rows, n_frames)[first:]
+        is_new = is_new.view(rows, n_frames)[first:]
+        return ids, is_new
+
+    def set(
+        self,
+        cursor: Union[int, Sequence[int], slice, torch.Tensor],
+        data: _TensorDict,
+    ) -> None:
+        if isinstance(data, torch.Tensor):
+            raise TypeError(f"{self.__class__.__name__} only stores tensordicts.")
+        if isinstance(cursor, INT_CLASSES):
+            cursor = [cursor]
+            data = data.unsqueeze(0)
+        elif isinstance(data, (list, tuple)):
+            data = torch.stack(list(data), 0)
+        cursor = torch.as_tensor(cursor, dtype=torch.long, device=self.device)
+        frames = self._split_frames(data).to(self.device)
+        if self._frames is None:
+            self._frames = torch.empty(
+                self.frame_capacity,
+                *frames.shape[2:],
+                dtype=frames.dtype,
+                device=self.device,
+            )
+            self._frame_ids = torch.zeros(
+                self.max_size, frames.shape[1], dtype=torch.long, device=self.device
+            )
+        ids, is_new = self._frame_index(frames)
+        next_frame_id = self._next_frame_id + int(is_new.sum())
+
+        # the frames of the oldest transition still stored must survive
+        length = max(self._len, int(cursor.max()) + 1)
+        oldest = (int(cursor[-1]) + 1) % self.max_size if length == self.max_size else 0
+        in_batch = (cursor == oldest).nonzero()
+        if in_batch.numel():
+            oldest_id = ids[in_batch[-1, 0]].min()
+        else:
+            oldest_id = self._frame_ids[oldest].min()
+        if next_frame_id - oldest_id > self.frame_capacity:
+            raise RuntimeError(
+                f"The frame buffer of {self.__class__.__name__} is full: "
+                f"{next_frame_id - oldest_id} frames are referenced but "
+                f"the capacity is {self.frame_capacity}. Increase frame_capacity."
+            )
+
+        self._next_frame_id = next_frame_id
+        self._frames[ids[is_new] % self.frame_capacity] = frames[is_new]
+        self._frame_ids[cursor] = ids
+        self._last_frames = frames[-1].clone()
+        self._last_frame_ids = ids[-1]
+        super().set(cursor, data.exclude(*self.keys))
+
+    def get(
+        self,
+        index: Union[int, Sequence[int], slice, torch.Tensor],
+        out: Optional[_TensorDict] = None,
+    ) -> Any:
+        if not self.initialized:
+            raise RuntimeError("Cannot get an item from an empty storage.")
+        if isinstance(index, INT_CLASSES):
+            return self.get([index])[0]
+        if isinstance(index, slice):
+            index = range(*index.indices(len(self)))
+        index = torch.as_tensor(index, dtype=torch.long, device=self.device)
+        out = super().get(index, out=out)
+        ids = self._frame_ids.index_select(0, index) % self.frame_capacity
+        frames = self._frames.index_select(0, ids.view(-1))
+        frames = frames.view(*ids.shape, *frames.shape[1:])
+        for key, value in self._stack_frames(frames).items():
+            out.set(key, value, inplace=True)
+        return out
+
+    _frames_metadata_file = "frames_metadata.json"
+
+    def dumps(self, path: Union[str, os.PathLike]) -> None:
+        super().dumps(path)
+        metadata = {
+            "n_frames": self.n_frames,
+            "frame_capacity": self.frame_capacity,
+            "next_frame_id": self._next_frame_id,
+            "frames": _dump_column(
+                path,
+                "_frames",
+                self._frames,
+                min(self._next_frame_id, self.frame_capacity),
+            ),
+            "frame_ids": _dump_column(path, "_frame_ids", self._frame_ids, self._len),
+        }
+        torch.save(
+            (self._last_frames, self._last_frame_ids),
+            os.path.join(path, "last_frames.pt"),
+        )
+        with open(os.path.join(path, self._frames_metadata_file), "w") as file:
+            json.dump(metadata, file)
+
+    def loads(self, path: Union[str, os.PathLike]) -> None:
+        with open(os.path.join(path, self._frames_metadata_file), "r") as file:
+            metadata = json.load(file)
+        if (metadata["n_frames"], metadata["frame_capacity"]) != (
+            self.n_frames,
+            self.frame_capacity,
+        ):
+            raise ValueError(
+                f"The storage found in {path} has n_frames="
+                f"{metadata['n_frames']} and frame_capacity="
+                f"{metadata['frame_capacity']}, but n_frames={self.n_frames} "
+                f"and frame_capacity={self.frame_capacity} were requested."
+            )
+        super().loads(path)
+        frames = _map_column(path, "_frames", metadata["frames"], self.frame_capacity)
+        frame_ids = _map_column(
+            path, "_frame_ids", metadata["frame_ids"], self.max_size
+        )
+        if self._frames is None:
+            self._frames = torch.empty_like(frames, device=self.device)
+            self._frame_ids = torch.zeros_like(frame_ids, device=self.device)
+        n_stored = min(metadata["next_frame_id"], self.frame_capacity)
+        for rows in _row_chunks(frames, n_stored):
+            self._frames[rows] = frames[rows]
+        self._frame_ids[: self._len] = frame_ids[: self._len]
+        self._next_frame_id = metadata["next_frame_id"]
+        self._last_frames, self._last_frame_ids = torch.load(
+            os.path.join(path, "last_frames.pt"), map_location=self.device
+        )
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Returns the number of bytes allocated for each key, the frames of
+        the stacked keys being counted under `"frames"`."""
+        nbytes = super().memory_usage()
+        if self._frames is not None:
+            nbytes["frames"] = self._frames.numel() * self._frames.element_size()
+            nbytes["frame_ids"] = (
+                self._frame_ids.numel() * self._frame_ids.element_size()
+            )
+        return nbytes
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(max_size={self.max_size}, "
+            f"len={len(self)}, n_frames={self.n_frames}, "
+            f"stored_frames={min(self._next_frame_id, self.frame_capacity)}, "
+            f"device={self.device})"
+        )
+
+
+_CODECS = {
+    "zlib": (functools.partial(zlib.compress, level=1), zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+
+class CompressedStorage(LazyTensorStorage):
+    """A storage that compresses some entries of the data it holds.
+
+    Each element of the compressed keys is compressed separately when it is
+    written, and only the sampled elements are decompressed. Decompression
+    happens outside of the replay buffer lock, hence in the prefetching
+    threads when the buffer prefetches: as both codecs release the GIL, the
+    threads decompress in parallel. The other keys are stored as in
+    :obj:`LazyTensorStorage`.
+
+    Args:
+        max_size (int): maximum number of elements that the storage can hold.
+        codecs (dict, optional): mapping from the keys to be compressed to the
+            name of their codec, `"zlib"` (fast, level 1) or `"lzma"` (slower,
+            higher compression ratio). Default is `{"pixels": "zlib",
+            "next_pixels": "zlib"}`.
+        device (torch.device, optional): device where the uncompressed keys
+            are stored and where the samples are returned. Default is `"cpu"`.
+
+    Examples:
+        >>> storage = CompressedStorage(100_000, codecs={"pixels": "lzma"})
+        >>> rb = TensorDictReplayBuffer(100_000, storage=storage, prefetch=3)
+        >>> rb.extend(collector_batch.view(-1))
+        >>> storage.compression_ratio
+        7.81
+
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        codecs: Optional[Dict[str, str]] = None,
+        device: DEVICE_TYPING = "cpu",
+    ) -> None:
+        super().__init__(max_size, device=device)
+        if codecs is None:
+            codecs = {"pixels": "zlib", "next_pixels": "zlib"}
+        for key, codec in codecs.items():
+            if codec not in _CODECS:
+                raise ValueError(
+                    f"Unknown codec {codec} for key {key}, expected one of "
+                    f"{list(_CODECS)}."
+                )
+        self.codecs = dict(codecs)
+        self._blobs = {key: [None] * self.max_size for key in self.codecs}
+        self._meta = {}
+        self._compressed_nbytes = 0
+
+    def set(
+        self,
+        cursor: Union[int, Sequence[int], slice, torch.Tensor],
+        data: _TensorDict,
+    ) -> None:
+        if isinstance(data, torch.Tensor):
+            raise TypeError(f"{self.__class__.__name__} only stores tensordicts.")
+        if isinstance(cursor, INT_CLASSES):
+            cursor = [cursor]
+            data = data.unsqueeze(0)
+        elif isinstance(data, (list, tuple)):
+            data = torch.stack(list(data), 0)
+        cursor = torch.as_tensor(cursor, dtype=torch.long).tolist()
+        for key, codec in self.codecs.items():
+            value = data.get(key).cpu().contiguous().numpy()
+            self._meta[key] = (value.shape[1:], value.dtype)
+            compress = _CODECS[codec][0]
+            new_blobs = [compress(item) for item in value]
+            blobs = self._blobs[key]
+            with self._lock:
+                for idx, blob in zip(cursor, new_blobs):
+                    if blobs[idx] is not None:
+                        self._compressed_nbytes -= len(blobs[idx])
+                    self._compressed_nbytes += len(blob)
+                    blobs[idx] = blob
+        super().set(cursor, data.exclude(*self.codecs))
+
+    def _fetch(
+        self,
+        index: Union[int, Sequence[int], slice, torch.Tensor],
+        out: Optional[_TensorDict] = None,
+    ) -> Any:
+        if not self.initialized:
+            raise RuntimeError("Cannot get an item from an empty storage.")
+        if isinstance(index, INT_CLASSES):
+            out, blobs, _ = self._fetch([index])
+            return out, blobs, True
+        if isinstance(index, slice):
+            index = range(*index.indices(len(self)))
+        index = torch.as_tensor(index, dtype=torch.long)
+        out = super().get(index.to(self.device), out=out)
+        # blobs are immutable, they can be decompressed once the lock is released
+        blobs = {
+            key: [self._blobs[key][idx] for idx in index.tolist()]
+            for key in self.codecs
+        }
+        return out, blobs, False
+
+    def _decode(self, data: Any, out: Optional[_TensorDict] = None) -> Any:
+        out, blobs, squeeze = data
+        for key, key_blobs in blobs.items():
+            shape, dtype = self._meta[key]
+            decompress = _CODECS[self.codecs[key]][1]
+            buffer = bytearray().join(decompress(blob) for blob in key_blobs)
+            value = torch.from_numpy(
+                np.frombuffer(buffer, dtype=dtype).reshape(len(key_blobs), *shape)
+            )
+            out.set(key, value.to(self.device), inplace=True)
+        if squeeze:
+            return out[0]
+        return out
+
+    def get(
+        self,
+        index: Union[int, Sequence[int], slice, torch.Tensor],
+        out: Optional[_TensorDict] = None,
+    ) -> Any:
+        return self._decode(self._fetch(index, out=out))
+
+    _blobs_metadata_file = "blobs_metadata.json"
+
+    def dumps(self, path: Union[str, os.PathLike]) -> None:
+        """Saves the storage in the directory :obj:`path`. The compressed
+        elements are written as they are, one file per key."""
+        super().dumps(path)
+        for key, blobs in self._blobs.items():
+            blobs = blobs[: len(self)]
+            # empty slots are saved as empty blobs
+            sizes = np.array([len(blob) if blob is not None else 0 for blob in blobs])
+            np.save(os.path.join(path, f"{key}.sizes.npy"), sizes)
+            with open(os.path.join(path, f"{key}.blobs"), "wb") as file:
+                for blob in blobs:
+                    if blob is not None:
+                        file.write(blob)
+        with open(os.path.join(path, self._blobs_metadata_file), "w") as file:
+            json.dump(
+                {
+                    "codecs": self.codecs,
+                    "meta": {
+                        key: [list(shape), np.dtype(dtype).name]
+                        for key, (shape, dtype) in self._meta.items()
+                    },
+                },
+                file,
+            )
+
+    def loads(self, path: Union[str, os.PathLike]) -> None:
+        with open(os.path.join(path, self._blobs_metadata_file), "r") as file:
+            metadata = json.load(file)
+        if set(metadata["codecs"]) != set(self.codecs):
+            raise ValueError(
+                f"The storage found in {path} compresses the keys "
+                f"{sorted(metadata['codecs'])}, but the keys "
+                f"{sorted(self.codecs)} were requested."
+            )
+        super().loads(path)
+        # the saved blobs were compressed with the saved codecs
+        self.codecs = metadata["codecs"]
+        self._meta = {
+            key: (tuple(shape), np.dtype(dtype))
+            for key, (shape, dtype) in metadata["meta"].items()
+        }
+        compressed_nbytes = 0
+        for key in self.codecs:
+            sizes = np.load(os.path.join(path, f"{key}.sizes.npy"))
+            blobs = [None] * self.max_size
+            with open(os.path.join(path, f"{key}.blobs"), "rb") as file:
+                for idx, size in enumerate(sizes.tolist()):
+                    if size:
+                        blobs[idx] = file.read(size)
+            self._blobs[key] = blobs
+            compressed_nbytes += int(sizes.sum())
+        self._compressed_nbytes = compressed_nbytes
+
+    @property
+    def compression_ratio(self) -> float:
+        """Ratio between the size of the compressed keys when uncompressed
+        and their size in the storage."""
+        if not self._compressed_nbytes:
+            return 1.0
+        raw_nbytes = sum(
+            len(self) * np.dtype(dtype).itemsize * int(np.prod(shape))
+            for shape, dtype in self._meta.values()
+        )
+        return raw_nbytes / self._compressed_nbytes
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Returns the number of bytes allocated for each uncompressed key,
+        and the number of bytes of the compressed elements of the other
+        keys."""
+        nbytes = super().memory_usage()
+        with self._lock:
+            for key, blobs in self._blobs.items():
+                nbytes[key] = sum(len(blob) for blob in blobs if blob is not None)
+        return nbytes
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(max_size={self.max_size}, "
+            f"len={len(self)}, codecs={self.codecs}, "
+            f"compression_ratio={self.compression_ratio:.2f}, device={self.device})"
+        )
+
+
+def _add_nbytes(nbytes: Dict[str, int], key: str, value: Any) -> None:
+    if isinstance(value, torch.Tensor):
+        nbytes[key] += value.numel() * value.element_size()
+    elif isinstance(value, _TensorDict):
+        for _key, _value in value.items():
+            _add_nbytes(nbytes, _key, _value)
+
+
+def _write_metadata(path: Union[str, os.PathLike], metadata: dict) -> None:
+    with open(os.path.join(path, _METADATA_FILE), "w") as file:
+        json.dump(metadata, file)
+
+
+def _read_metadata(path: Union[str, os.PathLike], max_size: int) -> dict:
+    with open(os.path.join(path, _METADATA_FILE), "r") as file:
+        metadata = json.load(file)
+    if metadata["max_size"] != max_size:
+        raise ValueError(
+            f"The storage found in {path} has a capacity of "
+            f"{metadata['max_size']}, but a capacity of {max_size} "
+            f"was requested."
+        )
+    return metadata
+
+
+def _row_chunks(value: torch.Tensor, n_rows: int) -> Sequence[slice]:
+    row_nbytes = max(1, value[0].numel() * value.element_size())
+    step = max(1, _CHUNK_NBYTES // row_nbytes)
+    return [slice(start, min(start + step, n_rows)) for start in range(0, n_rows, step)]
+
+
+def _dump_column(
+    path: Union[str, os.PathLike], key: str, value: torch.Tensor, n_rows: int
+) -> dict:
+    """Streams the first :obj:`n_rows` rows of a tensor to a raw file and
+    returns the metadata needed to map it back."""
+    metadata = {
+        "shape": list(value.shape[1:]),
+        "dtype": torch_to_numpy_dtype_dict[value.dtype].name,
+    }
+    memmap = np.memmap(
+        os.path.join(path, f"{key}.memmap"),
+        dtype=np.dtype(metadata["dtype"]),
+        mode="w+",
+        shape=tuple(value.shape),
+    )
+    dest = torch.from_numpy(memmap)
+    for rows in _row_chunks(value, n_rows):
+        dest[rows] = value[rows]
+    memmap.flush()
+    return metadata
+
+
+def _map_column(
+    path: Union[str, os.PathLike], key: str, metadata: dict, n_rows: int
+) -> torch.Tensor:
+    # copy-on-write: the saved file is never modified
+    memmap = np.memmap(
+        os.path.join(path, f"{key}.memmap"),
+        dtype=np.dtype(metadata["dtype"]),
+        mode="c",
+        shape=(n_rows, *metadata["shape"]),
+    )
+    return torch.from_numpy(memmap)
+
+
+def _contiguous_index(index: torch.Tensor) -> Union[slice, torch.Tensor]:
+    """Turns a range-like index into a slice such that writing to it does not
+    require a scatter."""
+    if index.ndimension() == 1 and index.numel() > 1:
+        start = int(index[0])
+        stop = int(index[-1]) + 1
+        if stop - start == index.numel() and (index.diff() == 1).all():
+            return slice(start, stop)
+    return index
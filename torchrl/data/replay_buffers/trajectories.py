@@ -0,0 +1,449 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+from typing import Callable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import torch
+
+from torchrl.data.replay_buffers.replay_buffers import ReplayBuffer
+from torchrl.data.replay_buffers.storages import LazyTensorStorage
+from torchrl.data.replay_buffers.utils import to_numpy
+from torchrl.data.replay_buffers.writers import RoundRobinWriter
+from torchrl.data.tensordict.tensordict import _TensorDict, TensorDict
+
+__all__ = ["TrajectoryIndex", "HindsightRelabel"]
+
+
+class TrajectoryIndex:
+    """An index of the trajectories stored in a replay buffer.
+
+    The index maps every stored trajectory to its start slot and length in
+    the ring storage of the buffer. A trajectory is a run of consecutive
+    slots with the same `"traj_ids"` value, that ends at a `"done"` step (if
+    the storage has a `"done"` entry) and never crosses the write cursor
+    (where the newest data meets the oldest).
+
+    The index is updated incrementally by the buffer: when slots are
+    reserved, the trajectories they overlap are removed from the index (the
+    part that is not overwritten is indexed again), and when they are
+    committed, the new steps are indexed and merged with the trajectory they
+    continue and, if newer steps were committed first, with the trajectory
+    that continues them. Only the written slots and the trajectories around them are
+    read, such that the buffer is never scanned. Whole trajectories, their
+    return and future steps of the same trajectory can then be drawn in
+    constant time per element.
+
+    The buffer must hold its data in a :obj:`LazyTensorStorage` (or a
+    subclass of it) written by a :obj:`RoundRobinWriter` (or a subclass of
+    it), in time order, as is the case when extending the buffer with
+    flattened collector batches.
+
+    Args:
+        replay_buffer (ReplayBuffer): the buffer to index.
+        traj_key (str, optional): key of the trajectory ids. Default is
+            `"traj_ids"`.
+        done_key (str, optional): key of the done flags. If it is not found
+            in the storage, trajectories are only delimited by their ids.
+            Default is `"done"`.
+        reward_key (str, optional): key of the rewards, used to compute the
+            returns of the trajectories. If it is not found in the storage,
+            the returns are not available. Default is `"reward"`.
+
+    Examples:
+        >>> rb = TensorDictReplayBuffer(100_000, storage=LazyTensorStorage(100_000))
+        >>> trajectories = TrajectoryIndex(rb)
+        >>> rb.extend(collector_batch.view(-1))
+        >>> batch = trajectories.sample(16)
+        >>> batch.shape  # padded to the longest trajectory, see "mask"
+        torch.Size([16, 200])
+
+    """
+
+    def __init__(
+        self,
+        replay_buffer: ReplayBuffer,
+        traj_key: str = "traj_ids",
+        done_key: str = "done",
+        reward_key: str = "reward",
+    ) -> None:
+        if not isinstance(replay_buffer._storage, LazyTensorStorage):
+            raise TypeError(
+                f"{self.__class__.__name__} requires a LazyTensorStorage, got "
+                f"{type(replay_buffer._storage)} instead."
+            )
+        if not isinstance(replay_buffer._writer, RoundRobinWriter):
+            raise TypeError(
+                f"{self.__class__.__name__} requires a RoundRobinWriter, got "
+                f"{type(replay_buffer._writer)} instead."
+            )
+        self.replay_buffer = replay_buffer
+        self.traj_key = traj_key
+        self.done_key = done_key
+        self.reward_key = reward_key
+
+        capacity = replay_buffer.capacity
+        # copies of the stored trajectory ids, done flags and rewards
+        self._traj_ids = np.zeros(capacity, dtype=np.int64)
+        self._done = np.zeros(capacity, dtype=bool)
+        self._reward = np.zeros(capacity, dtype=np.float64)
+        # start of the trajectory of each slot, -1 for the slots that are
+        # empty or being written. The length and return of a trajectory are
+        # stored at its start.
+        self._traj_start = np.full(capacity, -1, dtype=np.int64)
+        self._traj_len = np.zeros(capacity, dtype=np.int64)
+        self._traj_return = np.zeros(capacity, dtype=np.float64)
+        # set of the trajectory starts, kept in a dense array to be sampled
+        # in constant time: _starts[:_n_traj] are the starts and
+        # _position[start] is the position of start in _starts
+        self._starts = np.zeros(capacity, dtype=np.int64)
+        self._position = np.full(capacity, -1, dtype=np.int64)
+        self._n_traj = 0
+        self._has_done = self._has_reward = None
+
+        with replay_buffer._replay_lock:
+            replay_buffer._listeners.append(self)
+            self._rebuild()
+
+    def __len__(self) -> int:
+        return self._n_traj
+
+    # index maintenance, called by the buffer with its lock held
+
+    def _on_reserve(self, index: np.ndarray) -> None:
+        slots = self._time_ordered(index)
+        if not len(slots):
+            return
+        capacity = self.replay_buffer.capacity
+        overwritten = np.unique(self._traj_start[slots])
+        overwritten = overwritten[overwritten >= 0]
+        # the oldest part of a trajectory that is partially overwritten is
+        # kept. It starts right after the reserved slots.
+        remainder = None
+        following = (slots[-1] + 1) % capacity
+        if len(slots) < capacity and np.isin(self._traj_start[following], overwritten):
+            start = self._traj_start[following]
+            offset = (following - start) % capacity
+            remainder = (following, self._traj_len[start] - offset)
+        for start in overwritten:
+            self._remove(start)
+        self._traj_start[slots] = -1
+        if remainder is not None:
+            self._index_slots(*remainder)
+
+    def _on_commit(self, index: np.ndarray) -> None:
+        slots = self._time_ordered(index)
+        if not len(slots):
+            return
+        self._read(slots)
+        capacity = self.replay_buffer.capacity
+        start, n_slots = slots[0], len(slots)
+        previous = (start - 1) % capacity
+        if n_slots < capacity and self._traj_start[previous] >= 0:
+            # the new steps may continue the trajectory of the previous slot
+            start = self._traj_start[previous]
+            n_slots += (slots[0] - start) % capacity
+            self._remove(start)
+        following = (slots[-1] + 1) % capacity
+        if (
+            n_slots < capacity
+            and following != self.replay_buffer._cursor
+            and self._traj_start[following] == following
+        ):
+            # newer steps committed first may continue the new steps. The
+            # slot at the cursor holds the oldest steps and is never linked.
+            n_slots += self._traj_len[following]
+            self._remove(following)
+        self._index_slots(start, n_slots)
+
+    def _rebuild(self) -> None:
+        replay_buffer = self.replay_buffer
+        self._traj_start[:] = -1
+        self._position[:] = -1
+        self._n_traj = 0
+        length = replay_buffer._len
+        if not length or replay_buffer._n_writing:
+            return
+        start = replay_buffer._cursor if length == replay_buffer.capacity else 0
+        slots = (start + np.arange(length)) % replay_buffer.capacity
+        self._read(slots)
+        self._index_slots(start, length)
+
+    def _time_ordered(self, index: np.ndarray) -> np.ndarray:
+        # the slots written, from the oldest to the newest. Only the last
+        # elements of a batch larger than the buffer are stored.
+        index = to_numpy(index).reshape(-1)
+        return index[index >= 0][-self.replay_buffer.capacity :]
+
+    def _read(self, slots: np.ndarray) -> None:
+        columns = self.replay_buffer._storage._storage
+        if not isinstance(columns, _TensorDict) or self.traj_key not in set(
+            columns.keys()
+        ):
+            raise KeyError(
+                f"The storage must contain a '{self.traj_key}' entry to "
+                f"delimit trajectories."
+            )
+        keys = set(columns.keys())
+        if self._has_done is None:
+            self._has_done = self.done_key in keys
+            self._has_reward = self.reward_key in keys
+        _slots = torch.as_tensor(slots, device=columns.device)
+        n_slots = len(slots)
+        traj_ids = columns.get(self.traj_key)[_slots].reshape(n_slots, -1)[:, 0]
+        self._traj_ids[slots] = to_numpy(traj_ids)
+        if self._has_done:
+            done = columns.get(self.done_key)[_slots].reshape(n_slots, -1).any(-1)
+            self._done[slots] = to_numpy(done)
+        if self._has_reward:
+            reward = columns.get(self.reward_key)[_slots].reshape(n_slots, -1)
+            self._reward[slots] = to_numpy(reward.sum(-1).double())
+
+    def _index_slots(self, start: int, n_slots: int) -> None:
+        # indexes the n_slots slots starting at start, the first one starting
+        # a trajectory
+        slots = (start + np.arange(n_slots)) % self.replay_buffer.capacity
+        traj_ids = self._traj_ids[slots]
+        first = np.ones(n_slots, dtype=bool)
+        first[1:] = traj_ids[1:] != traj_ids[:-1]
+        if self._has_done:
+            first[1:] |= self._done[slots[:-1]]
+        traj = np.cumsum(first) - 1
+        starts = slots[first]
+        self._traj_start[slots] = starts[traj]
+        self._traj_len[starts] = np.bincount(traj)
+        if self._has_reward:
+            self._traj_return[starts] = np.add.reduceat(
+                self._reward[slots], np.flatnonzero(first)
+            )
+        self._position[starts] = self._n_traj + np.arange(len(starts))
+        self._starts[self._n_traj : self._n_traj + len(starts)] = starts
+        self._n_traj += len(starts)
+
+    def _remove(self, start: int) -> None:
+        position = self._position[start]
+        if position < 0:
+            return
+        last = self._starts[self._n_traj - 1]
+        self._starts[position] = last
+        self._position[last] = position
+        self._position[start] = -1
+        self._n_traj -= 1
+
+    # queries
+
+    def trajectories(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Returns the start slot and the length of every trajectory
+        currently stored."""
+        with self.replay_buffer._replay_lock:
+            start = self._starts[: self._n_traj].copy()
+            return torch.as_tensor(start), torch.as_tensor(self._traj_len[start])
+
+    def trajectory_of(
+        self, index: Union[torch.Tensor, np.ndarray]
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Returns the start slot and the length of the trajectory of each
+        slot of :obj:`index`."""
+        index = to_numpy(index)
+        with self.replay_buffer._replay_lock:
+            start = self._checked_start(index)
+            return torch.as_tensor(start), torch.as_tensor(self._traj_len[start])
+
+    def episode_return(self, index: Union[torch.Tensor, np.ndarray]) -> torch.Tensor:
+        """Returns the sum of the rewards of the trajectory of each slot of
+        :obj:`index`."""
+        index = to_numpy(index)
+        with self.replay_buffer._replay_lock:
+            if not self._has_reward:
+                raise KeyError(
+                    f"The storage has no '{self.reward_key}' entry, the returns "
+                    f"are not available."
+                )
+            start = self._checked_start(index)
+            return torch.as_tensor(self._traj_return[start])
+
+    def future_index(self, index: Union[torch.Tensor, np.ndarray]) -> torch.Tensor:
+        """Draws, for each slot of :obj:`index`, a slot of the same trajectory
+        that is not older, uniformly. This is the "future" goal strategy of
+        hindsight experience replay."""
+        index = to_numpy(index)
+        capacity = self.replay_buffer.capacity
+        with self.replay_buffer._replay_lock:
+            start = self._checked_start(index)
+            offset = (index - start) % capacity
+            n_future = self._traj_len[start] - offset
+        step = (np.random.random_sample(index.shape) * n_future).astype(np.int64)
+        return torch.as_tensor((index + step) % capacity)
+
+    def sample_trajectories(self, batch_size: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Draws :obj:`batch_size` trajectories uniformly, and returns their
+        start slot and length."""
+        with self.replay_buffer._replay_lock:
+            if not self._n_traj:
+                raise RuntimeError("Cannot sample from an empty buffer.")
+            position = np.random.randint(0, self._n_traj, size=batch_size)
+            start = self._starts[position]
+            return torch.as_tensor(start), torch.as_tensor(self._traj_len[start])
+
+    def sample(self, batch_size: int, max_length: Optional[int] = None) -> TensorDict:
+        """Draws :obj:`batch_size` whole trajectories uniformly.
+
+        Args:
+            batch_size (int): number of trajectories to be drawn.
+            max_length (int, optional): if provided, only the first
+                `max_length` steps of the trajectories are read.
+
+        Returns:
+            a tensordict of batch size `[batch_size, T]`, `T` being the
+            length of the longest trajectory drawn, with a `"mask"` entry
+            that is False for the padding steps (as in
+            :obj:`split_trajectories`) and an `"index"` entry containing the
+            storage index of each step.
+
+        """
+        with self.replay_buffer._replay_lock:
+            start, length = self.sample_trajectories(batch_size)
+            if max_length is not None:
+                length = length.clamp_max(max_length)
+            columns = self.replay_buffer._storage._storage
+            device = columns.device
+            start = start.to(device).unsqueeze(-1)
+            step = torch.arange(int(length.max()), device=device)
+            mask = step < length.to(device).unsqueeze(-1)
+            index = (start + step) % self.replay_buffer.capacity
+            # padding steps read the first step of their trajectory
+            index = torch.where(mask, index, start)
+            out = {key: value[index] for key, value in columns.items()}
+        for key, value in out.items():
+            out[key] = value.masked_fill(
+                ~mask.view(*mask.shape, *[1] * (value.ndimension() - 2)), 0
+            )
+        out["mask"] = mask
+        out["index"] = index
+        return TensorDict(out, batch_size=mask.shape, device=device)
+
+    def _checked_start(self, index: np.ndarray) -> np.ndarray:
+        start = self._traj_start[index]
+        if (start < 0).any():
+            raise RuntimeError(
+                "Some of the slots are empty or being written and belong to "
+                "no trajectory."
+            )
+        return start
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(n_trajectories={len(self)}, "
+            f"traj_key={self.traj_key})"
+        )
+
+
+class HindsightRelabel:
+    """Relabels sampled transitions with goals achieved later in their
+    trajectory (hindsight experience replay, "future" strategy).
+
+    A fraction of the sampled transitions gets, as desired goal, the goal
+    achieved at a step of the same trajectory that is not older, drawn
+    uniformly with :obj:`TrajectoryIndex.future_index`. Their reward is then
+    computed again with :obj:`reward_fn`, called once on all the relabeled
+    transitions. The whole batch is processed with index arithmetic on
+    tensors.
+
+    The relabeling is meant to be used as the :obj:`transform` of the
+    buffer, such that it runs in the prefetching threads of the buffer. The
+    future steps are drawn and read while the buffer holds the lock of the
+    sample, such that concurrent writes cannot overwrite them first.
+
+    Args:
+        trajectory_index (TrajectoryIndex): the index of the trajectories of
+            the buffer.
+        reward_fn (callable): a function computing the rewards from batches
+            of achieved and desired goals, e.g. a sparse reward
+            `lambda a, d: -((a - d).norm(dim=-1) > 0.05).float()`.
+        relabel_ratio (float, optional): probability that a transition is
+            relabeled. Default is `0.8` (four relabeled goals per original
+            goal).
+        achieved_goal_key (str, optional): key of the goal achieved by a
+            transition. Default is `"next_achieved_goal"`.
+        goal_keys (sequence of str, optional): keys of the desired goal that
+            are replaced. The keys that are not found are ignored. Default is
+            `("desired_goal", "next_desired_goal")`.
+        reward_key (str, optional): key of the reward. Default is `"reward"`.
+
+    Examples:
+        >>> rb = TensorDictReplayBuffer(100_000, storage=LazyTensorStorage(100_000),
+        ...     prefetch=3)
+        >>> rb.transform = HindsightRelabel(TrajectoryIndex(rb), reward_fn)
+        >>> batch = rb.sample(256)  # 80% of the goals are relabeled
+
+    """
+
+    def __init__(
+        self,
+        trajectory_index: TrajectoryIndex,
+        reward_fn: Callable[[torch.Tensor, torch.Tensor], torch.Tensor],
+        relabel_ratio: float = 0.8,
+        achieved_goal_key: str = "next_achieved_goal",
+        goal_keys: Sequence[str] = ("desired_goal", "next_desired_goal"),
+        reward_key: str = "reward",
+    ) -> None:
+        if not 0 <= relabel_ratio <= 1:
+            raise ValueError(f"relabel_ratio must be in [0, 1], got {relabel_ratio}.")
+        self.trajectory_index = trajectory_index
+        self.reward_fn = reward_fn
+        self.relabel_ratio = relabel_ratio
+        self.achieved_goal_key = achieved_goal_key
+        self.goal_keys = goal_keys
+        self.reward_key = reward_key
+
+    def _fetch(
+        self, index: Union[torch.Tensor, np.ndarray]
+    ) -> Tuple[np.ndarray, Optional[torch.Tensor]]:
+        """Draws the transitions to be relabeled and reads their new goal.
+
+        The replay buffer calls this method while holding its lock, such that
+        the sampled slots cannot be overwritten before their future step is
+        drawn.
+        """
+        index = to_numpy(index).reshape(-1)
+        relabel = np.random.random_sample(len(index)) < self.relabel_ratio
+        if not relabel.any():
+            return relabel, None
+        replay_buffer = self.trajectory_index.replay_buffer
+        columns = replay_buffer._storage._storage
+        with replay_buffer._replay_lock:
+            future = self.trajectory_index.future_index(index[relabel])
+            goal = columns.get(self.achieved_goal_key)[future.to(columns.device)]
+        return relabel, goal
+
+    def __call__(
+        self,
+        tensordict: _TensorDict,
+        index: Union[torch.Tensor, np.ndarray],
+        fetched: Optional[Tuple[np.ndarray, Optional[torch.Tensor]]] = None,
+    ) -> _TensorDict:
+        if fetched is None:
+            # called outside of a replay buffer: the slots of index must not
+            # have been overwritten since the tensordict was read
+            fetched = self._fetch(index)
+        relabel, goal = fetched
+        if goal is None:
+            return tensordict
+        relabel = torch.as_tensor(relabel, device=tensordict.device)
+        goal = goal.to(tensordict.device)
+        for key in self.goal_keys:
+            if key in tensordict.keys():
+                tensordict.get(key)[relabel] = goal
+        achieved_goal = tensordict.get(self.achieved_goal_key)[relabel]
+        reward = tensordict.get(self.reward_key)
+        new_reward = self.reward_fn(achieved_goal, goal)
+        reward[relabel] = new_reward.to(reward.dtype).view(-1, *reward.shape[1:])
+        return tensordict
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(relabel_ratio={self.relabel_ratio}, "
+            f"achieved_goal_key={self.achieved_goal_key})"
+        )
@@ -0,0 +1,298 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import abc
+import os
+from typing import Optional, Union
+
+import numpy as np
+
+__all__ = [
+    "Writer",
+    "RoundRobinWriter",
+    "ReservoirWriter",
+    "PriorityWriter",
+    "MaxAgeWriter",
+]
+
+
+class Writer:
+    """A Writer decides in which slots of the storage of a replay buffer the
+    new data is written, and hence which data is evicted.
+
+    The replay buffer calls :obj:`_select` with its lock held, once per call
+    to `add` or `extend`, with the number of elements to be written. The
+    writer returns the slot of each element, or `-1` for the elements that
+    must not be stored. Writers can also hide stored elements from the
+    samplers (e.g. when they expire).
+
+    """
+
+    def __init__(self) -> None:
+        self._replay_buffer = None
+
+    def register(self, replay_buffer) -> None:
+        """Attaches the writer to a replay buffer. A writer can only be used
+        by one buffer."""
+        if self._replay_buffer is not None:
+            raise RuntimeError(
+                f"This {self.__class__.__name__} is already used by another "
+                f"replay buffer."
+            )
+        self._replay_buffer = replay_buffer
+
+    @property
+    def capacity(self) -> int:
+        return self._replay_buffer.capacity
+
+    @abc.abstractmethod
+    def _select(self, batch_size: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def _expired(self, index: np.ndarray) -> Optional[np.ndarray]:
+        """Returns a mask of the slots of :obj:`index` that must not be
+        sampled, or None if there is none."""
+        return None
+
+    def _sample_index(self, batch_size: int) -> Optional[np.ndarray]:
+        """Draws :obj:`batch_size` slots uniformly among the slots that have
+        not expired, or returns None to let the replay buffer draw them among
+        all its slots."""
+        return None
+
+    @property
+    def _n_expired(self) -> int:
+        return 0
+
+    def _dumps_state(self, path: Union[str, os.PathLike]) -> dict:
+        return {}
+
+    def _loads_state(self, path: Union[str, os.PathLike], state: dict) -> None:
+        pass
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}()"
+
+
+class RoundRobinWriter(Writer):
+    """Writes the data in a circular fashion, overwriting the oldest
+    elements first (first in, first out). This is the default writer of the
+    replay buffers. Only the last elements of a batch larger than the
+    buffer are stored."""
+
+    def _select(self, batch_size: int) -> np.ndarray:
+        # the storage is filled starting at the cursor, which equals the
+        # storage length until it is full
+        replay_buffer = self._replay_buffer
+        index = np.arange(replay_buffer._cursor, replay_buffer._cursor + batch_size)
+        index %= self.capacity
+        replay_buffer._cursor = (replay_buffer._cursor + batch_size) % self.capacity
+        if batch_size > self.capacity:
+            return _keep_last(index)
+        return index
+
+
+class ReservoirWriter(Writer):
+    """Keeps a uniform sample of all the elements ever written.
+
+    Once the storage is full, the `t`-th element of the stream (counting
+    from 0) replaces a random slot with probability `capacity / (t + 1)`
+    and is discarded otherwise (Algorithm R), such that every element seen
+    so far is stored with the same probability. Old data is thus kept for
+    the whole run while the buffer stays small. The slots of a batch are
+    drawn at once.
+
+    Examples:
+        >>> rb = TensorDictReplayBuffer(10_000, storage=LazyTensorStorage(10_000),
+        ...     writer=ReservoirWriter())
+
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._n_seen = 0
+
+    def _select(self, batch_size: int) -> np.ndarray:
+        step = np.arange(self._n_seen, self._n_seen + batch_size)
+        self._n_seen += batch_size
+        slot = (np.random.random_sample(batch_size) * (step + 1)).astype(np.int64)
+        index = np.where(step < self.capacity, step, slot)
+        index[index >= self.capacity] = -1
+        return _keep_last(index)
+
+    def _dumps_state(self, path: Union[str, os.PathLike]) -> dict:
+        return {"n_seen": self._n_seen}
+
+    def _loads_state(self, path: Union[str, os.PathLike], state: dict) -> None:
+        self._n_seen = state["n_seen"]
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(n_seen={self._n_seen})"
+
+
+class PriorityWriter(Writer):
+    """Evicts the elements of lowest priority first.
+
+    The storage is filled in order until it is full; then each new element
+    replaces one of the elements of lowest priority. These are found by
+    walking down the min tree of the buffer once per evicted element, after
+    the staged priority updates have been applied. The slots being written
+    are never evicted: if every other slot is taken, the first elements of
+    the batch are discarded. Requires a :obj:`PrioritizedReplayBuffer`.
+
+    Examples:
+        >>> rb = TensorDictPrioritizedReplayBuffer(10_000, alpha=0.7, beta=0.5,
+        ...     storage=LazyTensorStorage(10_000), writer=PriorityWriter())
+
+    """
+
+    def register(self, replay_buffer) -> None:
+        if not hasattr(replay_buffer, "_min_tree"):
+            raise TypeError(
+                f"{self.__class__.__name__} requires a prioritized replay buffer, "
+                f"got {type(replay_buffer)} instead."
+            )
+        super().register(replay_buffer)
+
+    def _select(self, batch_size: int) -> np.ndarray:
+        replay_buffer = self._replay_buffer
+        # only the last elements of a batch larger than the buffer are kept
+        index = np.full(batch_size, -1, dtype=np.int64)
+        n_kept = min(batch_size, self.capacity)
+        n_empty = min(n_kept, self.capacity - replay_buffer._len)
+        empty = np.arange(replay_buffer._len, replay_buffer._len + n_empty)
+        n_evicted = n_kept - n_empty
+        if not n_evicted:
+            index[batch_size - n_kept :] = empty
+            return index
+        replay_buffer._apply_staged_updates()
+        min_tree = replay_buffer._min_tree
+        identity = min_tree.identity_element
+        evicted = []
+        while len(evicted) < n_evicted:
+            slot = min_tree.argmin()
+            if min_tree[slot] == identity:
+                # the remaining slots are hidden, i.e. being written
+                break
+            if replay_buffer._writing[slot]:
+                replay_buffer._hide(np.array([slot]))
+                continue
+            # the reserved slots are hidden by the buffer, this one is hidden
+            # now such that the next call finds another slot
+            min_tree[slot] = identity
+            evicted.append(slot)
+        if len(evicted) < n_evicted:
+            # the hidden slots that are not being written (e.g. whose write
+            # failed) can be reused, the elements left without a slot are
+            # discarded
+            free = replay_buffer._writing == 0
+            free[evicted] = False
+            evicted.extend(np.flatnonzero(free)[: n_evicted - len(evicted)])
+        slots = np.concatenate([empty, np.array(evicted, dtype=np.int64)])
+        index[batch_size - len(slots) :] = slots
+        return index
+
+
+class MaxAgeWriter(RoundRobinWriter):
+    """Writes the data in a circular fashion and hides the elements written
+    more than :obj:`max_age` writes ago from the samplers.
+
+    The write step of each slot is stored. At every write (call to `add` or
+    `extend`), the elements of step `step - max_age` expire: they are not
+    sampled anymore and will be overwritten first. This bounds how stale the
+    sampled data can be, whatever the size of the collected batches. The
+    elements that have not expired being the last ones written, the uniform
+    samplers draw them directly.
+
+    Args:
+        max_age (int): number of writes after which an element expires.
+
+    Examples:
+        >>> # sample from the data of the last 8 collector batches at most
+        >>> rb = TensorDictReplayBuffer(100_000, storage=LazyTensorStorage(100_000),
+        ...     writer=MaxAgeWriter(8))
+
+    """
+
+    def __init__(self, max_age: int) -> None:
+        super().__init__()
+        if max_age < 1:
+            raise ValueError(f"max_age must be strictly positive, got {max_age}.")
+        self.max_age = max_age
+        self._step = 0
+        self._steps = None
+        self._is_expired = None
+        self._n_expired_slots = 0
+
+    def register(self, replay_buffer) -> None:
+        super().register(replay_buffer)
+        # write step of each slot, -1 for slots that have never been written.
+        # The data already stored is older than any write
+        self._steps = np.full(replay_buffer.capacity, -1, dtype=np.int64)
+        self._steps[: replay_buffer._len] = 0
+        self._is_expired = np.zeros(replay_buffer.capacity, dtype=bool)
+
+    def _select(self, batch_size: int) -> np.ndarray:
+        index = super()._select(batch_size)
+        self._step += 1
+        slots = np.unique(index[index >= 0])
+        self._n_expired_slots -= int(np.count_nonzero(self._is_expired[slots]))
+        self._is_expired[slots] = False
+        self._steps[slots] = self._step
+        if self._step < self.max_age:
+            # no write is old enough to expire yet
+            return index
+        expired = np.flatnonzero(
+            (self._steps == self._step - self.max_age) & ~self._is_expired
+        )
+        if len(expired):
+            self._is_expired[expired] = True
+            self._n_expired_slots += len(expired)
+            self._replay_buffer._hide(expired)
+        return index
+
+    def _expired(self, index: np.ndarray) -> Optional[np.ndarray]:
+        if not self._n_expired_slots:
+            return None
+        return self._is_expired[index]
+
+    @property
+    def _n_expired(self) -> int:
+        return self._n_expired_slots
+
+    def _sample_index(self, batch_size: int) -> Optional[np.ndarray]:
+        if not self._n_expired_slots:
+            return None
+        # the slots are written in a circular fashion: the ones that have not
+        # expired are the last len - n_expired slots before the cursor
+        replay_buffer = self._replay_buffer
+        n_valid = replay_buffer._len - self._n_expired_slots
+        offset = np.random.randint(0, n_valid, size=batch_size)
+        return (replay_buffer._cursor - n_valid + offset) % self.capacity
+
+    def _dumps_state(self, path: Union[str, os.PathLike]) -> dict:
+        np.save(os.path.join(path, "writer_steps.npy"), self._steps)
+        return {"step": self._step}
+
+    def _loads_state(self, path: Union[str, os.PathLike], state: dict) -> None:
+        self._step = state["step"]
+        self._steps[:] = np.load(os.path.join(path, "writer_steps.npy"))
+        self._is_expired[:] = (self._steps >= 0) & (
+            self._steps <= self._step - self.max_age
+        )
+        self._n_expired_slots = int(self._is_expired.sum())
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(max_age={self.max_age})"
+
+
+def _keep_last(index: np.ndarray) -> np.ndarray:
+    """Discards (sets to -1) the elements of :obj:`index` whose slot is
+    written again later in the same batch, such that the last one wins as
+    if the elements had been written one at a time."""
+    _, last = np.unique(index[::-1], return_index=True)
+    keep = np.zeros(len(index), dtype=bool)
+    keep[len(index) - 1 - last] = True
+    return np.where(keep, index, -1)
@@ -10,6 +10,7 @@ import functools
 import math
 import tempfile
 import textwrap
+import threading
 import uuid
 from collections.abc import Mapping
 from copy import copy, deepcopy
@@ -45,10 +46,13 @@ from torchrl.data.utils import DEVICE_TYPING, expand_as_right, INDEX_TYPING
 
 __all__ = [
     "TensorDict",
+    "FlatTensorDict",
     "SubTensorDict",
     "merge_tensordicts",
     "LazyStackedTensorDict",
     "SavedTensorDict",
+    "tensordict_fast_mode",
+    "is_tensordict_fast_mode",
 ]
 
 TD_HANDLED_FUNCTIONS: Dict = dict()
@@ -58,6 +62,73 @@ COMPATIBLE_TYPES = Union[
 ]  # None? # leaves space for _TensorDict
 _accepted_classes = (torch.Tensor, MemmapTensor)
 
+# the fast mode is set per thread, such that a thread in fast mode (e.g. a
+# collector) does not skip the checks of the others
+_FAST_MODE = threading.local()
+
+_has_foreach_copy = hasattr(torch, "_foreach_copy_")
+_has_foreach_clone = hasattr(torch, "_foreach_clone")
+_has_foreach_zero = hasattr(torch, "_foreach_zero_")
+
+
+class tensordict_fast_mode:
+    """
+    Skips the validation of the values written in the tensordicts and of the
+    outputs of the environments.
+
+    In fast mode, the batch size and type of the tensors written with `set`,
+    `set_` and `update` are not checked anymore, and `_EnvClass.step` does not
+    check the dtypes of the actions, observations, rewards and done states.
+    The tensors are trusted to have the batch size of the tensordict they are
+    written in. They are still moved to the device of the tensordict, such
+    that the content of a tensordict is the same in both modes. This is
+    intended for hot loops whose first iterations have been run with the
+    validations, such as the rollouts of the data collectors after a few
+    frames.
+
+    The mode is local to the calling thread. Like :obj:`torch.no_grad`, it
+    can be used as a context manager or as a decorator.
+
+    Args:
+        mode (bool, optional): whether the validations should be skipped.
+            Default is `True`.
+
+    Examples:
+        >>> env.rollout(policy=policy, max_steps=10)  # checked warm-up
+        >>> with tensordict_fast_mode():
+        ...     env.rollout(policy=policy, max_steps=1000)
+        >>> @tensordict_fast_mode()
+        ... def fast_rollout(env, policy):
+        ...     return env.rollout(policy=policy, max_steps=1000)
+    """
+
+    def __init__(self, mode: bool = True):
+        self.mode = mode
+        self._prev = []
+
+    def __call__(self, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def decorate_fast_mode(*args, **kwargs):
+            # a new context per call: the decorated function can run in
+            # several threads at once
+            with tensordict_fast_mode(self.mode):
+                return func(*args, **kwargs)
+
+        return decorate_fast_mode
+
+    def __enter__(self) -> None:
+        self._prev.append(is_tensordict_fast_mode())
+        _FAST_MODE.value = self.mode
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        _FAST_MODE.value = self._prev.pop()
+
+
+def is_tensordict_fast_mode() -> bool:
+    """Returns True if the validations are skipped in the calling thread (see
+    :obj:`tensordict_fast_mode`)."""
+    return getattr(_FAST_MODE, "value", False)
+
 
 class _TensorDict(Mapping, metaclass=abc.ABCMeta):
     """
@@ -354,7 +425,9 @@ class _TensorDict(Mapping, metaclass=abc.ABCMeta):
             # no op
             return self
         for key, value in input_dict_or_td.items():
-            if not isinstance(value, _accepted_classes):
+            if not is_tensordict_fast_mode() and not isinstance(
+                value, _accepted_classes
+            ):
                 raise TypeError(
                     f"Expected value to be one of types "
                     f"{_accepted_classes} but got {type(value)}"
@@ -475,6 +548,11 @@ dtype=torch.float32)},
         else:
             tensor = input
 
+        if is_tensordict_fast_mode():
+            # the tensor is trusted to match the batch size, but it is still
+            # moved to the device of the tensordict
+            check_tensor_shape = False
+
         if check_device and self._device_safe() is not None:
             device = self.device
             tensor = tensor.to(device)
@@ -1603,8 +1681,16 @@ class TensorDict(_TensorDict):
             )
         return all(memmap_list) and len(memmap_list) > 0
 
+    def _check_batch_size(self) -> None:
+        # the shapes are read from the tensors, such that no metadata is built
+        batch_size = self.batch_size
+        batch_dims = len(batch_size)
+        for value in self._tensordict.values():
+            if value.shape[:batch_dims] != batch_size:
+                return super()._check_batch_size()
+
     def _check_device(self) -> None:
-        devices = [value.device for value in self.values_meta()]
+        devices = [value.device for value in self._tensordict.values()]
         device0 = None
         for _device in devices:
             if device0 is None:
@@ -1642,7 +1728,7 @@ class TensorDict(_TensorDict):
         """
         if self.is_locked:
             raise RuntimeError("Cannot modify immutable TensorDict")
-        if not isinstance(key, str):
+        if not is_tensordict_fast_mode() and not isinstance(key, str):
             raise TypeError(f"Expected key to be a string but found {type(key)}")
 
         if key in self._tensordict and value is self._tensordict[key]:
@@ -1657,15 +1743,8 @@ class TensorDict(_TensorDict):
             check_device=_run_checks,
         )  # check_tensor_shape=_run_checks
         self._tensordict[key] = proc_value
-        self._tensordict_meta[key] = (
-            MetaTensor(
-                proc_value,
-                _is_memmap=self.is_memmap(),
-                _is_shared=self.is_shared(),
-            )
-            if _meta_val is None
-            else _meta_val
-        )
+        # the metadata is built on the first call to _get_meta
+        self._tensordict_meta[key] = _meta_val
         return self
 
     def del_(self, key: str) -> _TensorDict:
@@ -1698,14 +1777,16 @@ class TensorDict(_TensorDict):
             if not isinstance(key, str):
                 raise TypeError(f"Expected key to be a string but found {type(key)}")
 
-        if no_check or key in self.keys():
+        if no_check or key in self._tensordict:
             if not no_check:
                 proc_value = self._process_tensor(
                     value, check_device=False, check_shared=False
                 )
                 # copy_ will broadcast one tensor onto another's shape, which we don't want
-                target_shape = self._get_meta(key).shape
-                if proc_value.shape != target_shape:
+                target_shape = (
+                    None if is_tensordict_fast_mode() else self._get_meta(key).shape
+                )
+                if target_shape is not None and proc_value.shape != target_shape:
                     raise RuntimeError(
                         f'calling set_("{key}", tensor) with tensors of '
                         f"different shape: got tensor.shape={proc_value.shape} "
@@ -1749,11 +1830,7 @@ class TensorDict(_TensorDict):
         else:
             tensor_in[idx] = value
         # Recreate Meta in case of require_grad coming in value
-        self._tensordict_meta[key] = MetaTensor(
-            tensor_in,
-            _is_memmap=self.is_memmap(),
-            _is_shared=self.is_shared(),
-        )
+        self._tensordict_meta[key] = None
         return self
 
     def get(
@@ -1772,12 +1849,20 @@ class TensorDict(_TensorDict):
             raise TypeError(f"Expected key to be a string but found {type(key)}")
 
         try:
-            return self._tensordict_meta[key]
+            meta = self._tensordict_meta[key]
         except KeyError:
             raise KeyError(
                 f"key {key} not found in {self.__class__.__name__} with keys"
                 f" {sorted(list(self.keys()))}"
             )
+        if meta is None:
+            # unknown storage features are read from the tensor itself
+            meta = self._tensordict_meta[key] = MetaTensor(
+                self._tensordict[key],
+                _is_memmap=self._is_memmap,
+                _is_shared=self._is_shared,
+            )
+        return meta
 
     def share_memory_(self) -> _TensorDict:
         if self.is_memmap():
@@ -1814,7 +1899,7 @@ class TensorDict(_TensorDict):
                 "memmap_() must be called when the TensorDict is (partially) "
                 "populated. Set a tensor first."
             )
-        if any(val.requires_grad for val in self._tensordict_meta.values()):
+        if any(val.requires_grad for val in self.values_meta()):
             raise Exception(
                 "memmap is not compatible with gradients, one of Tensors has requires_grad equals True"
             )
@@ -1871,6 +1956,80 @@ class TensorDict(_TensorDict):
         td_copy = self.clone()
         return td_copy.masked_fill_(mask, value)
 
+    def apply_(self, fn: Callable) -> _TensorDict:
+        # the results are written back with one copy per device and pair of
+        # dtypes (see update_)
+        results = dict()
+        for key, item in self.items():
+            item_trsf = fn(item)
+            if item_trsf is None:
+                continue
+            if isinstance(item_trsf, _accepted_classes):
+                results[key] = item_trsf
+            else:
+                self.set(key, item_trsf, inplace=True)
+        if results:
+            self.update_(results)
+        return self
+
+    def zero_(self) -> _TensorDict:
+        if not _has_foreach_zero:
+            return super().zero_()
+        if self.is_locked:
+            raise RuntimeError("Cannot modify immutable TensorDict")
+        # the tensors are zeroed with one call per device and dtype
+        groups = dict()
+        for tensor in self._tensordict.values():
+            if isinstance(tensor, MemmapTensor):
+                return super().zero_()
+            groups.setdefault((tensor.device, tensor.dtype), []).append(tensor)
+        for group in groups.values():
+            torch._foreach_zero_(group)
+        return self
+
+    def update_(
+        self,
+        input_dict_or_td: Union[Dict[str, COMPATIBLE_TYPES], _TensorDict],
+        clone: bool = False,
+    ) -> _TensorDict:
+        if input_dict_or_td is self or not _has_foreach_copy:
+            return super().update_(input_dict_or_td, clone=clone)
+        if self.is_locked:
+            raise RuntimeError("Cannot modify immutable TensorDict")
+        # tensors that can be copied as they are are copied with one call per
+        # device and pair of dtypes, the others go through set_
+        groups = dict()
+        for key, value in input_dict_or_td.items():
+            if not isinstance(value, _accepted_classes):
+                raise TypeError(
+                    f"Expected value to be one of types {_accepted_classes} "
+                    f"but got {type(value)}"
+                )
+            if clone:
+                value = value.clone()
+            dest = self._tensordict.get(key, None)
+            if value is dest:
+                continue
+            if (
+                isinstance(value, torch.Tensor)
+                and isinstance(dest, torch.Tensor)
+                and value.shape == dest.shape
+                and not (value.requires_grad or dest.requires_grad)
+            ):
+                device = dest.device
+                if value.device == device:
+                    group_key = (device, dest.dtype, value.dtype)
+                    group = groups.get(group_key)
+                    if group is None:
+                        group = groups[group_key] = ([], [])
+                    group[0].append(dest)
+                    group[1].append(value)
+                    continue
+            self.set_(key, value)
+        for group_dests, group_sources in groups.values():
+            torch._foreach_copy_(group_dests, group_sources)
+        return self
+
     def is_contiguous(self) -> bool:
         return all([value.is_contiguous() for _, value in self.items()])
 
@@ -1879,14 +2038,52 @@ class TensorDict(_TensorDict):
             return self.clone()
         return self
 
+    def clone(self, recursive: bool = True) -> _TensorDict:
+        # the metadata built so far is carried over, except for the shared
+        # and memory-mapped tensors whose copies are regular tensors
+        d_meta = {
+            key: None
+            if recursive and meta is not None and (meta.is_shared() or meta.is_memmap())
+            else meta
+            for key, meta in self._tensordict_meta.items()
+        }
+        return TensorDict(
+            source=self._clone_values() if recursive else dict(self.items()),
+            batch_size=self.batch_size,
+            device=self._device_safe(),
+            _meta_source=d_meta,
+        )
+
+    def _clone_values(self) -> Dict[str, COMPATIBLE_TYPES]:
+        # the tensors are cloned with one call per device and dtype
+        if not _has_foreach_clone:
+            return {key: value.clone() for key, value in self.items()}
+        out = dict()
+        groups = dict()
+        for key, value in self.items():
+            if isinstance(value, MemmapTensor):
+                out[key] = value.clone()
+                continue
+            # placeholder keeping the order of the keys
+            out[key] = None
+            group = groups.get((value.device, value.dtype))
+            if group is None:
+                group = groups[(value.device, value.dtype)] = ([], [])
+            group[0].append(key)
+            group[1].append(value)
+        for keys, values in groups.values():
+            out.update(zip(keys, torch._foreach_clone(values)))
+        return out
+
     def select(self, *keys: str, inplace: bool = False) -> _TensorDict:
         d = {key: value for (key, value) in self.items() if key in keys}
-        d_meta = {key: value for (key, value) in self.items_meta() if key in keys}
+        # the metadata is carried over as is, whether it is built or not
+        d_meta = {
+            key: value for (key, value) in self._tensordict_meta.items() if key in keys
+        }
         if inplace:
             self._tensordict = d
-            self._tensordict_meta = {
-                key: value for (key, value) in self.items_meta() if key in keys
-            }
+            self._tensordict_meta = d_meta
             return self
         return TensorDict(
             device=self._device_safe(),
@@ -1899,6 +2096,336 @@ class TensorDict(_TensorDict):
         return self._tensordict_meta.keys()  # _tensordict_meta is ordered
 
 
+class FlatTensorDict(TensorDict):
+    """A TensorDict whose tensors are views on a single contiguous buffer.
+
+    The tensors of the source are copied in one byte buffer, each at an
+    offset aligned on 64 bytes. The operations on the whole tensordict are
+    then executed once on the buffer rather than once per key: `clone()`,
+    `to(device)`, `zero_()`, `share_memory_()`, `pin_memory()` and
+    `update_` from a FlatTensorDict with the same layout. This is intended
+    for tensordicts with a fixed set of keys that are copied repeatedly,
+    such as the shared tensordict of a `ParallelEnv` or the output of a data
+    collector.
+
+    The tensors stay in the buffer as long as they are written in place
+    (with `set_`, `update_` or `set(key, value, inplace=True)`). Tensors that
+    are set out-of-place, that require gradients or that are memory-mapped
+    are kept aside as in a regular TensorDict, and can be moved in a new
+    buffer with `pack_()`. Selecting keys returns a FlatTensorDict sharing
+    the buffer.
+
+    Args:
+        source (TensorDict or dictionary): a data source.
+        batch_size (iterable of int, optional): a batch size for the
+            tensordict.
+        device (torch.device or compatible type, optional): a device for the
+            TensorDict.
+
+    Examples:
+        >>> source = {"obs": torch.zeros(3, 4), "done": torch.zeros(3, 1, dtype=torch.bool)}
+        >>> td = FlatTensorDict(source, batch_size=[3])
+        >>> td.share_memory_()  # shares a single storage
+        >>> td_clone = td.clone()  # a single copy
+        >>> td.update_(td_clone)  # a single copy
+
+    """
+
+    def __init__(
+        self,
+        source: Union[_TensorDict, dict],
+        batch_size: Optional[Union[Sequence[int], torch.Size, int]] = None,
+        device: Optional[DEVICE_TYPING] = None,
+        _meta_source: Optional[dict] = None,
+    ) -> object:
+        self._buffer = None
+        # the layout of the buffer maps the keys to their offset and number
+        # of bytes, and to the dtype, shape, strides and storage offset of
+        # their view on the buffer. It is never modified in place, such that it
+        # can be shared by the copies of the tensordict.
+        self._layout = {}
+        self._buffer_layout = None
+        super().__init__(
+            source, batch_size=batch_size, device=device, _meta_source=_meta_source
+        )
+        self.pack_()
+
+    def pack_(self) -> FlatTensorDict:
+        """Copies the tensors of the tensordict in a new buffer, unless they
+        all are in the current one already.
+
+        The tensors that require gradients and the memory-mapped tensors are
+        not packed.
+
+        Returns:
+            self
+
+        """
+        tensors = {
+            key: value
+            for key, value in self._tensordict.items()
+            if isinstance(value, torch.Tensor) and not value.requires_grad
+        }
+        if tensors.keys() == self._layout.keys():
+            return self
+        layout, nbytes = _flat_layout(tensors)
+        buffer = torch.empty(nbytes, dtype=torch.uint8, device=self._device_safe())
+        if self._buffer is not None and self._buffer.is_pinned():
+            buffer = buffer.pin_memory()
+        if self._is_shared:
+            buffer.share_memory_()
+        for key, view in _flat_views(buffer, layout).items():
+            view.copy_(tensors[key])
+            self._tensordict[key] = view
+            self._tensordict_meta[key] = None
+        self._buffer = buffer
+        self._layout = self._buffer_layout = layout
+        return self
+
+    def _is_full(self) -> bool:
+        # True if every byte of the buffer belongs to the tensors of self,
+        # such that the whole buffer can be written
+        return self._buffer is not None and self._layout is self._buffer_layout
+
+    def _loose_items(self) -> Iterator[Tuple[str, COMPATIBLE_TYPES]]:
+        for key, value in self._tensordict.items():
+            if key not in self._layout:
+                yield key, value
+
+    def _new(
+        self,
+        buffer: torch.Tensor,
+        layout: Dict,
+        buffer_layout: Dict,
+        loose: Dict[str, COMPATIBLE_TYPES],
+        device: Optional[torch.device],
+        meta_source: Optional[Dict] = None,
+        is_shared: Optional[bool] = None,
+    ) -> FlatTensorDict:
+        # the tensors are views on the buffer or come from self: they are not
+        # checked again
+        views = _flat_views(buffer, layout)
+        out = FlatTensorDict.__new__(FlatTensorDict)
+        out._tensordict = {
+            key: views[key] if key in views else loose[key]
+            for key in self.keys()
+            if key in views or key in loose
+        }
+        if meta_source is None:
+            out._tensordict_meta = dict.fromkeys(out._tensordict)
+        else:
+            out._tensordict_meta = meta_source
+        out._is_shared = is_shared
+        out._is_memmap = None
+        out._batch_size = self.batch_size
+        out._device = device
+        out._buffer = buffer
+        out._layout = layout
+        out._buffer_layout = buffer_layout
+        return out
+
+    def _copy_buffer(
+        self, device: Optional[torch.device] = None
+    ) -> Tuple[torch.Tensor, Dict, Dict]:
+        used = sum(entry[1] for entry in self._layout.values())
+        if 2 * used >= self._buffer.numel():
+            if device is None:
+                buffer = self._buffer.clone()
+            else:
+                buffer = self._buffer.to(device)
+            return buffer, self._layout, self._buffer_layout
+        # most of the buffer is made of tensors that are not part of the
+        # tensordict anymore: it is repacked
+        layout, nbytes = _flat_layout(
+            {key: self._tensordict[key] for key in self._layout}
+        )
+        buffer = torch.empty(
+            nbytes,
+            dtype=torch.uint8,
+            device=self._buffer.device if device is None else device,
+        )
+        for key, view in _flat_views(buffer, layout).items():
+            view.copy_(self._tensordict[key])
+        return buffer, layout, layout
+
+    def set(
+        self, key: str, value: COMPATIBLE_TYPES, inplace: bool = False, **kwargs
+    ) -> _TensorDict:
+        if not inplace and key in self._layout and value is not self._tensordict[key]:
+            super().set(key, value, **kwargs)
+            # the tensor is not a view on the buffer anymore
+            self._layout = {k: v for k, v in self._layout.items() if k != key}
+            return self
+        return super().set(key, value, inplace=inplace, **kwargs)
+
+    def del_(self, key: str) -> _TensorDict:
+        super().del_(key)
+        if key in self._layout:
+            self._layout = {k: v for k, v in self._layout.items() if k != key}
+        return self
+
+    def select(self, *keys: str, inplace: bool = False) -> _TensorDict:
+        layout = {key: value for key, value in self._layout.items() if key in keys}
+        if inplace:
+            super().select(*keys, inplace=True)
+            if len(layout) != len(self._layout):
+                self._layout = layout
+            return self
+        if not layout:
+            return super().select(*keys)
+        return self._new(
+            self._buffer,
+            layout,
+            self._buffer_layout,
+            {key: value for key, value in self._loose_items() if key in keys},
+            self._device_safe(),
+            meta_source={
+                key: value
+                for key, value in self._tensordict_meta.items()
+                if key in keys
+            },
+        )
+
+    def clone(self, recursive: bool = True) -> _TensorDict:
+        if not recursive or self._buffer is None:
+            return super().clone(recursive=recursive)
+        buffer, layout, buffer_layout = self._copy_buffer()
+        return self._new(
+            buffer,
+            layout,
+            buffer_layout,
+            {key: value.clone() for key, value in self._loose_items()},
+            self._device_safe(),
+        )
+
+    def to(self, dest: Union[DEVICE_TYPING, torch.Size, Type], **kwargs) -> _TensorDict:
+        if isinstance(dest, (torch.device, str, int)) and self._buffer is not None:
+            dest = torch.device(dest)
+            if dest == self.device:
+                return self
+            buffer, layout, buffer_layout = self._copy_buffer(dest)
+            return self._new(
+                buffer,
+                layout,
+                buffer_layout,
+                {key: value.to(dest) for key, value in self._loose_items()},
+                dest,
+            )
+        return super().to(dest, **kwargs)
+
+    def zero_(self) -> _TensorDict:
+        if not self._is_full():
+            return super().zero_()
+        self._buffer.zero_()
+        for key, _ in self._loose_items():
+            self.fill_(key, 0)
+        return self
+
+    def update_(
+        self,
+        input_dict_or_td: Union[Dict[str, COMPATIBLE_TYPES], _TensorDict],
+        clone: bool = False,
+    ) -> _TensorDict:
+        if (
+            isinstance(input_dict_or_td, FlatTensorDict)
+            and input_dict_or_td is not self
+            and self._is_full()
+            and input_dict_or_td._is_full()
+            and input_dict_or_td._layout == self._layout
+        ):
+            if self.is_locked:
+                raise RuntimeError("Cannot modify immutable TensorDict")
+            self._buffer.copy_(input_dict_or_td._buffer)
+            input_dict_or_td = dict(input_dict_or_td._loose_items())
+        return super().update_(input_dict_or_td, clone=clone)
+
+    def share_memory_(self) -> _TensorDict:
+        if self._buffer is not None and not self.is_memmap():
+            self._buffer.share_memory_()
+        return super().share_memory_()
+
+    def pin_memory(self) -> _TensorDict:
+        if self.device != torch.device("cpu"):
+            return self
+        if self._buffer is not None:
+            self._buffer = self._buffer.pin_memory()
+            for key, view in _flat_views(self._buffer, self._layout).items():
+                self._tensordict[key] = view
+                self._tensordict_meta[key] = None
+        for key, value in list(self._loose_items()):
+            if value.dtype in (torch.half, torch.float, torch.double):
+                super().set(key, value.pin_memory(), inplace=False)
+        return self
+
+    def __getstate__(self) -> Dict:
+        # views with different dtypes on the same storage cannot be
+        # serialized: they are rebuilt from the buffer
+        state = self.__dict__.copy()
+        state["_tensordict"] = dict(self._loose_items())
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        loose = state.pop("_tensordict")
+        self.__dict__.update(state)
+        views = {} if self._buffer is None else _flat_views(self._buffer, self._layout)
+        self._tensordict = {
+            key: views[key] if key in views else loose[key]
+            for key in self._tensordict_meta
+        }
+
+    def memmap_(self) -> _TensorDict:
+        super().memmap_()
+        # the tensors are now memory-mapped copies
+        self._buffer = self._buffer_layout = None
+        self._layout = {}
+        return self
+
+
+_FLAT_ALIGNMENT = 64
+
+
+def _flat_layout(tensors: Dict[str, torch.Tensor]) -> Tuple[Dict, int]:
+    layout = {}
+    offset = 0
+    for key, value in tensors.items():
+        itemsize = value.element_size()
+        nbytes = value.numel() * itemsize
+        layout[key] = (
+            offset,
+            nbytes,
+            value.dtype,
+            value.shape,
+            _contiguous_strides(value.shape),
+            offset // itemsize,
+        )
+        offset += -(-nbytes // _FLAT_ALIGNMENT) * _FLAT_ALIGNMENT
+    return layout, offset
+
+
+def _flat_views(buffer: torch.Tensor, layout: Dict) -> Dict[str, torch.Tensor]:
+    views = {}
+    typed_buffers = {}
+    for key, (_, _, dtype, shape, strides, storage_offset) in layout.items():
+        # the offsets are aligned, such that the buffer can be viewed with the
+        # dtype of any of its tensors
+        typed_buffer = typed_buffers.get(dtype)
+        if typed_buffer is None:
+            typed_buffer = typed_buffers[dtype] = buffer.view(dtype)
+        views[key] = typed_buffer.as_strided(
+            shape, strides, typed_buffer.storage_offset() + storage_offset
+        )
+    return views
+
+
+def _contiguous_strides(shape: torch.Size) -> Tuple[int, ...]:
+    strides = []
+    stride = 1
+    for size in reversed(shape):
+        strides.append(stride)
+        stride *= max(size, 1)
+    return tuple(reversed(strides))
+
+
 def implements_for_td(torch_function: Callable) -> Callable:
     """Register a torch function override for ScalarTensor"""
 
@@ -2518,6 +3045,15 @@ class LazyStackedTensorDict(_TensorDict):
         torch.Size([3, 10, 4])
         >>> print(td_stack[:, 0] is tds[0])
         True
+
+    Every call to :obj:`get` stacks the tensors of the tensordicts. When the
+    same keys are read several times, the stacked tensors can be cached with
+    :obj:`enable_cache`, or the stack can be turned once into a contiguous
+    :obj:`TensorDict` with :obj:`consolidate`.
+
+        >>> td_stack.enable_cache()
+        >>> print(td_stack.get("a") is td_stack.get("a"))
+        True
     """
 
     _safe = False
@@ -2532,6 +3068,9 @@ class LazyStackedTensorDict(_TensorDict):
 
         self._is_shared = None
         self._is_memmap = None
+        self._cache = None
+        self._linked = set()
+        self._consolidated = None
 
         # sanity check
         N = len(tensordicts)
@@ -2568,7 +3107,7 @@ class LazyStackedTensorDict(_TensorDict):
                     f"cannot be created. Got td[0].batch_size={_batch_size} "
                     f"and td[i].batch_size={_bs} "
                 )
-        self.tensordicts: List[_TensorDict] = list(tensordicts)
+        self.tensordicts = tensordicts
         self.stack_dim = stack_dim
         self._batch_size = self._compute_batch_size(_batch_size, stack_dim, N)
         self._update_valid_keys()
@@ -2577,8 +3116,103 @@ class LazyStackedTensorDict(_TensorDict):
         if batch_size is not None and batch_size != self.batch_size:
             raise RuntimeError("batch_size does not match self.batch_size.")
 
+    @property
+    def tensordicts(self) -> List[_TensorDict]:
+        if self._tensordicts is None:
+            # the tensordicts of a consolidated stack are only built on demand
+            self._tensordicts = list(self._consolidated.unbind(self.stack_dim))
+            self._consolidated = None
+        return self._tensordicts
+
+    @tensordicts.setter
+    def tensordicts(self, tensordicts: Sequence[_TensorDict]) -> None:
+        self._tensordicts = list(tensordicts)
+        self._consolidated = None
+        self._clear_cache()
+
+    def enable_cache(self) -> _TensorDict:
+        """Caches the stacked tensors returned by :obj:`get`.
+
+        A cached key is stacked again after it has been written with
+        :obj:`set`, :obj:`set_`, :obj:`set_at_` (or any method relying on
+        these). Writes made directly on the stacked tensordicts are not
+        tracked, and will not be seen by the cached values.
+
+        """
+        if self._cache is None:
+            self._cache = dict()
+        return self
+
+    def disable_cache(self) -> _TensorDict:
+        """Empties the cache and stops caching the stacked tensors.
+
+        The tensors of a consolidated stack (see :obj:`consolidate`) are
+        kept, as they are shared with the stacked tensordicts.
+
+        """
+        if self._cache is not None:
+            self._cache = {key: self._cache[key] for key in self._linked}
+            if not self._cache:
+                self._cache = None
+        return self
+
+    def consolidate(self) -> TensorDict:
+        """Stacks all the keys once in a contiguous TensorDict and rewires the
+        stack on it.
+
+        The tensordicts of the stack are replaced by views on the returned
+        TensorDict, such that the following reads do not stack the tensors
+        anymore, and in-place writes on either side are seen by the other.
+        The original tensordicts do not belong to the stack anymore.
+
+        Returns:
+            a TensorDict sharing its tensors with the stack.
+
+        Examples:
+            >>> tds = [TensorDict({'a': torch.zeros(3)}, [3]) for _ in range(10)]
+            >>> td_stack = torch.stack(tds, 0)
+            >>> td = td_stack.consolidate()
+            >>> td_stack.set_("a", torch.ones(10, 3))
+            >>> print(td.get("a").sum())
+            tensor(30.)
+
+        """
+        tensors = {key: self.get(key) for key in self.keys()}
+        device = self._device_safe()
+        out = TensorDict(source=tensors, batch_size=self.batch_size, device=device)
+        self._tensordicts = None
+        self._consolidated = TensorDict(
+            source=tensors, batch_size=self.batch_size, device=device
+        )
+        self._cache = dict(self._consolidated.items())
+        self._linked = set(self._cache.keys())
+        self._meta_dict = dict()
+        return out
+
+    def _clear_cache(self, *keys: str) -> None:
+        # drops the cached tensors of the keys (all of them if none is passed)
+        if self._cache is None:
+            return
+        if not keys:
+            keys = list(self._cache.keys())
+        for key in keys:
+            self._cache.pop(key, None)
+            self._linked.discard(key)
+
+    def _invalidate(self, key: Optional[str] = None) -> None:
+        # drops the cached tensors that are not views on the stacked tensors
+        # after an in-place write
+        if self._cache is None:
+            return
+        keys = list(self._cache.keys()) if key is None else [key]
+        for key in keys:
+            if key not in self._linked:
+                self._cache.pop(key, None)
+
     @property
     def device(self) -> torch.device:
+        if self._consolidated is not None:
+            return self._consolidated.device
         # devices might have changed so we check that they're all the same
         device_set = {td.device for td in self.tensordicts}
         if len(device_set) != 1:
@@ -2593,6 +3227,8 @@ class LazyStackedTensorDict(_TensorDict):
             t.device = value
 
     def _device_safe(self) -> Union[None, torch.device]:
+        if self._consolidated is not None:
+            return self._consolidated._device_safe()
         return self.tensordicts[0]._device_safe()
 
     @property
@@ -2604,6 +3240,8 @@ class LazyStackedTensorDict(_TensorDict):
         return self._batch_size_setter(new_size)
 
     def is_shared(self, no_check: bool = True) -> bool:
+        if self._consolidated is not None:
+            return self._consolidated.is_shared(no_check=no_check)
         are_shared = [td.is_shared(no_check=no_check) for td in self.tensordicts]
         if any(are_shared) and not all(are_shared):
             raise RuntimeError(
@@ -2614,6 +3252,8 @@ class LazyStackedTensorDict(_TensorDict):
         return all(are_shared)
 
     def is_memmap(self, no_check: bool = True) -> bool:
+        if self._consolidated is not None:
+            return self._consolidated.is_memmap()
         are_memmap = [td.is_memmap() for td in self.tensordicts]
         if any(are_memmap) and not all(are_memmap):
             raise RuntimeError(
@@ -2659,6 +3299,7 @@ class LazyStackedTensorDict(_TensorDict):
         proc_tensor = proc_tensor.unbind(self.stack_dim)
         for td, _item in zip(self.tensordicts, proc_tensor):
             td.set(key, _item, **kwargs)
+        self._clear_cache(key)
         self._meta_dict.update({key: self._deduce_meta(key)})
         return self
 
@@ -2689,6 +3330,7 @@ class LazyStackedTensorDict(_TensorDict):
         tensor = tensor.unbind(self.stack_dim)
         for td, _item in zip(self.tensordicts, tensor):
             td.set_(key, _item)
+        self._invalidate(key)
         return self
 
     def set_at_(
@@ -2698,6 +3340,7 @@ class LazyStackedTensorDict(_TensorDict):
             raise RuntimeError("Cannot modify immutable TensorDict")
         sub_td = self[idx]
         sub_td.set_(key, value)
+        self._invalidate(key)
         return self
 
     def get(
@@ -2705,6 +3348,8 @@ class LazyStackedTensorDict(_TensorDict):
         key: str,
         default: Union[str, COMPATIBLE_TYPES] = "_no_default_",
     ) -> COMPATIBLE_TYPES:
+        if self._cache is not None and key in self._cache:
+            return self._cache[key]
         if not (key in self.valid_keys):
             return self._default_get(key, default)
         tensors = [td.get(key, default=default) for td in self.tensordicts]
@@ -2716,14 +3361,23 @@ class LazyStackedTensorDict(_TensorDict):
                 f"of one of the stacked TensorDicts, where a key has been "
                 f"updated/created with an uncompatible shape."
             )
-        return torch.stack(tensors, self.stack_dim)
+        out = torch.stack(tensors, self.stack_dim)
+        if self._cache is not None:
+            self._cache[key] = out
+        return out
 
     def _get_meta(self, key: str) -> MetaTensor:
         if key in self._meta_dict:
             return self._meta_dict[key]
         if key not in self.valid_keys:
             raise KeyError(f"key {key} not found in {self._valid_keys}")
-        return self._deduce_meta(key)
+        if self._consolidated is not None:
+            meta = self._consolidated._get_meta(key)
+        else:
+            meta = self._deduce_meta(key)
+        if self._cache is not None:
+            self._meta_dict[key] = meta
+        return meta
 
     def _deduce_meta(self, key: str) -> MetaTensor:
         return torch.stack(
@@ -2754,6 +3408,7 @@ class LazyStackedTensorDict(_TensorDict):
     def pin_memory(self) -> _TensorDict:
         for td in self.tensordicts:
             td.pin_memory()
+        self._clear_cache()
         return self
 
     def to(self, dest: Union[DEVICE_TYPING, Type], **kwargs) -> _TensorDict:
@@ -2799,6 +3454,9 @@ class LazyStackedTensorDict(_TensorDict):
             yield key
 
     def _update_valid_keys(self) -> None:
+        if self._consolidated is not None:
+            self._valid_keys = list(self._consolidated.keys())
+            return
         valid_keys = set(self.tensordicts[0].keys())
         for td in self.tensordicts[1:]:
             valid_keys = valid_keys.intersection(td.keys())
@@ -2812,6 +3470,10 @@ class LazyStackedTensorDict(_TensorDict):
         #     )
         tensordicts = [td.select(*keys, inplace=inplace) for td in self.tensordicts]
         if inplace:
+            if self._cache is not None:
+                for key in list(self._cache.keys()):
+                    if key not in keys:
+                        self._clear_cache(key)
             return self
         return LazyStackedTensorDict(
             *tensordicts,
@@ -2886,9 +3548,11 @@ class LazyStackedTensorDict(_TensorDict):
                 f"{item.__class__.__name__} is not supported yet"
             )
 
-    def del_(self, *args, **kwargs) -> _TensorDict:
+    def del_(self, key: str) -> _TensorDict:
         for td in self.tensordicts:
-            td.del_(*args, **kwargs)
+            td.del_(key)
+        self._clear_cache(key)
+        self._meta_dict.pop(key, None)
         return self
 
     def share_memory_(self) -> _TensorDict:
@@ -2905,6 +3569,7 @@ class LazyStackedTensorDict(_TensorDict):
     def memmap_(self) -> _TensorDict:
         for td in self.tensordicts:
             td.memmap_()
+        self._clear_cache()
         self._is_memmap = True
         return self
 
@@ -2957,6 +3622,9 @@ class LazyStackedTensorDict(_TensorDict):
     def rename_key(self, old_key: str, new_key: str, safe: bool = False) -> _TensorDict:
         for td in self.tensordicts:
             td.rename_key(old_key, new_key, safe=safe)
+        self._clear_cache(old_key, new_key)
+        self._meta_dict.pop(old_key, None)
+        self._meta_dict.pop(new_key, None)
         return self
 
     def masked_fill_(
@@ -2965,6 +3633,7 @@ class LazyStackedTensorDict(_TensorDict):
         mask_unbind = mask.unbind(dim=self.stack_dim)
         for _mask, td in zip(mask_unbind, self.tensordicts):
             td.masked_fill_(_mask, value)
+        self._invalidate()
         return self
 
     def masked_fill(self, mask: torch.Tensor, value: Union[float, bool]) -> _TensorDict:
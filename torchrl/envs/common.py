@@ -16,7 +16,7 @@ import torch
 
 from torchrl import seed_generator
 from torchrl.data import CompositeSpec, TensorDict, TensorSpec
-from ..data.tensordict.tensordict import _TensorDict
+from ..data.tensordict.tensordict import _TensorDict, is_tensordict_fast_mode
 from ..data.utils import DEVICE_TYPING
 from .utils import get_available_libraries, step_tensordict
 
@@ -188,6 +188,7 @@ class _EnvClass:
         Step accepts a single argument, tensordict, which usually carries an 'action' key which indicates the action
         to be taken.
         Step will call an out-place private method, _step, which is the method to be re-written by _EnvClass subclasses.
+        The dtypes of the action and of the outputs are not checked in `tensordict_fast_mode`.
 
         Args:
             tensordict (_TensorDict): Tensordict containing the action to be taken.
@@ -198,8 +199,9 @@ class _EnvClass:
 
         """
 
-        # sanity check
-        if tensordict.get("action").dtype is not self.action_spec.dtype:
+        # sanity checks, skipped in fast mode
+        checks = not is_tensordict_fast_mode()
+        if checks and tensordict.get("action").dtype is not self.action_spec.dtype:
             raise TypeError(
                 f"expected action.dtype to be {self.action_spec.dtype} "
                 f"but got {tensordict.get('action').dtype}"
@@ -218,20 +220,21 @@ class _EnvClass:
         self.is_done = tensordict_out.get("done")
         self.current_tensordict = step_tensordict(tensordict_out, exclude_done=False)
 
-        for key in self._select_observation_keys(tensordict_out):
-            obs = tensordict_out.get(key)
-            self.observation_spec.type_check(obs, key)
+        if checks:
+            for key in self._select_observation_keys(tensordict_out):
+                obs = tensordict_out.get(key)
+                self.observation_spec.type_check(obs, key)
 
-        if tensordict_out._get_meta("reward").dtype is not self.reward_spec.dtype:
-            raise TypeError(
-                f"expected reward.dtype to be {self.reward_spec.dtype} "
-                f"but got {tensordict_out.get('reward').dtype}"
-            )
+            if tensordict_out._get_meta("reward").dtype is not self.reward_spec.dtype:
+                raise TypeError(
+                    f"expected reward.dtype to be {self.reward_spec.dtype} "
+                    f"but got {tensordict_out.get('reward').dtype}"
+                )
 
-        if tensordict_out._get_meta("done").dtype is not torch.bool:
-            raise TypeError(
-                f"expected done.dtype to be torch.bool but got {tensordict_out.get('done').dtype}"
-            )
+            if tensordict_out._get_meta("done").dtype is not torch.bool:
+                raise TypeError(
+                    f"expected done.dtype to be torch.bool but got {tensordict_out.get('done').dtype}"
+                )
         tensordict.update(tensordict_out, inplace=True)
 
         del tensordict_out
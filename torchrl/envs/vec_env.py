@@ -18,7 +18,11 @@ from torch import multiprocessing as mp
 
 from torchrl import _check_for_faulty_process
 from torchrl.data import TensorDict, TensorSpec
-from torchrl.data.tensordict.tensordict import _TensorDict
+from torchrl.data.tensordict.tensordict import (
+    _TensorDict,
+    FlatTensorDict,
+    tensordict_fast_mode,
+)
 from torchrl.data.utils import CloudpickleWrapper, DEVICE_TYPING
 from torchrl.envs.common import _EnvClass, make_tensordict
 from torchrl.envs.env_creator import EnvCreator
@@ -127,6 +131,11 @@ class _BatchedEnv(_EnvClass):
             It is assumed that all environments will run on the same device as a common shared
             tensordict will be used to pass data from process to process. The device can be
             changed after instantiation using `env.to(device)`.
+        fast_mode_warmup (int, optional): if provided, number of steps executed by each worker process of a
+            `ParallelEnv` with the validation of the tensordicts and of the environment outputs. Further steps are
+            executed in `tensordict_fast_mode`, which skips these checks. If None (or negative), the checks are kept
+            for all the steps. A `SerialEnv` runs its environments in the mode of the calling process.
+            default = None
 
 
     """
@@ -155,6 +164,7 @@ class _BatchedEnv(_EnvClass):
         memmap: bool = False,
         policy_proof: Optional[Callable] = None,
         device: Optional[DEVICE_TYPING] = None,
+        fast_mode_warmup: Optional[int] = None,
     ):
         if device is not None:
             raise ValueError(
@@ -203,6 +213,7 @@ class _BatchedEnv(_EnvClass):
         self.share_individual_td = share_individual_td
         self._share_memory = shared_memory
         self._memmap = memmap
+        self.fast_mode_warmup = fast_mode_warmup
         if self._share_memory and self._memmap:
             raise RuntimeError(
                 "memmap and shared memory are mutually exclusive features."
@@ -368,6 +379,12 @@ class _BatchedEnv(_EnvClass):
                     td.memmap_()
             self.shared_tensordict_parent = torch.stack(self.shared_tensordicts, 0)
         else:
+            if not self._memmap:
+                # a single buffer is shared with the workers and copied at
+                # each step
+                self.shared_tensordict_parent = FlatTensorDict(
+                    self.shared_tensordict_parent
+                )
             if self._share_memory:
                 self.shared_tensordict_parent.share_memory_()
                 if not self.shared_tensordict_parent.is_shared():
@@ -620,6 +637,7 @@ class ParallelEnv(_BatchedEnv):
                     False,
                     self.action_keys,
                     self.device,
+                    self.fast_mode_warmup,
                 ),
             )
             w.daemon = True
@@ -815,6 +833,7 @@ def _run_worker_pipe_shared_mem(
     pin_memory: bool,
     action_keys: dict,
     device: DEVICE_TYPING = "cpu",
+    fast_mode_warmup: Optional[int] = None,
     verbose: bool = False,
 ) -> None:
     parent_pipe.close()
@@ -888,17 +907,21 @@ def _run_worker_pipe_shared_mem(
         elif cmd == "step":
             if not initialized:
                 raise RuntimeError("called 'init' before step")
+            # same boundary as the collectors: the first fast_mode_warmup
+            # steps are checked
+            fast_mode = fast_mode_warmup is not None and 0 <= fast_mode_warmup <= i
             i += 1
             _td = tensordict.select(*action_keys).to(env.device).clone()
             if env.is_done:
                 raise RuntimeError(
                     f"calling step when env is done, just reset = {just_reset}"
                 )
-            _td = env.step(_td)
-            keys = set(_td.keys()) - {key for key in action_keys}
-            if pin_memory:
-                _td.pin_memory()
-            tensordict.update_(_td.select(*keys))
+            with tensordict_fast_mode(fast_mode):
+                _td = env.step(_td)
+                keys = set(_td.keys()) - {key for key in action_keys}
+                if pin_memory:
+                    _td.pin_memory()
+                tensordict.update_(_td.select(*keys))
             if _td.get("done"):
                 msg = "done"
             else:
@@ -12,7 +12,7 @@ from torchrl.collectors.collectors import (
     MultiaSyncDataCollector,
     MultiSyncDataCollector,
 )
-from torchrl.data import MultiStep
+from torchrl.data import MultiStep, StreamingMultiStep
 from torchrl.data.tensordict.tensordict import _TensorDict
 from torchrl.envs import ParallelEnv
 
@@ -259,7 +259,20 @@ def make_collector_offpolicy(
     else:
         collector_helper = sync_sync_collector
 
-    if args.multi_step:
+    streaming_multi_step = args.multi_step and getattr(
+        args, "streaming_multi_step", False
+    )
+    if streaming_multi_step:
+        if args.async_collection:
+            raise ValueError(
+                "streaming_multi_step requires a synchronous collector, set "
+                "async_collection to False."
+            )
+        ms = StreamingMultiStep(
+            gamma=args.gamma,
+            n_steps_max=args.n_steps_return,
+        )
+    elif args.multi_step:
         ms = MultiStep(
             gamma=args.gamma,
             n_steps_max=args.n_steps_return,
@@ -292,7 +305,7 @@ def make_collector_offpolicy(
         "passing_devices": args.collector_devices,
         "init_random_frames": args.init_random_frames,
         "pin_memory": args.pin_memory,
-        "split_trajs": ms is not None,
+        "split_trajs": ms is not None and not streaming_multi_step,
         # trajectories must be separated if multi-step is used
         "init_with_lag": args.init_with_lag,
         "exploration_mode": args.exploration_mode,
@@ -462,6 +475,15 @@ def parser_collector_args_offpolicy(parser: ArgumentParser) -> ArgumentParser:
         help="If multi_step is set to True, this value defines the number of steps to look ahead for the "
         "reward computation.",
     )
+    parser.add_argument(
+        "--streaming_multi_step",
+        "--streaming-multi-step",
+        dest="streaming_multi_step",
+        action="store_true",
+        help="If multi_step is set to True, computes the multi-step rewards on the unsplit collector batches, "
+        "keeping the last steps of each batch until the next one such that no step is truncated. "
+        "Requires a synchronous collector.",
+    )
     parser.add_argument(
         "--init_random_frames",
         "--init-random-frames",
@@ -8,7 +8,11 @@ from argparse import ArgumentParser, Namespace
 import torch
 
 from torchrl.data import (
+    CompressedStorage,
     DEVICE_TYPING,
+    FrameStackStorage,
+    LazyMemmapStorage,
+    OfflineDataset,
     ReplayBuffer,
     TensorDictPrioritizedReplayBuffer,
     TensorDictReplayBuffer,
@@ -20,22 +24,44 @@ __all__ = ["make_replay_buffer", "parser_replay_args"]
 def make_replay_buffer(device: DEVICE_TYPING, args: Namespace) -> ReplayBuffer:
     """Builds a replay buffer using the arguments build from the parser returned by parser_replay_args."""
     device = torch.device(device)
+    storage = None
+    if args.buffer_scratch_dir is not None:
+        storage = LazyMemmapStorage(
+            args.buffer_size, scratch_dir=args.buffer_scratch_dir
+        )
+    elif getattr(args, "dedup_frames", False):
+        if not getattr(args, "catframes", 0):
+            raise ValueError("dedup_frames requires catframes to be set.")
+        storage = FrameStackStorage(args.buffer_size, n_frames=args.catframes)
+    elif getattr(args, "buffer_codec", None) is not None:
+        storage = CompressedStorage(
+            args.buffer_size,
+            codecs={"pixels": args.buffer_codec, "next_pixels": args.buffer_codec},
+        )
+    prefetch = 3
+    # contiguous storages gather the samples in preallocated (pinned) outputs
+    num_output_buffers = prefetch + 1 if storage is not None else None
     if not args.prb:
         buffer = TensorDictReplayBuffer(
             args.buffer_size,
-            # collate_fn=InPlaceSampler(device),
             pin_memory=device != torch.device("cpu"),
-            prefetch=3,
+            prefetch=prefetch,
+            storage=storage,
+            num_output_buffers=num_output_buffers,
         )
     else:
         buffer = TensorDictPrioritizedReplayBuffer(
             args.buffer_size,
             alpha=0.7,
             beta=0.5,
-            # collate_fn=InPlaceSampler(device),
             pin_memory=device != torch.device("cpu"),
-            prefetch=3,
+            prefetch=prefetch,
+            storage=storage,
+            num_output_buffers=num_output_buffers,
+            deferred_updates=getattr(args, "deferred_priority_updates", None),
         )
+    if getattr(args, "offline_dataset", None) is not None:
+        OfflineDataset(args.offline_dataset).load(buffer)
     return buffer
 
 
@@ -60,4 +86,53 @@ def parser_replay_args(parser: ArgumentParser) -> ArgumentParser:
         action="store_true",
         help="whether a Prioritized replay buffer should be used instead of a more basic circular one.",
     )
+    parser.add_argument(
+        "--deferred_priority_updates",
+        "--deferred-priority-updates",
+        type=int,
+        default=None,
+        help="if set, the priority updates of the prioritized replay buffer are staged and written "
+        "in batches of at most this many priorities, before the next sample is drawn. "
+        "Default=None (the priorities are written at every update)",
+    )
+    parser.add_argument(
+        "--buffer_stats",
+        "--buffer-stats",
+        action="store_true",
+        help="whether the memory usage of the replay buffer and the latency of its calls "
+        "should be logged.",
+    )
+    parser.add_argument(
+        "--buffer_scratch_dir",
+        "--buffer-scratch-dir",
+        type=str,
+        default=None,
+        help="directory where the buffer is to be stored as memory-mapped arrays. "
+        "If the directory contains a buffer already, it is re-opened. "
+        "Default=None (the buffer is kept in memory)",
+    )
+    parser.add_argument(
+        "--dedup_frames",
+        "--dedup-frames",
+        action="store_true",
+        help="whether the frames stacked by CatFrames should be stored once in the buffer "
+        "and re-stacked at sample time.",
+    )
+    parser.add_argument(
+        "--buffer_codec",
+        "--buffer-codec",
+        type=str,
+        default=None,
+        choices=["zlib", "lzma"],
+        help="codec used to compress the pixels stored in the buffer. "
+        "Default=None (pixels are not compressed)",
+    )
+    parser.add_argument(
+        "--offline_dataset",
+        "--offline-dataset",
+        type=str,
+        default=None,
+        help="path of an offline dataset (.npz or .pt shards, or a memory-mapped directory) "
+        "loaded in the buffer before training. Default=None",
+    )
     return parser
@@ -25,6 +25,7 @@ from torchrl.trainers.trainers import (
     RewardNormalizer,
     mask_batch,
     BatchSubSampler,
+    EpochSubSampler,
     UpdateWeights,
     Recorder,
     CountFramesLog,
@@ -179,12 +180,19 @@ def make_trainer(
         trainer.register_op("batch_process", rb_trainer.extend)
         trainer.register_op("process_optim_batch", rb_trainer.sample)
         trainer.register_op("post_loss", rb_trainer.update_priority)
+        if getattr(args, "buffer_stats", False):
+            replay_buffer.enable_stats()
+            trainer.register_op("post_steps_log", rb_trainer.log_stats)
     else:
         trainer.register_op("batch_process", mask_batch)
-        trainer.register_op(
-            "process_optim_batch",
-            BatchSubSampler(batch_size=args.batch_size, sub_traj_len=args.sub_traj_len),
-        )
+        if getattr(args, "epoch_sampler", False):
+            sub_sampler = EpochSubSampler(batch_size=args.batch_size)
+            trainer.register_op("pre_optim_steps", sub_sampler.reset)
+        else:
+            sub_sampler = BatchSubSampler(
+                batch_size=args.batch_size, sub_traj_len=args.sub_traj_len
+            )
+        trainer.register_op("process_optim_batch", sub_sampler)
 
     if optim_scheduler is not None:
         trainer.register_op("post_optim", optim_scheduler.step)
@@ -344,4 +352,11 @@ def parser_trainer_args(parser: ArgumentParser) -> ArgumentParser:
         default=-1,
         help="length of the trajectories that sub-samples must have in online settings.",
     )
+    parser.add_argument(
+        "--epoch_sampler",
+        "--epoch-sampler",
+        action="store_true",
+        help="whether the sub-batches should be drawn without replacement, going through "
+        "the whole collected batch once per epoch (as in PPO), in online settings.",
+    )
     return parser
@@ -49,6 +49,7 @@ WRITER_METHODS = {
 __all__ = [
     "Trainer",
     "BatchSubSampler",
+    "EpochSubSampler",
     "CountFramesLog",
     "LogReward",
     "Recorder",
@@ -521,6 +522,9 @@ class ReplayBufferTrainer:
         >>> trainer.register_op("batch_process", rb_trainer.extend)
         >>> trainer.register_op("process_optim_batch", rb_trainer.sample)
         >>> trainer.register_op("post_loss", rb_trainer.update_priority)
+        >>> # memory usage and latency of the replay buffer
+        >>> rb_trainer.replay_buffer.enable_stats()
+        >>> trainer.register_op("post_steps_log", rb_trainer.log_stats)
 
     """
 
@@ -544,6 +548,14 @@ class ReplayBufferTrainer:
         if isinstance(self.replay_buffer, TensorDictPrioritizedReplayBuffer):
             self.replay_buffer.update_priority(batch)
 
+    def log_stats(self, batch: _TensorDict) -> Dict:
+        out = {
+            f"replay_buffer/{key}": value
+            for key, value in self.replay_buffer.stats().items()
+        }
+        out["log_pbar"] = False
+        return out
+
 
 class LogReward:
     """Reward logger hook.
@@ -777,6 +789,99 @@ class BatchSubSampler:
         return td
 
 
+class EpochSubSampler:
+    """Data subsampler that goes through a whole batch once per epoch.
+
+    Unlike :obj:`BatchSubSampler`, which draws each sub-batch independently,
+    this class shuffles the batch with a single permutation at the beginning
+    of each epoch and then returns disjoint, consecutive sub-batches, such
+    that every element is seen exactly once per epoch (as in PPO). The
+    shuffled batch is gathered in a buffer that is allocated once and reused
+    across epochs and batches of the same shape, keys, dtypes and devices.
+
+    The sub-batches are views on this buffer: they are overwritten in place
+    when the next epoch starts. Sub-batches that are kept longer than the
+    current epoch (e.g. written in a replay buffer or accumulated across
+    epochs) must be cloned, or :obj:`copy` set to True.
+
+    A new epoch starts when the remaining elements do not fill a sub-batch,
+    and after each call to :obj:`reset`, which should be registered as a
+    `"pre_optim_steps"` hook such that every collected batch starts a new
+    epoch (collectors can return the same tensordict, updated in-place, at
+    each iteration).
+
+    Args:
+        batch_size (int): sub-batch size. If the batch has more than one
+            dimension, the first one is shuffled (e.g. trajectories) and the
+            sub-batches contain `batch_size // prod(batch.shape[1:])`
+            elements along that dimension.
+        copy (bool, optional): if True, the sub-batches are copies instead
+            of views on the shuffled buffer, such that they are not
+            overwritten by the next epochs. Default is `False`.
+
+    Examples:
+        >>> sub_sampler = EpochSubSampler(batch_size=64)
+        >>> trainer.register_op("pre_optim_steps", sub_sampler.reset)
+        >>> trainer.register_op("process_optim_batch", sub_sampler)
+        >>> td_out = trainer._process_optim_batch_hook(td)
+        >>> assert td_out.shape == torch.Size([64])
+
+    """
+
+    def __init__(self, batch_size: int, copy: bool = False) -> None:
+        self.batch_size = batch_size
+        self.copy = copy
+        self.epoch = 0
+        self._new_batch = True
+        self._shuffled = None
+        self._cursor = 0
+
+    def reset(self) -> None:
+        """Starts a new epoch at the next call, to be called when a new batch
+        has been collected."""
+        self._new_batch = True
+
+    def _shuffle(self, batch: _TensorDict) -> None:
+        perm = torch.randperm(batch.shape[0], device=batch.device)
+        if self._shuffled is None or not self._fits(batch):
+            self._shuffled = batch[perm].to_tensordict()
+        else:
+            for key, value in batch.items():
+                torch.index_select(value, 0, perm, out=self._shuffled.get(key))
+        self._cursor = 0
+        self.epoch += 1
+
+    def _fits(self, batch: _TensorDict) -> bool:
+        if self._shuffled.batch_size != batch.batch_size:
+            return False
+        if set(self._shuffled.keys()) != set(batch.keys()):
+            return False
+        return all(
+            self._shuffled.get(key).shape == value.shape
+            and self._shuffled.get(key).dtype == value.dtype
+            and self._shuffled.get(key).device == value.device
+            for key, value in batch.items()
+        )
+
+    def __call__(self, batch: _TensorDict) -> _TensorDict:
+        """Returns the next sub-batch of the current epoch."""
+        sub_batch_size = self.batch_size // int(np.prod(batch.shape[1:]))
+        if sub_batch_size == 0 or sub_batch_size > batch.shape[0]:
+            raise RuntimeError(
+                f"Cannot draw sub-batches of {self.batch_size} elements from "
+                f"a batch of shape {batch.shape}."
+            )
+        if self._new_batch or self._cursor + sub_batch_size > batch.shape[0]:
+            self._new_batch = False
+            self._shuffle(batch)
+        start = self._cursor
+        self._cursor += sub_batch_size
+        sub_batch = self._shuffled[start : self._cursor]
+        if self.copy:
+            return sub_batch.clone()
+        return sub_batch
+
+
 class Recorder:
     """Recorder hook for Trainer.
 